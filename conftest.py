@@ -14,6 +14,15 @@ def pytest_configure(config):
     """Configure pytest with environment variables."""
     os.environ.setdefault("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", ""))
 
+@pytest.fixture
+def validated_envelopes():
+    """Validate every server-built envelope against the protocol models during a test."""
+    from agentprinter_fastapi.envelope import envelope_validation_enabled, set_envelope_validation
+    previous = envelope_validation_enabled()
+    set_envelope_validation(True)
+    yield
+    set_envelope_validation(previous)
+
 @pytest.fixture
 def openai_key():
     """Fixture providing OpenAI API key, skip test if not available."""
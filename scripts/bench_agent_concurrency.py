@@ -0,0 +1,65 @@
+"""Compare concurrent LangChain agent run capacity: native async vs thread pool.
+
+Uses fake executors that simulate an LLM call of fixed latency, so the numbers
+measure adapter overhead and concurrency limits, not a model.
+
+    uv run python scripts/bench_agent_concurrency.py --runs 500 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from agentprinter_fastapi.agent_adapters import AgentThreadPool, LangChainAgentAdapter
+
+class SyncFakeExecutor:
+    """Sync-only executor: occupies a worker thread for the whole call."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, input_data, config=None):
+        time.sleep(self.latency)
+        return {"output": "ok"}
+
+class AsyncFakeExecutor:
+    """Native async executor: yields to the loop while "waiting on the LLM"."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def ainvoke(self, input_data, config=None):
+        await asyncio.sleep(self.latency)
+        return {"output": "ok"}
+
+async def _on_event(event):
+    pass
+
+async def bench(executor, runs: int, pool: AgentThreadPool | None = None) -> dict:
+    adapters = [LangChainAgentAdapter(on_event=_on_event, thread_pool=pool) for _ in range(runs)]
+    started = time.perf_counter()
+    await asyncio.gather(*(adapter.run_agent(executor, {"input": i}) for i, adapter in enumerate(adapters)))
+    elapsed = time.perf_counter() - started
+    result = {"runs": runs, "seconds": round(elapsed, 3), "runs_per_second": round(runs / elapsed, 1)}
+    if pool is not None:
+        result["pool"] = pool.get_stats()
+    return result
+
+async def main(runs: int, latency: float, workers: int):
+    pool = AgentThreadPool(max_workers=workers)
+    try:
+        sync_result = await bench(SyncFakeExecutor(latency), runs, pool)
+    finally:
+        pool.shutdown()
+    async_result = await bench(AsyncFakeExecutor(latency), runs)
+
+    print(f"Fake LLM latency: {latency * 1000:.0f}ms, concurrent runs: {runs}")
+    print(f"sync executor on {workers}-thread pool: {sync_result}")
+    print(f"native async executor:             {async_result}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.latency, args.workers))
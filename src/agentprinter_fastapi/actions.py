@@ -1,8 +1,10 @@
 """Action routing system for handling user actions."""
-from typing import Callable, Dict, Any
+from typing import Callable, Dict, Any, Optional
 from fastapi import WebSocket
 from .schemas.protocol import Message
 from .schemas.actions import ActionPayload
+from .deadlines import Deadline, enforce_deadline
+from .tool_chunks import max_chunks_requested
 from pydantic import ValidationError
 
 
@@ -17,27 +19,49 @@ class InvalidActionPayloadError(Exception):
 class ActionRouter:
     """Routes user.action messages to registered handlers."""
     
-    def __init__(self):
+    def __init__(self, default_timeout: Optional[float] = None):
+        """Initialize the router.
+        
+        Args:
+            default_timeout: Seconds an async handler may run when no per-action
+                or per-target timeout is configured (None = unbounded)
+        """
         self._handlers: Dict[str, Callable] = {}  # action_id -> handler
-        self._target_handlers: Dict[str, Callable] = {}  # target_prefix -> handler
+        self._target_handlers: Dict[str, Callable] = {}  # target or target_prefix -> handler
+        self._handler_timeouts: Dict[str, float] = {}  # action_id -> seconds
+        self._target_timeouts: Dict[str, float] = {}  # target or target_prefix -> seconds
+        self.default_timeout = default_timeout
     
-    def register_handler(self, action_id: str, handler: Callable) -> None:
+    def register_handler(self, action_id: str, handler: Callable, timeout: Optional[float] = None) -> None:
         """Register a handler for a specific action_id.
         
         Args:
             action_id: The action identifier to handle
             handler: Async or sync callable that receives (message, websocket)
+            timeout: Optional seconds the handler may run before it is cancelled
         """
         self._handlers[action_id] = handler
+        if timeout is not None:
+            self._handler_timeouts[action_id] = timeout
+        else:
+            self._handler_timeouts.pop(action_id, None)
     
-    def register_target_handler(self, target_prefix: str, handler: Callable) -> None:
+    def register_target_handler(self, target_prefix: str, handler: Callable, timeout: Optional[float] = None) -> None:
         """Register a handler for actions with a specific target prefix.
         
+        A full target (e.g., "agent:cancel") takes precedence over its prefix.
+        
         Args:
             target_prefix: The target prefix to match (e.g., "agent", "tool", "http")
+                or a full target
             handler: Async or sync callable that receives (message, websocket)
+            timeout: Optional seconds the handler may run before it is cancelled
         """
         self._target_handlers[target_prefix] = handler
+        if timeout is not None:
+            self._target_timeouts[target_prefix] = timeout
+        else:
+            self._target_timeouts.pop(target_prefix, None)
     
     async def handle_message(self, message: Message, websocket: WebSocket) -> None:
         """Handle an incoming action message by routing to registered handler.
@@ -73,34 +97,50 @@ class ActionRouter:
         
         # Try target-based routing first (if target has prefix like "agent:", "tool:", "http:")
         handler = None
+        timeout = None
         if target and ":" in target:
-            target_prefix = target.split(":")[0]
-            handler = self._target_handlers.get(target_prefix)
+            target_key = target if target in self._target_handlers else target.split(":")[0]
+            handler = self._target_handlers.get(target_key)
+            timeout = self._target_timeouts.get(target_key)
         
         # Fallback to action_id-based routing
         if not handler:
             handler = self._handlers.get(action_id)
+            timeout = self._handler_timeouts.get(action_id)
         
         if not handler:
             raise KeyError(f"No handler registered for action_id: {action_id} or target: {target}")
         
-        # Call handler (supports both sync and async)
+        # Call handler (supports both sync and async); tool results it
+        # streams honor the client's max_tool_chunks
         import inspect
-        if inspect.iscoroutinefunction(handler):
-            await handler(message, websocket)
-        else:
-            handler(message, websocket)
+        with max_chunks_requested(payload.get("max_tool_chunks")):
+            if inspect.iscoroutinefunction(handler):
+                deadline = self._resolve_deadline(message, timeout)
+                async with enforce_deadline(deadline, action_id=action_id, target=target):
+                    await handler(message, websocket)
+            else:
+                handler(message, websocket)
+
+    def _resolve_deadline(self, message: Message, timeout: Optional[float]) -> Optional[Deadline]:
+        """Combine the configured timeout with the client's header deadline."""
+        if timeout is None:
+            timeout = self.default_timeout
+        configured = Deadline(timeout) if timeout is not None else None
+        client_ms = message.header.deadline_ms
+        client = Deadline(client_ms / 1000) if client_ms is not None else None
+        return Deadline.earliest(configured, client)
 
-    def action(self, action_id: str):
+    def action(self, action_id: str, timeout: Optional[float] = None):
         """Decorator for registering an action handler.
         
         Example:
-            @router.action("submit_form")
+            @router.action("submit_form", timeout=30)
             async def handle_submit(message, websocket):
                 ...
         """
         def decorator(func: Callable):
-            self.register_handler(action_id, func)
+            self.register_handler(action_id, func, timeout=timeout)
             return func
         return decorator
 
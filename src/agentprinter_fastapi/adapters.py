@@ -1,21 +1,63 @@
 """LangChain and LangGraph streaming adapters for agent integration."""
 import asyncio
+import inspect
 import json
-from typing import AsyncGenerator, Optional, Any, Callable
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Optional, Any, Callable, Iterable
 import logging
+from .deadlines import Deadline, enforce_deadline
+from .runs import current_run
+from .streaming import StreamBuffer
+from .llm_clients import OpenAIClientPool, openai_client_pool
+from .llm_cache import ResponseCache, cache_key, credential_tenant
+from .llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, estimate_tokens
+from .backpressure import WatermarkChannel
+from .metrics import AgentMetrics, agent_metrics
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def outbound_chunks(on_chunk: Callable[[str], Any], high_water: Optional[int], low_water: Optional[int] = None):
+    """Yield the chunk callback to use while streaming.
+    
+    With `high_water` set (in characters), chunks are handed to `on_chunk` by
+    a WatermarkChannel: the stream keeps reading until that many characters
+    are waiting for delivery, then pauses until the backlog drains to
+    `low_water`. Leaving the block waits for the backlog to be delivered.
+    """
+    if high_water is None:
+        yield on_chunk
+        return
+    async with WatermarkChannel(on_chunk, high_water, low_water, weigh=len) as channel:
+        yield channel.put
+
 class LangChainAdapter:
     """Adapter for LangChain runnable chains to stream over WebSocket."""
     
-    def __init__(self, on_chunk: Callable[[str], None]):
+    def __init__(
+        self,
+        on_chunk: Callable[[str], None],
+        max_output_chars: Optional[int] = None,
+        outbound_high_water: Optional[int] = None,
+        outbound_low_water: Optional[int] = None,
+        metrics: Optional[AgentMetrics] = None,
+    ):
         """Initialize adapter with callback for each chunk.
         
         Args:
             on_chunk: Async callback that receives text chunks
+            max_output_chars: Keep only the last N characters of the returned output (None = all)
+            outbound_high_water: Characters awaiting on_chunk at which the chain
+                stream pauses (None = await on_chunk per chunk)
+            outbound_low_water: Characters at which it resumes (default: high water // 4)
+            metrics: Where TTFT, tokens/s and run latency are recorded, keyed by
+                chain class (defaults to agent_metrics)
         """
         self.on_chunk = on_chunk
+        self.max_output_chars = max_output_chars
+        self.outbound_high_water = outbound_high_water
+        self.outbound_low_water = outbound_low_water
+        self.metrics = metrics if metrics is not None else agent_metrics
     
     async def stream_chain(self, chain: Any, input_data: dict) -> str:
         """Stream a LangChain chain output.
@@ -27,36 +69,120 @@ class LangChainAdapter:
         Returns:
             Full accumulated output
         """
-        accumulated = ""
+        accumulated = StreamBuffer(self.max_output_chars)
+        span = self.metrics.start_run(type(chain).__name__)
         
         try:
-            # Stream chunks from the chain
-            async for chunk in chain.astream(input_data):
-                if isinstance(chunk, str):
-                    text = chunk
-                elif isinstance(chunk, dict) and "content" in chunk:
-                    text = chunk["content"]
-                else:
-                    text = str(chunk)
-                
-                accumulated += text
-                await self.on_chunk(text)
+            async with outbound_chunks(self.on_chunk, self.outbound_high_water, self.outbound_low_water) as deliver:
+                # Stream chunks from the chain
+                async for chunk in chain.astream(input_data):
+                    if isinstance(chunk, str):
+                        text = chunk
+                    elif isinstance(chunk, dict) and "content" in chunk:
+                        text = chunk["content"]
+                    else:
+                        text = str(chunk)
+                    
+                    accumulated.append(text)
+                    span.token()
+                    await deliver(text)
             
-            return accumulated
+            span.finish()
+            return accumulated.text
+        except asyncio.CancelledError:
+            span.finish("cancelled")
+            raise
         except Exception as e:
+            span.finish("error")
             logger.error(f"Error streaming chain: {e}")
             raise
 
+def _accepts_kwarg(fn: Callable, name: str) -> bool:
+    """Check whether `fn` takes keyword `name` (directly or via **kwargs)."""
+    try:
+        params = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values())
+
+class GraphEventFilter:
+    """Selects the LangGraph events worth sending, filtering at the source where possible.
+    
+    `astream_events` is asked for the allowed node names or, without node
+    filters, for chain runs only (graph nodes are chains), so model/prompt/tool
+    sub-run events are never produced. Both are not sent at once: LangChain ORs
+    include filters, so chain runs would let every node through. The same
+    rules are re-checked in Python for sources that do not support those
+    filters.
+    """
+    
+    def __init__(
+        self,
+        event_types: Iterable[str],
+        include_nodes: Optional[Iterable[str]] = None,
+        exclude_nodes: Optional[Iterable[str]] = None,
+        version: str = "v1",
+    ):
+        """Initialize filter.
+        
+        Args:
+            event_types: astream_events event names to keep (e.g., "on_chain_end")
+            include_nodes: Only these node names reach the wire (None = all)
+            exclude_nodes: Node names kept off the wire (e.g., internal sub-chains)
+            version: astream_events schema version ("v1" or "v2")
+        """
+        self.event_types = frozenset(event_types)
+        self.include_nodes = frozenset(include_nodes) if include_nodes is not None else None
+        self.exclude_nodes = frozenset(exclude_nodes or ())
+        self.version = version
+    
+    def stream(self, graph: Any, input_state: Any, config: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Start `graph.astream_events` with whichever source filters it supports."""
+        astream_events = graph.astream_events
+        kwargs: dict[str, Any] = {"version": self.version}
+        if config is not None:
+            kwargs["config"] = config
+        if self.include_nodes is not None and _accepts_kwarg(astream_events, "include_names"):
+            kwargs["include_names"] = sorted(self.include_nodes)
+        elif _accepts_kwarg(astream_events, "include_types"):
+            kwargs["include_types"] = ["chain"]
+        if self.exclude_nodes and _accepts_kwarg(astream_events, "exclude_names"):
+            kwargs["exclude_names"] = sorted(self.exclude_nodes)
+        return astream_events(input_state, **kwargs)
+    
+    def wants(self, event: dict) -> bool:
+        """Check whether an event passes the type and node rules."""
+        if event.get("event") not in self.event_types:
+            return False
+        name = event.get("name")
+        if self.include_nodes is not None and name not in self.include_nodes:
+            return False
+        return name not in self.exclude_nodes
+
 class LangGraphAdapter:
     """Adapter for LangGraph state graphs to stream over WebSocket."""
     
-    def __init__(self, on_update: Callable[[dict], None]):
+    def __init__(
+        self,
+        on_update: Callable[[dict], None],
+        include_nodes: Optional[Iterable[str]] = None,
+        exclude_nodes: Optional[Iterable[str]] = None,
+        version: str = "v1",
+        metrics: Optional[AgentMetrics] = None,
+    ):
         """Initialize adapter with callback for graph updates.
         
         Args:
             on_update: Async callback that receives state updates
+            include_nodes: Only report these nodes (None = all)
+            exclude_nodes: Nodes to keep off the wire
+            version: astream_events schema version ("v1" or "v2")
+            metrics: Where run latency is recorded, keyed by graph class
+                (defaults to agent_metrics)
         """
         self.on_update = on_update
+        self.event_filter = GraphEventFilter(["on_chain_end"], include_nodes, exclude_nodes, version)
+        self.metrics = metrics if metrics is not None else agent_metrics
     
     async def stream_graph(self, graph: Any, input_state: dict) -> dict:
         """Stream a LangGraph computation.
@@ -68,74 +194,188 @@ class LangGraphAdapter:
         Returns:
             Final state dict
         """
+        span = self.metrics.start_run(type(graph).__name__)
         try:
             # Stream updates from the graph
-            async for event in graph.astream_events(input_state, version="v1"):
+            async for event in self.event_filter.stream(graph, input_state):
                 # Emit state updates
-                if event.get("event") == "on_chain_end":
+                if self.event_filter.wants(event):
                     await self.on_update({
                         "type": "agent.event",
                         "node": event.get("name"),
                         "output": event.get("data", {}).get("output")
                     })
             
+            span.finish()
             return input_state  # Final state
+        except asyncio.CancelledError:
+            span.finish("cancelled")
+            raise
         except Exception as e:
+            span.finish("error")
             logger.error(f"Error streaming graph: {e}")
             raise
 
+# Cache identity of the default provider (requests without a base_url)
+_OPENAI_ENDPOINT = "https://api.openai.com/v1"
+
 class OpenAIStreamAdapter:
     """Direct OpenAI streaming adapter for text completion."""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o-mini",
+        max_output_chars: Optional[int] = None,
+        base_url: Optional[str] = None,
+        client_pool: Optional[OpenAIClientPool] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        cache: Optional[ResponseCache] = None,
+        outbound_high_water: Optional[int] = None,
+        outbound_low_water: Optional[int] = None,
+        metrics: Optional[AgentMetrics] = None,
+    ):
         """Initialize OpenAI adapter.
         
         Args:
             api_key: OpenAI API key
             model: Model name (gpt-4o-mini, gpt-4-turbo, etc.)
+            max_output_chars: Keep only the last N characters of the returned response (None = all)
+            base_url: Optional API base URL (OpenAI-compatible servers, proxies)
+            client_pool: Pool of shared clients (defaults to the global pool)
+            scheduler: Optional rate-limit scheduler that queues and retries requests
+            cache: Optional exact-match response cache (for deterministic prompts)
+            outbound_high_water: Characters awaiting on_chunk at which reading
+                the HTTP stream pauses (None = await on_chunk per chunk)
+            outbound_low_water: Characters at which reading resumes (default: high water // 4)
+            metrics: Where TTFT, tokens/s and request latency are recorded, keyed
+                by model (defaults to agent_metrics; cache hits are not recorded)
         """
         self.api_key = api_key
         self.model = model
+        self.max_output_chars = max_output_chars
+        self.base_url = base_url
+        self.client_pool = client_pool if client_pool is not None else openai_client_pool
+        self.scheduler = scheduler
+        self.cache = cache
+        self.outbound_high_water = outbound_high_water
+        self.outbound_low_water = outbound_low_water
+        self.metrics = metrics if metrics is not None else agent_metrics
     
     async def stream_completion(
         self, 
         messages: list[dict],
         on_chunk: Callable[[str], None],
+        deadline: Deadline | float | None = None,
+        priority: int = PRIORITY_INTERACTIVE,
         **kwargs
     ) -> str:
         """Stream a completion from OpenAI.
         
+        Uses the pool's shared client for this API key and base URL, waiting
+        for a free concurrency slot first. With a scheduler, the request is
+        queued until the RPM/TPM budgets allow it and retried on 429. With a
+        cache, a repeated request replays the recorded chunks through
+        `on_chunk` without calling the provider.
+        
         Args:
             messages: Chat messages list
             on_chunk: Callback for text chunks
+            deadline: Optional Deadline or timeout in seconds; defaults to the
+                deadline of the enclosing action, if any. The HTTP request
+                timeout is capped to the remaining budget and the stream is
+                closed once it passes. Time spent queued counts against it.
+            priority: Scheduler priority (PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND)
             **kwargs: Additional OpenAI parameters
             
         Returns:
             Full accumulated response
+            
+        Raises:
+            DeadlineExceeded: If the completion outlives its deadline
         """
-        try:
-            from openai import AsyncOpenAI
-        except ImportError:
-            raise ImportError("openai package required: pip install openai")
+        async with outbound_chunks(on_chunk, self.outbound_high_water, self.outbound_low_water) as deliver:
+            return await self._stream_completion(messages, deliver, deadline, priority, kwargs)
+    
+    async def _stream_completion(
+        self,
+        messages: list[dict],
+        on_chunk: Callable[[str], Any],
+        deadline: Deadline | float | None,
+        priority: int,
+        kwargs: dict[str, Any],
+    ) -> str:
+        deadline = Deadline.coerce(deadline)
+        key = None
+        if self.cache is not None:
+            # Responses recorded under one API key are never served to another
+            endpoint = self.base_url or _OPENAI_ENDPOINT
+            key = cache_key(self.model, messages, kwargs, endpoint, credential_tenant(self.api_key))
+        recorded: list[str] = []
         
-        client = AsyncOpenAI(api_key=self.api_key)
-        accumulated = ""
+        if key is not None:
+            cached = await self.cache.get_async(key)
+            if cached is not None:
+                accumulated = StreamBuffer(self.max_output_chars)
+                for text in cached:
+                    accumulated.append(text)
+                    await on_chunk(text)
+                return accumulated.text
+        
+        # TTFT includes time spent queued by the scheduler and failed attempts
+        span = self.metrics.start_run(self.model)
+        
+        async def attempt() -> str:
+            accumulated = StreamBuffer(self.max_output_chars)
+            recorded.clear()
+            async with self.client_pool.acquire(self.api_key, self.base_url) as client:
+                request_kwargs = dict(kwargs)
+                if deadline is not None and "timeout" not in request_kwargs:
+                    request_kwargs["timeout"] = deadline.remaining()
+                
+                # Use completions API (text generation)
+                stream = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True,
+                    **request_kwargs
+                )
+                
+                # Let the run registry close the HTTP stream if the client goes away
+                run = current_run()
+                if run is not None:
+                    run.add_closer(stream.close)
+                
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text = chunk.choices[0].delta.content
+                            accumulated.append(text)
+                            if key is not None:
+                                recorded.append(text)
+                            span.token()
+                            await on_chunk(text)
+                finally:
+                    # Returns the connection to the pool
+                    await stream.close()
+            return accumulated.text
         
         try:
-            # Use completions API (text generation)
-            stream = await client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=True,
-                **kwargs
-            )
-            
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    text = chunk.choices[0].delta.content
-                    accumulated += text
-                    await on_chunk(text)
-            
-            return accumulated
-        finally:
-            await client.close()
+            async with enforce_deadline(deadline, model=self.model):
+                if self.scheduler is None:
+                    result = await attempt()
+                else:
+                    tokens = estimate_tokens(messages, kwargs.get("max_tokens") or kwargs.get("max_completion_tokens"))
+                    result = await self.scheduler.submit(attempt, estimated_tokens=tokens, priority=priority)
+        except asyncio.CancelledError:
+            span.finish("cancelled")
+            raise
+        except Exception:
+            span.finish("error")
+            raise
+        span.finish()
+        
+        # Only complete responses are cached
+        if key is not None:
+            await self.cache.put_async(key, recorded)
+        return result
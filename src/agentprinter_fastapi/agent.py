@@ -1,12 +1,177 @@
 """Agent streaming runner for sending agent events over WebSockets."""
-from typing import AsyncGenerator, Any, Tuple
-from .schemas.protocol import Message, MessageHeader
+import asyncio
+import contextlib
+from typing import AsyncGenerator, AsyncIterator, Any, Tuple, Optional
+from pydantic_core import to_jsonable_python
 from .schemas.agent import AgentEvent
+from .envelope import make_envelope, protocol_error_frame
+from .deadlines import Deadline, DeadlineExceeded, enforce_deadline
+from .runs import run_registry
+from .channels import RunChannel, RunChannelRegistry, run_channels
+from .metrics import AgentMetrics, RunSpan, agent_metrics
+from .run_scheduler import RunCancelled, RunScheduler
+from .tool_chunks import DEFAULT_CHUNK_SIZE, DEFAULT_THRESHOLD, chunk_tool_result
+from .blobs import BlobStore, externalize_async
+
+class TokenAggregator:
+    """Buffers consecutive token events so several tokens share one frame.
+    
+    A buffer is flushed when it reaches `max_chars`, when `flush_interval`
+    seconds have passed since its first token, or before any non-token event.
+    """
+    
+    def __init__(self, max_chars: int = 256, flush_interval: float = 0.025):
+        """Initialize aggregator.
+        
+        Args:
+            max_chars: Flush once this many characters are buffered
+            flush_interval: Max seconds a token may wait in the buffer
+        """
+        self.max_chars = max_chars
+        self.flush_interval = flush_interval
+        self.tokens = 0  # tokens received
+        self.frames = 0  # token frames emitted
+        self._parts: list[str] = []
+        self._size = 0
+        self._first_at = 0.0
+    
+    @property
+    def pending(self) -> bool:
+        return bool(self._parts)
+    
+    def add(self, token: str) -> bool:
+        """Buffer a token. Returns True when the buffer should be flushed now."""
+        if not self._parts:
+            self._first_at = asyncio.get_running_loop().time()
+        self._parts.append(token)
+        self._size += len(token)
+        self.tokens += 1
+        return self._size >= self.max_chars
+    
+    def take(self) -> str:
+        """Return the buffered text as one frame and reset the buffer."""
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self.frames += 1
+        return text
+    
+    def time_until_flush(self) -> float:
+        elapsed = asyncio.get_running_loop().time() - self._first_at
+        return max(0.0, self.flush_interval - elapsed)
+    
+    async def coalesce(self, events: AsyncIterator[Tuple[str, Any]]) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Yield `events` with consecutive string tokens merged, preserving order."""
+        iterator = events.__aiter__()
+        pending_next: Optional[asyncio.Future] = None
+        try:
+            while True:
+                try:
+                    if self.pending or pending_next is not None:
+                        # Race the next event against the flush timer
+                        if pending_next is None:
+                            pending_next = asyncio.ensure_future(iterator.__anext__())
+                        timeout = self.time_until_flush() if self.pending else None
+                        done, _ = await asyncio.wait({pending_next}, timeout=timeout)
+                        if not done:
+                            yield "token", self.take()
+                            continue
+                        next_event, pending_next = pending_next, None
+                        event_type, data = next_event.result()
+                    else:
+                        event_type, data = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    # Deliver buffered tokens before the error surfaces
+                    if self.pending:
+                        yield "token", self.take()
+                    raise
+                
+                if event_type == "token" and isinstance(data, str):
+                    if self.add(data):
+                        yield "token", self.take()
+                    continue
+                
+                if self.pending:
+                    yield "token", self.take()
+                yield event_type, data
+            
+            if self.pending:
+                yield "token", self.take()
+        finally:
+            if pending_next is not None and not pending_next.done():
+                # Let the cancellation land so the generator can be closed afterwards
+                pending_next.cancel()
+                await asyncio.gather(pending_next, return_exceptions=True)
 
 class AgentRunner:
     """Runs an agent generator and streams its events over a WebSocket."""
     
-    async def run_stream(self, run_id: str, trace_id: str, websocket: Any, generator: AsyncGenerator[Tuple[str, Any], None]):
+    def __init__(
+        self,
+        coalesce_tokens: bool = False,
+        max_buffer_chars: int = 256,
+        flush_interval: float = 0.025,
+        channels: Optional[RunChannelRegistry] = None,
+        metrics: Optional[AgentMetrics] = None,
+        scheduler: Optional[RunScheduler] = None,
+        tool_result_threshold: Optional[int] = DEFAULT_THRESHOLD,
+        tool_chunk_size: int = DEFAULT_CHUNK_SIZE,
+        blob_threshold: Optional[int] = None,
+        blob_store: Optional[BlobStore] = None,
+    ):
+        """Initialize runner.
+        
+        Args:
+            coalesce_tokens: Merge consecutive token events into fewer frames
+            max_buffer_chars: Flush coalesced tokens at this many characters
+            flush_interval: Max seconds a token is held back (16-33ms keeps
+                streaming smooth at display refresh rates)
+            channels: Registry that runs publish into for extra viewers
+                (defaults to the global run_channels)
+            metrics: Where run timings are recorded (defaults to agent_metrics)
+            scheduler: Optional RunScheduler capping concurrent runs (e.g.,
+                run_scheduler); queued runs get agent.queue position messages
+            tool_result_threshold: Tool outputs larger than this many characters
+                are sent as tool_result_chunk events plus a summary (None = never)
+            tool_chunk_size: Characters per tool_result_chunk
+            blob_threshold: Event payloads (e.g., final states) larger than this
+                many bytes are sent as blob references (None = inline)
+            blob_store: Store for oversized payloads (defaults to the global blob_store)
+        """
+        self.coalesce_tokens = coalesce_tokens
+        self.max_buffer_chars = max_buffer_chars
+        self.flush_interval = flush_interval
+        self.token_stats = {"tokens": 0, "frames": 0}
+        self.channels = channels if channels is not None else run_channels
+        self.metrics = metrics if metrics is not None else agent_metrics
+        self.scheduler = scheduler
+        self.tool_result_threshold = tool_result_threshold
+        self.tool_chunk_size = tool_chunk_size
+        self.blob_threshold = blob_threshold
+        self.blob_store = blob_store
+    
+    def get_token_stats(self) -> dict[str, Any]:
+        """Return token and token-frame counts across coalesced runs."""
+        tokens = self.token_stats["tokens"]
+        frames = self.token_stats["frames"]
+        return {
+            **self.token_stats,
+            "tokens_per_frame": tokens / frames if frames else 0.0
+        }
+    
+    async def run_stream(
+        self,
+        run_id: str,
+        trace_id: str,
+        websocket: Any,
+        generator: AsyncGenerator[Tuple[str, Any], None],
+        deadline: Deadline | float | None = None,
+        agent: str = "agent",
+        tenant: Optional[str] = None,
+        max_tool_chunks: Optional[int] = None,
+    ):
         """Consumes a generator yielding (event_type, data) and streams agent.event messages.
         
         Args:
@@ -14,35 +179,143 @@ class AgentRunner:
             trace_id: Distributed tracing ID
             websocket: WebSocket connection to stream over
             generator: Async generator yielding (event_type, data) pairs
+            deadline: Optional Deadline or timeout in seconds. When it passes the
+                generator is closed and a deadline_exceeded protocol.error is sent.
+                Without it, an enclosing action deadline still cancels the run.
+            agent: Name the run's TTFT, tokens/s, tool and run latency are recorded under
+            tenant: Scheduler fairness key (defaults to the client's identity or connection)
+            max_tool_chunks: Send only the first N chunks of a large tool result
+                (defaults to the max_tool_chunks of the client's user.action; None = all)
+        
+        The run is tracked in the run registry so it is cancelled when its
+        client disconnects and does not resume. Its events are also published
+        to a run channel, so other sessions can watch it (see `run_channels`).
+        With a scheduler, the run first waits for a slot; the client is sent
+        agent.queue messages with its position while it waits (0 once it starts).
         """
+        channel = self.channels.open(run_id)
+        span = self.metrics.start_run(agent, run_id)
         try:
-            async for event_type, data in generator:
-                event = AgentEvent(
-                    run_id=run_id,
-                    event=event_type, # type: ignore
-                    data=data
-                )
-                
-                message = Message(
-                    type="agent.event",
-                    header=MessageHeader(trace_id=trace_id),
-                    payload=event.model_dump(mode='json')
-                )
-                
-                await websocket.send_json(message.model_dump(mode='json'))
+            async with run_registry.track(run_id), self._slot(run_id, trace_id, websocket, tenant):
+                if deadline is None:
+                    await self._stream(run_id, trace_id, websocket, generator, channel, span, max_tool_chunks)
+                    return
+                await self._stream_with_deadline(run_id, trace_id, websocket, generator, Deadline.coerce(deadline), channel, span, max_tool_chunks)
+        except RunCancelled:
+            span.finish("cancelled")
+            aclose = getattr(generator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        except asyncio.CancelledError:
+            span.finish("cancelled")
+            raise
+        finally:
+            span.finish()
+            self.channels.close(run_id, channel)
+    
+    def _slot(self, run_id: str, trace_id: str, websocket: Any, tenant: Optional[str]):
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        
+        async def on_queued(position: int) -> None:
+            await websocket.send_json(make_envelope("agent.queue", {"run_id": run_id, "position": position}, trace_id))
+        
+        return self.scheduler.slot(run_id, tenant, on_queued)
+    
+    async def _stream_with_deadline(
+        self,
+        run_id: str,
+        trace_id: str,
+        websocket: Any,
+        generator: AsyncGenerator[Tuple[str, Any], None],
+        deadline: Deadline,
+        channel: RunChannel,
+        span: RunSpan,
+        max_tool_chunks: Optional[int],
+    ):
+        """Stream until the deadline passes, then report a deadline_exceeded protocol.error."""
+        try:
+            async with enforce_deadline(deadline, run_id=run_id):
+                await self._stream(run_id, trace_id, websocket, generator, channel, span, max_tool_chunks)
+        except DeadlineExceeded as e:
+            span.status = "error"
+            channel.publish("error", str(e))
+            error_message = protocol_error_frame(trace_id, "deadline_exceeded", str(e), e.details)
+            await websocket.send_json(error_message)
+    
+    async def _stream(
+        self,
+        run_id: str,
+        trace_id: str,
+        websocket: Any,
+        generator: AsyncGenerator[Tuple[str, Any], None],
+        channel: RunChannel,
+        span: RunSpan,
+        max_tool_chunks: Optional[int] = None,
+    ):
+        """Forward generator events to the websocket, reporting failures as error events."""
+        aggregator = None
+        events: AsyncIterator[Tuple[str, Any]] = generator
+        if self.coalesce_tokens:
+            aggregator = TokenAggregator(self.max_buffer_chars, self.flush_interval)
+            events = aggregator.coalesce(generator)
+        try:
+            async for event_type, data in events:
+                if not isinstance(data, str):
+                    data = to_jsonable_python(data)
+                if event_type == "tool_result" and self.tool_result_threshold is not None:
+                    # Large outputs go out as several small frames
+                    parts = chunk_tool_result(data, self.tool_result_threshold, self.tool_chunk_size, max_tool_chunks)
+                    for part_type, part in parts:
+                        await self._send_event(run_id, trace_id, websocket, channel, span, part_type, part)
+                    continue
+                await self._send_event(run_id, trace_id, websocket, channel, span, event_type, data)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            error_event = AgentEvent(
-                run_id=run_id,
-                event="error",
-                data=str(e)
-            )
-            error_message = Message(
-                type="agent.event",
-                header=MessageHeader(trace_id=trace_id),
-                payload=error_event.model_dump(mode='json')
+            span.status = "error"
+            channel.publish("error", str(e))
+            error_message = make_envelope(
+                "agent.event",
+                {"run_id": run_id, "event": "error", "data": str(e)},
+                trace_id
             )
-            await websocket.send_json(error_message.model_dump(mode='json'))
+            await websocket.send_json(error_message)
+        finally:
+            if aggregator is not None:
+                await events.aclose()
+                self.token_stats["tokens"] += aggregator.tokens
+                self.token_stats["frames"] += aggregator.frames
+                span.tokens = aggregator.tokens  # Count tokens, not merged frames
+            # Close the generator so upstream LLM streams stop on cancellation
+            aclose = getattr(generator, "aclose", None)
+            if aclose is not None:
+                await aclose()
             
+    async def _send_event(
+        self,
+        run_id: str,
+        trace_id: str,
+        websocket: Any,
+        channel: RunChannel,
+        span: RunSpan,
+        event_type: str,
+        data: Any,
+    ):
+        span.on_event(event_type, data)
+        channel.publish(event_type, data)
+        # Trusted frame: AgentEvent is only checked when envelope validation is on
+        message = make_envelope(
+            "agent.event",
+            {"run_id": run_id, "event": event_type, "data": data},
+            trace_id,
+            payload_model=AgentEvent
+        )
+        if self.blob_threshold is not None:
+            message = await externalize_async(message, self.blob_threshold, self.blob_store)
+        
+        await websocket.send_json(message)
+    
     async def run_simple_agent(self, run_id: str, trace_id: str, websocket: Any, text: str):
         """A simple mock agent that streams back tokens and then finishes."""
         async def simple_gen():
@@ -1,69 +1,349 @@
 """Real LangChain and LangGraph agent integrations with WebSocket streaming."""
 import asyncio
+import hashlib
+import inspect
 import json
-from typing import AsyncGenerator, Callable, Any, Optional
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import AsyncGenerator, AsyncIterator, Callable, Any, Iterable, Optional
 import logging
+from .adapters import GraphEventFilter
+from .deadlines import Deadline, DeadlineExceeded, enforce_deadline
+from .runs import bind_client, current_identity, run_registry
+from .history import RunHistoryStore
+from .singleflight import Emit, SingleFlight, flight_key
+from .checkpoints import CheckpointStore
+from .channels import run_channels
+from .streaming import StreamBuffer
+from .metrics import AgentMetrics, RunSpan, agent_metrics
+from .tool_chunks import DEFAULT_CHUNK_SIZE, DEFAULT_THRESHOLD, chunk_tool_result
 
 logger = logging.getLogger(__name__)
 
+class ThreadSafeEventBridge:
+    """Carries events from an agent's worker thread to the event loop as they happen.
+    
+    Callbacks running in the worker thread call `append` (the same API as the
+    plain list it replaces); events are handed to a loop-owned queue with
+    `call_soon_threadsafe`. At most `max_pending` events wait in the queue: when
+    the consumer (ultimately the socket) falls behind, the worker blocks.
+    """
+    
+    _CLOSED = object()
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int = 256):
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = threading.Semaphore(max_pending)
+        self._closed = threading.Event()
+    
+    def append(self, event: dict) -> None:
+        """Hand an event to the loop, blocking the worker while the queue is full."""
+        if threading.get_ident() == self._loop_thread:
+            # Callbacks fired on the loop itself must never block it
+            self._queue.put_nowait((event, False))
+            return
+        
+        while not self._slots.acquire(timeout=0.1):
+            if self._closed.is_set():
+                return
+        if self._closed.is_set():
+            self._slots.release()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, True))
+        except RuntimeError:
+            # Loop already closed; nobody is listening any more
+            self._slots.release()
+    
+    def close(self) -> None:
+        """Stop accepting events and end iteration once queued events are drained."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._queue.put_nowait((self._CLOSED, False))
+    
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        while True:
+            event, holds_slot = await self._queue.get()
+            if event is self._CLOSED:
+                return
+            if holds_slot:
+                self._slots.release()
+            yield event
+
+class AgentThreadPool:
+    """Bounded, instrumented thread pool for agent executors that are sync-only."""
+    
+    def __init__(self, max_workers: int = 8):
+        """Initialize thread pool.
+        
+        Args:
+            max_workers: Max sync agent runs executing at once; more runs queue
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agentprinter-agent")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.active = 0
+        self.peak_active = 0
+        self.completed = 0
+        self.cancelled = 0  # Jobs whose caller was cancelled before they started
+    
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run `fn(*args)` on the pool and await its result."""
+        self.submitted += 1
+        state = {"started": False, "abandoned": False}
+        
+        def job():
+            with self._lock:
+                if state["abandoned"]:
+                    return None  # The caller is gone; don't run or count it
+                state["started"] = True
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+        
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self.cancelled += 1
+            raise
+    
+    def get_stats(self) -> dict[str, int]:
+        """Return pool usage counters."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "active": self.active,
+                "queued": max(0, self.submitted - self.completed - self.active - self.cancelled),
+                "peak_active": self.peak_active,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+            }
+    
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+# Shared pool for sync-only executors, so they never occupy the default executor
+agent_thread_pool = AgentThreadPool()
+
+def _has_async_method(obj: Any, name: str) -> bool:
+    method = getattr(obj, name, None)
+    return inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method)
+
+def _target_of(obj: Any) -> str:
+    """Default singleflight target: the identity of the executor or graph object."""
+    return f"{type(obj).__qualname__}@{id(obj):x}"
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _may_resume(checkpoint: dict, owner: Optional[str], resume_token: Optional[str]) -> bool:
+    """Check a resume request against a checkpoint; fails closed when neither proof matches."""
+    if owner is not None and checkpoint.get("owner") == owner:
+        return True
+    token_hash = checkpoint.get("resume_token_hash")
+    if resume_token is None or token_hash is None:
+        return False
+    return secrets.compare_digest(_token_hash(resume_token), token_hash)
+
+async def _run_shared(
+    singleflight: SingleFlight,
+    key: str,
+    start: Callable[[Emit], Any],
+    on_event: Emit,
+    on_final: Optional[Callable[[Any], None]],
+) -> Any:
+    """Start or join the shared run for `key` on behalf of one subscriber."""
+    import uuid
+    led = False
+    
+    async def lead(emit: Emit) -> Any:
+        nonlocal led
+        led = True
+        return await start(emit)
+    
+    # Each subscriber is tracked on its own, so its client's disconnect only
+    # detaches it; the shared run is cancelled when the last one leaves
+    async with run_registry.track(f"subscriber-{uuid.uuid4()}"):
+        result = await singleflight.run(key, lead, on_event)
+    
+    # The leading adapter's run already called its own on_final
+    if not led and on_final:
+        await on_final(result)
+    return result
+
+class _TimedEmit:
+    """Emit callback that also feeds the run's events to a metrics span."""
+    
+    def __init__(self, emit: Emit, span: RunSpan):
+        self.emit = emit
+        self.span = span
+    
+    async def __call__(self, event: dict) -> None:
+        self.span.on_event(event["event"], event.get("data"))
+        await self.emit(event)
+    
+    def finish(self) -> None:
+        # Cancellation reaches the run without an error event
+        exc = sys.exc_info()[1]
+        self.span.finish("cancelled" if isinstance(exc, asyncio.CancelledError) else None)
+
+async def _emit_tool_result(emit: Emit, run_id: str, data: dict, threshold: Optional[int], chunk_size: int) -> None:
+    """Emit a tool_result, as tool_result_chunk events plus a summary when its output is large."""
+    if threshold is None:
+        await emit({"run_id": run_id, "event": "tool_result", "data": data})
+        return
+    for event_type, part in chunk_tool_result(data, threshold, chunk_size):
+        await emit({"run_id": run_id, "event": event_type, "data": part})
+
 class LangChainAgentAdapter:
-    """Adapter for real LangChain agents with streaming to WebSocket."""
+    """Adapter for real LangChain agents with streaming to WebSocket.
+    
+    Executors are driven natively when possible: `astream_events` is preferred,
+    then `ainvoke`; only sync-only executors run `invoke` on a thread pool.
+    """
     
-    def __init__(self, on_event: Callable[[dict], None], on_final: Optional[Callable[[Any], None]] = None):
+    def __init__(
+        self,
+        on_event: Callable[[dict], None],
+        on_final: Optional[Callable[[Any], None]] = None,
+        max_pending_events: int = 256,
+        thread_pool: Optional[AgentThreadPool] = None,
+        history: Optional[RunHistoryStore] = None,
+        singleflight: Optional[SingleFlight] = None,
+        metrics: Optional[AgentMetrics] = None,
+        tool_result_threshold: Optional[int] = DEFAULT_THRESHOLD,
+        tool_chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
         """Initialize with callbacks for agent events and final result.
         
         Args:
             on_event: Async callback for agent events (emits AgentEvent-compliant events)
             on_final: Optional async callback called once with final result
+            max_pending_events: Events buffered between the agent thread and
+                on_event before the agent thread is paused
+            thread_pool: Pool for sync-only executors (defaults to agent_thread_pool)
+            history: Run history store (defaults to a bounded in-memory store)
+            singleflight: Share identical concurrent runs (e.g., agent_singleflight)
+            metrics: Where run timings are recorded, keyed by share_key or
+                executor class (defaults to agent_metrics)
+            tool_result_threshold: Tool outputs larger than this many characters
+                are sent as tool_result_chunk events plus a summary (None = never)
+            tool_chunk_size: Characters per tool_result_chunk
         """
         self.on_event = on_event
         self.on_final = on_final
-        self.history = []
+        self.max_pending_events = max_pending_events
+        self.thread_pool = thread_pool or agent_thread_pool
+        self.history = history if history is not None else RunHistoryStore()
+        self.singleflight = singleflight
+        self.metrics = metrics if metrics is not None else agent_metrics
+        self.tool_result_threshold = tool_result_threshold
+        self.tool_chunk_size = tool_chunk_size
+        self._emit: Emit = on_event  # Where the current run's events go
         self._run_id = None
+        self._started_at = 0.0
     
-    async def run_agent(self, agent_executor: Any, input_data: dict) -> dict:
+    async def run_agent(
+        self,
+        agent_executor: Any,
+        input_data: dict,
+        deadline: Deadline | float | None = None,
+        share_key: Optional[str] = None,
+    ) -> dict:
         """Run a real LangChain agent and stream events.
         
         Args:
             agent_executor: LangChain AgentExecutor instance
             input_data: Input dict for agent (e.g., {"input": "What is 2+2?"})
+            deadline: Optional Deadline or timeout in seconds; defaults to the
+                deadline of the enclosing action, if any
+            share_key: Singleflight target (e.g., the action target); defaults
+                to the executor's identity
             
         Returns:
             Final agent result
+            
+        Raises:
+            DeadlineExceeded: If the run outlives its deadline
         """
+        deadline = Deadline.coerce(deadline)
+        agent = share_key or type(agent_executor).__name__
+        if self.singleflight is None:
+            return await self._start_run(agent_executor, input_data, deadline, self.on_event, agent)
+        
+        key = flight_key(share_key or _target_of(agent_executor), input_data)
+        return await _run_shared(
+            self.singleflight,
+            key,
+            lambda emit: self._start_run(agent_executor, input_data, deadline, emit, agent, shared=True),
+            self.on_event,
+            self.on_final,
+        )
+    
+    async def _start_run(
+        self,
+        agent_executor: Any,
+        input_data: dict,
+        deadline: Optional[Deadline],
+        emit: Emit,
+        agent: str,
+        shared: bool = False,
+    ) -> dict:
         import uuid
         self._run_id = str(uuid.uuid4())
+        self._started_at = time.time()
+        self._emit = _TimedEmit(emit, self.metrics.start_run(agent, self._run_id))
+        if shared:
+            # Shared runs outlive any one client; subscribers are tracked instead
+            bind_client(None, None)
         
+        try:
+            # Tracked so a client disconnect cancels the run
+            async with run_registry.track(self._run_id):
+                return await self._run_agent(agent_executor, input_data, deadline)
+        finally:
+            self._emit.finish()
+    
+    async def _run_agent(self, agent_executor: Any, input_data: dict, deadline: Optional[Deadline]) -> dict:
+        """Run the agent under `deadline`, emitting events and recording history."""
         try:
             # Emit start event (AgentEvent.event = "start")
-            await self.on_event({
+            await self._emit({
                 "run_id": self._run_id,
                 "event": "start",
                 "data": {"input": input_data}
             })
             
-            # Event queue for callbacks (callbacks run in sync context)
-            event_queue = []
-            
-            # Configure agent for streaming callbacks
-            callbacks = [LangChainStreamingCallback(self.on_event, self._run_id, event_queue)]
-            
-            # Run agent (this will trigger callbacks)
-            result = await asyncio.to_thread(
-                agent_executor.invoke,
-                input_data,
-                {"callbacks": callbacks}
-            )
-            
-            # Process queued events
-            for event in event_queue:
-                await self.on_event(event)
+            # Sync executors keep running in their thread after cancellation,
+            # but we stop waiting for them and stop emitting their events
+            async with enforce_deadline(deadline, run_id=self._run_id):
+                if _has_async_method(agent_executor, "astream_events"):
+                    result, finish_emitted = await self._run_event_stream(agent_executor, input_data)
+                else:
+                    result, finish_emitted = await self._run_with_callbacks(agent_executor, input_data)
             
             final_output = result.get("output", "")
             
             # Emit finish event if not already emitted by callback
-            if not any(e.get("event") == "finish" for e in event_queue):
-                await self.on_event({
+            if not finish_emitted:
+                await self._emit({
                     "run_id": self._run_id,
                     "event": "finish",
                     "data": {"output": final_output}
@@ -75,9 +355,11 @@ class LangChainAgentAdapter:
             
             # Track in history
             self.history.append({
+                "run_id": self._run_id,
                 "input": input_data,
                 "output": final_output,
-                "status": "success"
+                "status": "success",
+                "started_at": self._started_at
             })
             
             return result
@@ -85,27 +367,102 @@ class LangChainAgentAdapter:
         except Exception as e:
             logger.error(f"Agent error: {e}")
             # Emit error event (AgentEvent.event = "error")
-            await self.on_event({
+            await self._emit({
                 "run_id": self._run_id,
                 "event": "error",
-                "data": {"error": str(e)}
+                "data": _error_data(e)
             })
             # Track error in history
             self.history.append({
+                "run_id": self._run_id,
                 "input": input_data,
                 "status": "error",
-                "error": str(e)
+                "error": str(e),
+                "started_at": self._started_at
             })
             raise
     
+    async def _run_event_stream(self, agent_executor: Any, input_data: dict) -> tuple[Any, bool]:
+        """Drive an executor through `astream_events`, on the loop, without threads."""
+        result = None
+        events = agent_executor.astream_events(input_data, version="v2")
+        try:
+            async for event in events:
+                event_type = event.get("event")
+                data = event.get("data", {})
+                
+                if event_type == "on_tool_start":
+                    await self._emit({
+                        "run_id": self._run_id,
+                        "event": "tool_call",
+                        "data": {"tool": event.get("name", "unknown"), "input": data.get("input")}
+                    })
+                elif event_type == "on_tool_end":
+                    await self._emit_tool_result({"output": data.get("output")})
+                elif event_type == "on_chat_model_stream":
+                    text = getattr(data.get("chunk"), "content", None)
+                    if isinstance(text, str) and text:
+                        await self._emit({"run_id": self._run_id, "event": "token", "data": text})
+                elif event_type == "on_chain_end" and not event.get("parent_ids"):
+                    # The root chain's output is the agent result
+                    result = data.get("output")
+        finally:
+            await events.aclose()
+        
+        if not isinstance(result, dict):
+            result = {"output": result if result is not None else ""}
+        return result, False
+    
+    async def _run_with_callbacks(self, agent_executor: Any, input_data: dict) -> tuple[Any, bool]:
+        """Run via `ainvoke` or a pooled `invoke`, streaming callback events live."""
+        # Callbacks may run in a worker thread; they stream through the bridge
+        bridge = ThreadSafeEventBridge(asyncio.get_running_loop(), self.max_pending_events)
+        callbacks = [LangChainStreamingCallback(self._emit, self._run_id, bridge)]
+        config = {"callbacks": callbacks}
+        
+        if _has_async_method(agent_executor, "ainvoke"):
+            invocation = asyncio.ensure_future(agent_executor.ainvoke(input_data, config))
+        else:
+            invocation = asyncio.ensure_future(self.thread_pool.run(agent_executor.invoke, input_data, config))
+        invocation.add_done_callback(lambda _: bridge.close())
+        
+        # Emit events live while the agent is still running
+        finish_emitted = False
+        try:
+            async for event in bridge:
+                finish_emitted = finish_emitted or event.get("event") == "finish"
+                if event.get("event") == "tool_result":
+                    await self._emit_tool_result(event["data"])
+                else:
+                    await self._emit(event)
+            return await invocation, finish_emitted
+        finally:
+            # Unblocks the worker if we stop early (error, deadline, cancel)
+            bridge.close()
+            invocation.cancel()
+    
+    async def _emit_tool_result(self, data: dict) -> None:
+        await _emit_tool_result(self._emit, self._run_id, data, self.tool_result_threshold, self.tool_chunk_size)
+    
     def get_history(self):
-        """Return the history of all agent invocations."""
-        return self.history
+        """Return the recent agent invocations kept in memory."""
+        return list(self.history)
+
+def _error_data(error: Exception) -> dict:
+    """Build AgentEvent error data, tagging deadline failures with a code."""
+    data = {"error": str(error)}
+    if isinstance(error, DeadlineExceeded):
+        data["code"] = "deadline_exceeded"
+        data.update(error.details)
+    return data
 
 class LangChainStreamingCallback:
-    """Callback handler for LangChain agent streaming."""
+    """Callback handler for LangChain agent streaming.
     
-    def __init__(self, on_event: Callable, run_id: str, event_queue: list):
+    Events go to `event_queue`, a list or a ThreadSafeEventBridge.
+    """
+    
+    def __init__(self, on_event: Callable, run_id: str, event_queue: list | ThreadSafeEventBridge):
         self.on_event = on_event
         self.run_id = run_id
         self.event_queue = event_queue
@@ -151,81 +508,314 @@ class LangChainStreamingCallback:
 class LangGraphAgentAdapter:
     """Adapter for real LangGraph state graphs with streaming to WebSocket."""
     
-    def __init__(self, on_event: Callable[[dict], None], on_final: Optional[Callable[[Any], None]] = None):
+    def __init__(
+        self,
+        on_event: Callable[[dict], None],
+        on_final: Optional[Callable[[Any], None]] = None,
+        history: Optional[RunHistoryStore] = None,
+        include_nodes: Optional[Iterable[str]] = None,
+        exclude_nodes: Optional[Iterable[str]] = None,
+        version: str = "v1",
+        coalesce_chunks: bool = True,
+        singleflight: Optional[SingleFlight] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        metrics: Optional[AgentMetrics] = None,
+        tool_result_threshold: Optional[int] = DEFAULT_THRESHOLD,
+        tool_chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
         """Initialize with callbacks for graph events and final result.
         
         Args:
             on_event: Async callback for graph events (emits AgentEvent-compliant events)
             on_final: Optional async callback called once with final state
+            history: Run history store (defaults to a bounded in-memory store)
+            include_nodes: Only stream events from these nodes (None = all)
+            exclude_nodes: Nodes kept off the wire (e.g., internal sub-chains)
+            version: astream_events schema version ("v1" or "v2")
+            coalesce_chunks: Merge consecutive text chunks from a node into one token event
+            singleflight: Share identical concurrent runs (e.g., agent_singleflight)
+            checkpoints: Store for per-node checkpoints, making runs resumable
+            metrics: Where run timings are recorded, keyed by share_key or graph
+                class (defaults to agent_metrics); nodes count as tool calls
+            tool_result_threshold: Node outputs larger than this many characters
+                are sent as tool_result_chunk events plus a summary (None = never)
+            tool_chunk_size: Characters per tool_result_chunk
         """
         self.on_event = on_event
         self.on_final = on_final
-        self.history = []
-        self.node_outputs = {}
+        self.history = history if history is not None else RunHistoryStore()
+        self.event_filter = GraphEventFilter(
+            ["on_chain_start", "on_chain_stream", "on_chain_end"],
+            include_nodes,
+            exclude_nodes,
+            version,
+        )
+        self.coalesce_chunks = coalesce_chunks
+        self.singleflight = singleflight
+        self.checkpoints = checkpoints
+        self.metrics = metrics if metrics is not None else agent_metrics
+        self.tool_result_threshold = tool_result_threshold
+        self.tool_chunk_size = tool_chunk_size
+        self._emit: Emit = on_event  # Where the current run's events go
+        self.node_outputs = {}  # Node outputs of the current (or last) run
+        self._completed_nodes: list[str] = []
         self._run_id = None
+        self._owner: Optional[str] = None  # Owner recorded in checkpoints
+        self._resume_token: Optional[str] = None  # Sent to the client in the start event
+        self._resume_token_hash: Optional[str] = None  # Recorded in checkpoints
+        self._started_at = 0.0
     
-    async def run_graph(self, graph: Any, initial_state: dict) -> dict:
+    async def run_graph(
+        self,
+        graph: Any,
+        initial_state: dict,
+        share_key: Optional[str] = None,
+        run_id: Optional[str] = None,
+        owner: Optional[str] = None,
+        resume_token: Optional[str] = None,
+    ) -> dict:
         """Run a real LangGraph state graph and stream node events.
         
         Args:
             graph: Compiled LangGraph StateGraph
             initial_state: Initial state dict
+            share_key: Singleflight target (e.g., the action target); defaults
+                to the graph's identity
+            run_id: Run ID to use (defaults to a new one). With a checkpoint
+                store, passing the ID of an earlier run reattaches to it while
+                it is still in progress, or resumes it if it was interrupted.
+            owner: Identity recorded in the run's checkpoints; the same owner
+                may resume or replay the run from any connection. Defaults to
+                the bound client's authenticated identity.
+            resume_token: Token from the `resume_token` field of the run's
+                start event; lets a client without an identity resume or
+                replay the run.
             
         Returns:
             Final graph state
+            
+        Raises:
+            PermissionError: If `run_id` names a checkpointed run and neither
+                `owner` nor `resume_token` matches it
         """
+        if owner is None:
+            owner = current_identity()
+        self._owner = owner
+        if run_id is not None and self.checkpoints is not None:
+            checkpoint = await self.checkpoints.load_async(run_id)
+            if checkpoint is not None:
+                if not _may_resume(checkpoint, owner, resume_token):
+                    raise PermissionError(f"Run {run_id} belongs to another client")
+                return await self._resume(graph, run_id, checkpoint, share_key or type(graph).__name__)
+        
+        agent = share_key or type(graph).__name__
+        if self.singleflight is None:
+            return await self._start_run(graph, initial_state, self.on_event, agent, run_id=run_id)
+        
+        key = flight_key(share_key or _target_of(graph), initial_state)
+        return await _run_shared(
+            self.singleflight,
+            key,
+            lambda emit: self._start_run(graph, initial_state, emit, agent, shared=True),
+            self.on_event,
+            self.on_final,
+        )
+    
+    async def _resume(self, graph: Any, run_id: str, checkpoint: dict, agent: str) -> dict:
+        """Reattach to a run in progress, replay a completed one, or resume an interrupted one."""
+        channel = run_channels.get(run_id)
+        if channel is not None and run_id in run_registry.runs:
+            # Still running: follow its events rather than starting it twice
+            await channel.subscribe(self.on_event, raw=True).wait_closed()
+            checkpoint = await self.checkpoints.load_async(run_id) or checkpoint
+            return checkpoint.get("final_state") or checkpoint["initial_state"]
+        
+        if checkpoint.get("status") == "completed":
+            self._run_id = run_id
+            self._emit = self.on_event
+            await self._emit({"run_id": run_id, "event": "start", "data": {"initial_state": checkpoint["initial_state"]}})
+            await self._replay_checkpoint(checkpoint)
+            await self._emit({"run_id": run_id, "event": "finish", "data": {"final_state": checkpoint.get("final_state")}})
+            return checkpoint.get("final_state") or checkpoint["initial_state"]
+        
+        return await self._start_run(graph, checkpoint["initial_state"], self.on_event, agent, run_id=run_id, checkpoint=checkpoint)
+    
+    async def _start_run(
+        self,
+        graph: Any,
+        initial_state: dict,
+        emit: Emit,
+        agent: str,
+        shared: bool = False,
+        run_id: Optional[str] = None,
+        checkpoint: Optional[dict] = None,
+    ) -> dict:
         import uuid
-        self._run_id = str(uuid.uuid4())
+        self._run_id = run_id or str(uuid.uuid4())
+        self._started_at = time.time()
+        self.node_outputs = dict(checkpoint["node_outputs"]) if checkpoint else {}
+        self._completed_nodes = list(checkpoint["completed_nodes"]) if checkpoint else []
+        self._resume_token = None
+        if checkpoint:
+            # The resumed run stays resumable by whoever could resume it before
+            self._owner = checkpoint.get("owner")
+            self._resume_token_hash = checkpoint.get("resume_token_hash")
+        elif self.checkpoints is not None and not shared:
+            self._resume_token = secrets.token_urlsafe(32)
+            self._resume_token_hash = _token_hash(self._resume_token)
+        else:
+            self._resume_token_hash = None
+        if shared:
+            # Shared runs outlive any one client; subscribers are tracked instead
+            bind_client(None, None)
+        
+        # Published so reconnecting clients and other viewers can follow the run
+        channel = run_channels.open(self._run_id)
+        
+        async def emit_and_publish(event: dict) -> None:
+            data = event["data"]
+            if event["event"] == "start" and "resume_token" in data:
+                # Only the client that started the run gets its resume token
+                data = {key: value for key, value in data.items() if key != "resume_token"}
+            channel.publish(event["event"], data)
+            await emit(event)
+        
+        self._emit = timed = _TimedEmit(emit_and_publish, self.metrics.start_run(agent, self._run_id))
+        try:
+            # Tracked so a client disconnect cancels the run
+            async with run_registry.track(self._run_id):
+                return await self._run_graph(graph, initial_state, checkpoint)
+        finally:
+            timed.finish()
+            run_channels.close(self._run_id, channel)
+    
+    async def _replay_checkpoint(self, checkpoint: dict) -> None:
+        """Re-emit the results of a checkpoint's completed nodes."""
+        for node in checkpoint["completed_nodes"]:
+            await self._emit_tool_result({"node": node, "output": checkpoint["node_outputs"].get(node)})
+    
+    async def _save_checkpoint(self, status: str, initial_state: dict, final_state: Any = None) -> None:
+        if self.checkpoints is None:
+            return
+        await self.checkpoints.save_async(self._run_id, {
+            "status": status,
+            "owner": self._owner,
+            "resume_token_hash": self._resume_token_hash,
+            "initial_state": initial_state,
+            "node_outputs": dict(self.node_outputs),
+            "completed_nodes": list(self._completed_nodes),
+            "final_state": final_state,
+        })
+    
+    async def _emit_chunks(self, chunks: list[str]) -> None:
+        if chunks:
+            await self._emit({
+                "run_id": self._run_id,
+                "event": "token",
+                "data": "".join(chunks)
+            })
+            chunks.clear()
+    
+    async def _run_graph(self, graph: Any, initial_state: dict, checkpoint: Optional[dict] = None) -> dict:
+        """Stream the graph's events, recording node outputs, checkpoints and history.
         
+        Graphs compiled with a LangGraph checkpointer run under
+        `thread_id=run_id`, so a resumed run continues after its last
+        completed node. For other graphs the completed nodes' events are
+        replayed from the checkpoint and not emitted again. Completed runs are
+        counted per node, so in cyclic graphs (agent -> tools -> agent) only
+        the occurrences already checkpointed are skipped, not later iterations.
+        """
+        native_resume = getattr(graph, "checkpointer", None) is not None
+        config = {"configurable": {"thread_id": self._run_id}} if native_resume else None
+        # node -> completed runs still to skip while the graph re-executes them
+        skip_runs = Counter(self._completed_nodes) if checkpoint and not native_resume else Counter()
         try:
             # Emit start event (AgentEvent.event = "start")
-            await self.on_event({
+            start_data = {"initial_state": initial_state}
+            if checkpoint:
+                start_data["resumed"] = True
+            if self._resume_token is not None:
+                start_data["resume_token"] = self._resume_token
+            await self._emit({
                 "run_id": self._run_id,
                 "event": "start",
-                "data": {"initial_state": initial_state}
+                "data": start_data
             })
+            if checkpoint:
+                await self._replay_checkpoint(checkpoint)
+            await self._save_checkpoint("running", initial_state)
             
-            # Stream graph execution
+            # Stream graph execution (a None input resumes a checkpointed thread)
             final_state = None
-            async for event in graph.astream_events(initial_state, version="v1"):
-                event_type = event.get("event")
-                
-                if event_type == "on_chain_start":
+            if checkpoint and checkpoint["completed_nodes"]:
+                final_state = checkpoint["node_outputs"].get(checkpoint["completed_nodes"][-1])
+            pending_chunks: list[str] = []  # Consecutive text chunks from `pending_node`
+            pending_node = None
+            graph_input = None if checkpoint and native_resume else initial_state
+            events = self.event_filter.stream(graph, graph_input, config)
+            try:
+                async for event in events:
+                    if not self.event_filter.wants(event):
+                        continue
+                    event_type = event["event"]
                     node_name = event.get("name")
-                    await self.on_event({
-                        "run_id": self._run_id,
-                        "event": "tool_call",
-                        "data": {
-                            "node": node_name,
-                            "data": event.get("data", {})
-                        }
-                    })
-                
-                elif event_type == "on_chain_stream":
-                    chunk = event.get("data", {}).get("chunk", "")
-                    if chunk:
-                        await self.on_event({
+                    if skip_runs[node_name] > 0:
+                        if event_type == "on_chain_end":
+                            # Already replayed; the state still moves on
+                            skip_runs[node_name] -= 1
+                            final_state = event.get("data", {}).get("output")
+                        continue
+                    
+                    if event_type == "on_chain_stream":
+                        chunk = event.get("data", {}).get("chunk", "")
+                        if not chunk:
+                            continue
+                        if self.coalesce_chunks and isinstance(chunk, str):
+                            if node_name != pending_node:
+                                await self._emit_chunks(pending_chunks)
+                                pending_node = node_name
+                            pending_chunks.append(chunk)
+                            continue
+                        await self._emit_chunks(pending_chunks)
+                        await self._emit({
                             "run_id": self._run_id,
                             "event": "token",
                             "data": chunk
                         })
+                        continue
+                    
+                    # Any other event ends the current run of chunks
+                    await self._emit_chunks(pending_chunks)
                 
-                elif event_type == "on_chain_end":
-                    node_name = event.get("name")
-                    output = event.get("data", {}).get("output")
-                    self.node_outputs[node_name] = output
-                    await self.on_event({
-                        "run_id": self._run_id,
-                        "event": "tool_result",
-                        "data": {
-                            "node": node_name,
-                            "output": output
-                        }
-                    })
-                    final_state = output
+                    if event_type == "on_chain_start":
+                        await self._emit({
+                            "run_id": self._run_id,
+                            "event": "tool_call",
+                            "data": {
+                                "node": node_name,
+                                "data": event.get("data", {})
+                            }
+                        })
+                
+                    elif event_type == "on_chain_end":
+                        output = event.get("data", {}).get("output")
+                        self.node_outputs[node_name] = output
+                        self._completed_nodes.append(node_name)
+                        await self._save_checkpoint("running", initial_state)
+                        await self._emit_tool_result({"node": node_name, "output": output})
+                        final_state = output
+                
+                await self._emit_chunks(pending_chunks)
+            finally:
+                # Closes the upstream stream on cancellation or error
+                aclose = getattr(events, "aclose", None)
+                if aclose is not None:
+                    await aclose()
             
             # Emit finish event (AgentEvent.event = "finish")
-            await self.on_event({
+            await self._save_checkpoint("completed", initial_state, final_state)
+            await self._emit({
                 "run_id": self._run_id,
                 "event": "finish",
                 "data": {"final_state": final_state}
@@ -237,45 +827,84 @@ class LangGraphAgentAdapter:
             
             # Track in history
             self.history.append({
+                "run_id": self._run_id,
                 "initial_state": initial_state,
                 "final_state": final_state,
-                "status": "success"
+                "node_outputs": self.node_outputs,
+                "status": "success",
+                "started_at": self._started_at
             })
             
             return final_state or initial_state
             
         except Exception as e:
             logger.error(f"Graph error: {e}")
+            await self._save_checkpoint("error", initial_state)
             # Emit error event (AgentEvent.event = "error")
-            await self.on_event({
+            await self._emit({
                 "run_id": self._run_id,
                 "event": "error",
                 "data": {"error": str(e)}
             })
             # Track error in history
             self.history.append({
+                "run_id": self._run_id,
                 "initial_state": initial_state,
+                "node_outputs": self.node_outputs,
                 "status": "error",
-                "error": str(e)
+                "error": str(e),
+                "started_at": self._started_at
             })
             raise
     
+    async def _emit_tool_result(self, data: dict) -> None:
+        await _emit_tool_result(self._emit, self._run_id, data, self.tool_result_threshold, self.tool_chunk_size)
+    
     def get_history(self):
-        """Return the history of all graph invocations."""
-        return self.history
+        """Return the recent graph invocations kept in memory."""
+        return list(self.history)
 
 class AgentWebSocketBridge:
-    """Bridge between agent events and WebSocket UI updates."""
+    """Bridge between agent events and WebSocket UI updates.
+    
+    The UI operations produced by one agent event are sent as a single
+    ui.patch message ({"patches": [...]} when there are several). Status
+    updates are throttled to one per `status_interval` with the latest value
+    winning; terminal statuses (completed, failed) are never delayed. Output
+    appends from graph node streams are merged and sent once per
+    `append_window`. Call `flush()` when a run ends, or `close()` to drop
+    whatever is still pending.
+    """
     
-    def __init__(self, websocket_send: Callable):
+    def __init__(
+        self,
+        websocket_send: Callable,
+        max_output_chars: Optional[int] = None,
+        status_interval: float = 0.1,
+        append_window: float = 0.05,
+    ):
         """Initialize with WebSocket send callback.
         
         Args:
             websocket_send: Async function to send messages over WebSocket
+            max_output_chars: Keep only the last N characters of accumulated output (None = all)
+            status_interval: Min seconds between agent_status updates
+            append_window: Seconds node-stream output is merged before sending
         """
         self.websocket_send = websocket_send
-        self.accumulated_output = ""
+        self.output = StreamBuffer(max_output_chars)
         self.state = "idle"  # idle, running, error
+        self.status_interval = status_interval
+        self.append_window = append_window
+        self.stats = {"events": 0, "messages": 0, "ops": 0}
+        self._ops: list[dict] = []  # Ops ready to send with the current event
+        self._pending_status: Optional[dict] = None  # Throttled, last value wins
+        self._last_status_at: Optional[float] = None
+        self._pending_append: list[str] = []
+        self._append_due = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = 0.0
+        self._flush_task: Optional[asyncio.Task] = None  # Started by the timer
     
     async def on_agent_event(self, event: dict):
         """Handle agent event and convert to UI updates.
@@ -284,32 +913,25 @@ class AgentWebSocketBridge:
             event: Agent event dict (type, data, etc)
         """
         event_type = event.get("type", "")
+        self.stats["events"] += 1
         
         # Convert agent events to UI patches
         if event_type == "agent.start":
             self.state = "running"
-            await self._send_ui_patch({
+            self._add_op({
                 "target": "agent_output",
                 "operation": "clear"
             })
-            await self._send_ui_patch({
-                "target": "agent_status",
-                "text": "🔄 Agent running...",
-                "operation": "update_props"
-            })
+            self._set_status("🔄 Agent running...")
         
         elif event_type == "agent.tool_start":
             tool = event.get("tool", "")
-            await self._send_ui_patch({
-                "target": "agent_status",
-                "text": f"🔧 Using tool: {tool}",
-                "operation": "update_props"
-            })
+            self._set_status(f"🔧 Using tool: {tool}")
         
         elif event_type == "agent.tool_end":
             output = event.get("output", "")
-            self.accumulated_output += f"\n{output}"
-            await self._send_ui_patch({
+            self.output.append(f"\n{output}")
+            self._add_op({
                 "target": "agent_output",
                 "text": output,
                 "operation": "append"
@@ -317,50 +939,146 @@ class AgentWebSocketBridge:
         
         elif event_type == "agent.result":
             output = event.get("output", "")
-            self.accumulated_output += f"\n{output}"
+            self.output.append(f"\n{output}")
             self.state = "idle"
-            await self._send_ui_patch({
+            self._add_op({
                 "target": "agent_output",
                 "text": output,
                 "operation": "append"
             })
-            await self._send_ui_patch({
-                "target": "agent_status",
-                "text": "✅ Agent completed",
-                "operation": "update_props"
-            })
+            self._set_status("✅ Agent completed", urgent=True)
         
         elif event_type == "agent.error":
             error = event.get("error", "Unknown error")
             self.state = "error"
-            await self._send_ui_patch({
+            self._add_op({
                 "target": "agent_output",
                 "text": f"❌ Error: {error}",
                 "operation": "append"
             })
-            await self._send_ui_patch({
-                "target": "agent_status",
-                "text": "❌ Agent failed",
-                "operation": "update_props"
-            })
+            self._set_status("❌ Agent failed", urgent=True)
         
         # LangGraph events
         elif event_type == "graph.node_stream":
             output = event.get("output", "")
-            self.accumulated_output += output
-            await self._send_ui_patch({
-                "target": "agent_output",
-                "text": output,
-                "operation": "append"
-            })
+            self.output.append(output)
+            if output:
+                if not self._pending_append:
+                    self._append_due = self._now() + self.append_window
+                self._pending_append.append(output)
         
         elif event_type == "graph.node_end":
             node = event.get("node", "")
-            await self._send_ui_patch({
-                "target": "agent_status",
-                "text": f"✓ {node} completed",
-                "operation": "update_props"
-            })
+            self._set_status(f"✓ {node} completed")
+        
+        await self._send_ops()
+        self._schedule_pending()
+    
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+    
+    def _add_op(self, op: dict) -> None:
+        # Streamed output comes first so the UI keeps event order
+        self._take_pending_append()
+        last = self._ops[-1] if self._ops else None
+        if (
+            last is not None and op["operation"] == "append" and last["operation"] == "append"
+            and last["target"] == op["target"]
+        ):
+            last["text"] += op["text"]
+        else:
+            self._ops.append(op)
+    
+    def _take_pending_append(self) -> None:
+        if self._pending_append:
+            text = "".join(self._pending_append)
+            self._pending_append = []
+            self._add_op({"target": "agent_output", "text": text, "operation": "append"})
+    
+    def _set_status(self, text: str, urgent: bool = False) -> None:
+        op = {"target": "agent_status", "text": text, "operation": "update_props"}
+        now = self._now()
+        if urgent or self._last_status_at is None or now - self._last_status_at >= self.status_interval:
+            self._pending_status = None
+            self._last_status_at = now
+            self._add_op(op)
+        else:
+            self._pending_status = op
+    
+    async def _send_ops(self) -> None:
+        if not self._ops:
+            return
+        ops, self._ops = self._ops, []
+        self.stats["messages"] += 1
+        self.stats["ops"] += len(ops)
+        await self._send_ui_patch(ops[0] if len(ops) == 1 else {"patches": ops})
+    
+    def _schedule_pending(self) -> None:
+        """Arm a timer for the earliest throttled status or merged append."""
+        due = []
+        if self._pending_append:
+            due.append(self._append_due)
+        if self._pending_status is not None:
+            due.append(self._last_status_at + self.status_interval)
+        if not due:
+            return
+        when = min(due)
+        if self._timer is not None:
+            if self._timer_at <= when:
+                return
+            self._timer.cancel()
+        self._timer_at = when
+        self._timer = asyncio.get_running_loop().call_at(when, self._start_flush)
+    
+    def _start_flush(self) -> None:
+        self._timer = None
+        # A timed flush that is still sending re-arms the timer when it's done
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_due())
+    
+    async def _flush_due(self) -> None:
+        now = self._now()
+        if self._pending_append and now >= self._append_due:
+            self._take_pending_append()
+        if self._pending_status is not None and now >= self._last_status_at + self.status_interval:
+            self._last_status_at = now
+            self._add_op(self._pending_status)
+            self._pending_status = None
+        try:
+            await self._send_ops()
+        except Exception as e:
+            logger.warning(f"Failed to send throttled UI patch: {e}")
+        self._schedule_pending()
+    
+    async def flush(self):
+        """Send throttled status and merged output now (e.g., when a run ends)."""
+        self._cancel_timer()
+        task, self._flush_task = self._flush_task, None
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            # Let a send in progress finish so frames stay in order
+            await asyncio.shield(task)
+            self._cancel_timer()  # Re-armed by the task
+        self._take_pending_append()
+        if self._pending_status is not None:
+            self._last_status_at = self._now()
+            self._add_op(self._pending_status)
+            self._pending_status = None
+        await self._send_ops()
+    
+    def close(self) -> None:
+        """Cancel the flush timer and drop throttled updates not yet sent."""
+        self._cancel_timer()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending_append = []
+        self._pending_status = None
+        self._ops = []
+    
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
     
     async def _send_ui_patch(self, patch_data: dict):
         """Send a UI patch to the WebSocket client.
@@ -368,19 +1086,17 @@ class AgentWebSocketBridge:
         Args:
             patch_data: Patch operation dict
         """
-        from agentprinter_fastapi.schemas import Message, MessageHeader
-        
-        patch_msg = Message(
-            type="ui.patch",
-            header=MessageHeader(trace_id="agent-stream"),
-            payload=patch_data
-        )
+        from agentprinter_fastapi.envelope import make_envelope
         
-        await self.websocket_send(patch_msg.model_dump(mode='json'))
+        await self.websocket_send(make_envelope("ui.patch", patch_data, "agent-stream"))
+    
+    @property
+    def accumulated_output(self) -> str:
+        return self.output.text
     
     def get_accumulated_output(self) -> str:
         """Return accumulated output from agent events."""
-        return self.accumulated_output
+        return self.output.text
     
     def get_state(self) -> str:
         """Return current state (idle, running, error)."""
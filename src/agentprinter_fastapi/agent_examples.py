@@ -181,7 +181,11 @@ async def handle_research_agent(message, websocket):
     
     # Run graph
     topic = message.payload.get("topic", "Python")
-    result = await adapter.run_graph(graph, {"topic": topic})
+    try:
+        result = await adapter.run_graph(graph, {"topic": topic})
+        await bridge.flush()  # Send any throttled status / merged output
+    finally:
+        bridge.close()  # Stop the throttle timer if the run failed
     
     # Send final result
     await websocket.send_json(Message(
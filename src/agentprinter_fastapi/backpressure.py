@@ -1,7 +1,7 @@
 """Backpressure controls and rate limiting for message processing."""
 import time
 import asyncio
-from typing import Optional
+from typing import Any, Awaitable, Callable, Optional
 from collections import deque
 import logging
 
@@ -55,6 +55,10 @@ class RateLimiter:
         # Count messages still in window
         in_window = sum(1 for ts in bucket if ts > cutoff)
         return max(0, self.rate - in_window)
+    
+    def forget(self, client_id: str) -> None:
+        """Drop a client's bucket (e.g., when its connection closes)."""
+        self.buckets.pop(client_id, None)
 
 class BackpressureController:
     """Manages message queuing and backpressure for slow consumers."""
@@ -121,6 +125,118 @@ class BackpressureController:
             return 0
         return self.queues[client_id].qsize()
 
+class WatermarkChannel:
+    """Bounded channel between a stream producer and a slower consumer.
+    
+    The producer's `put` returns immediately while the buffered weight is
+    below `high_water`; at the high-water mark it blocks until a background
+    task delivering items to `send` has drained the buffer to `low_water`.
+    Upstream reading (e.g., an LLM stream) therefore pauses for slow clients
+    and memory stays flat. Use as an async context manager: leaving the block
+    waits for buffered items to be delivered.
+    """
+    
+    def __init__(
+        self,
+        send: Callable[[Any], Awaitable[None]],
+        high_water: int = 64,
+        low_water: Optional[int] = None,
+        weigh: Callable[[Any], int] = lambda item: 1,
+    ):
+        """Initialize watermark channel.
+        
+        Args:
+            send: Async consumer called once per item, in order
+            high_water: Buffered weight at which the producer is paused
+            low_water: Buffered weight at which it resumes (default: high_water // 4)
+            weigh: Weight of an item (default 1 per item; e.g. `len` for characters)
+        """
+        self.send = send
+        self.high_water = high_water
+        self.low_water = low_water if low_water is not None else high_water // 4
+        self.weigh = weigh
+        self.buffered = 0
+        self.stats = {"items": 0, "pauses": 0, "max_buffered": 0}
+        self._items: deque[tuple[Any, int]] = deque()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._readable = asyncio.Event()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def paused(self) -> bool:
+        return not self._writable.is_set()
+    
+    async def put(self, item: Any) -> None:
+        """Buffer an item for delivery, waiting while the channel is above high water.
+        
+        Raises:
+            Exception: The consumer's error, if `send` has failed
+        """
+        await self._writable.wait()
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        
+        weight = self.weigh(item)
+        self._items.append((item, weight))
+        self.buffered += weight
+        self.stats["items"] += 1
+        self.stats["max_buffered"] = max(self.stats["max_buffered"], self.buffered)
+        self._readable.set()
+        if self.buffered >= self.high_water:
+            self.stats["pauses"] += 1
+            self._writable.clear()
+    
+    async def _drain(self) -> None:
+        try:
+            while True:
+                if not self._items:
+                    if self._closed:
+                        return
+                    self._readable.clear()
+                    await self._readable.wait()
+                    continue
+                item, weight = self._items.popleft()
+                await self.send(item)
+                self.buffered -= weight
+                if self.buffered <= self.low_water:
+                    self._writable.set()
+        except Exception as e:
+            # Surface the failure to the producer instead of leaving it blocked
+            self._error = e
+            self._writable.set()
+            raise
+    
+    async def aclose(self) -> None:
+        """Wait until every buffered item has been delivered."""
+        self._closed = True
+        self._readable.set()
+        if self._task is not None:
+            await self._task
+    
+    def cancel(self) -> None:
+        """Drop buffered items and stop delivering."""
+        self._closed = True
+        self._items.clear()
+        self.buffered = 0
+        if self._task is not None:
+            self._task.cancel()
+    
+    async def __aenter__(self) -> "WatermarkChannel":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.aclose()
+        else:
+            self.cancel()
+            if self._task is not None:
+                await asyncio.gather(self._task, return_exceptions=True)
+
 # Global instances
 rate_limiter = RateLimiter(rate=1000, window_seconds=1)  # 1000 msg/sec per client
 backpressure = BackpressureController(max_queue_size=5000)
@@ -0,0 +1,311 @@
+"""Content-addressed blob store for payloads too large to inline in frames."""
+import asyncio
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+import logging
+from .runs import current_identity
+from .tool_chunks import fits_within
+
+logger = logging.getLogger(__name__)
+
+BLOB_URL_PREFIX = "/blobs/"
+
+# Payload values kept inline next to a blob reference, so clients can route
+# the message (e.g., run_id, event) before fetching it
+_MAX_INLINE_SCALAR = 256
+
+class BlobStore:
+    """Blobs keyed by the sha256 of their content, in memory with a disk tier.
+
+    Memory holds up to `max_memory_bytes` (least recently used blobs are
+    evicted). With a directory, every blob is also written to disk once, so
+    evicted blobs stay retrievable; without one, evicted blobs are gone. The
+    files this store writes are deleted, least recently stored first, once
+    they exceed `max_disk_bytes` or are older than `ttl`.
+
+    A blob's ID is a content hash, so knowing it isn't enough to fetch it:
+    reference URLs carry a signature (`sig`) only this store can issue, and
+    blobs stored on behalf of an authenticated identity are only served to
+    that identity (see `may_read`).
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        directory: Optional[Path | str] = None,
+        max_disk_bytes: Optional[int] = 1024 * 1024 * 1024,
+        ttl: Optional[float] = 3600.0,
+    ):
+        """Initialize blob store.
+
+        Args:
+            max_memory_bytes: Bytes of blob content kept in memory
+            directory: Optional directory for the disk tier (created on first write)
+            max_disk_bytes: Bytes of blob files kept on disk (None = unbounded)
+            ttl: Seconds a blob file is kept after it was last stored (None = forever)
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = Path(directory) if directory is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._blobs: OrderedDict[str, bytes] = OrderedDict()
+        self._disk: OrderedDict[str, tuple[int, float]] = OrderedDict()  # blob_id -> (size, stored_at), oldest first
+        self._content_types: Dict[str, str] = {}  # Only for blobs held in a tier
+        self._owners: Dict[str, Optional[Set[str]]] = {}  # Identities allowed to read; None = any holder of the URL
+        self._secret = secrets.token_bytes(32)  # Signs reference URLs
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"puts": 0, "dedup_hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_evictions": 0}
+
+    def _path(self, blob_id: str) -> Path:
+        return self.directory / blob_id[:2] / blob_id
+
+    def put(self, data: bytes, content_type: str = "application/json", owner: Optional[str] = None) -> dict[str, Any]:
+        """Store `data` (once per distinct content) and return its reference.
+
+        Hashing and writing are blocking; use `put_async` on the event loop.
+
+        Args:
+            data: Blob content
+            content_type: Media type the blob is served with
+            owner: Identity allowed to read it (defaults to the bound
+                client's authenticated identity; None = any holder of the URL)
+
+        Returns:
+            {"id", "size", "content_type", "url"}
+        """
+        if owner is None:
+            owner = current_identity()
+        blob_id = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.stats["puts"] += 1
+            if blob_id in self._blobs:
+                self._blobs.move_to_end(blob_id)
+                self.stats["dedup_hits"] += 1
+            else:
+                self._remember(blob_id, data)
+            self._content_types[blob_id] = content_type
+            self._add_owner(blob_id, owner)
+        if self._write(blob_id, data):
+            self._record_file(blob_id, len(data))
+        url = f"{BLOB_URL_PREFIX}{blob_id}?sig={self.signature(blob_id)}"
+        return {"id": blob_id, "size": len(data), "content_type": content_type, "url": url}
+
+    async def put_async(self, data: bytes, content_type: str = "application/json", owner: Optional[str] = None) -> dict[str, Any]:
+        """`put` in a worker thread, so large blobs don't stall the event loop."""
+        return await asyncio.to_thread(self.put, data, content_type, owner)
+
+    def _add_owner(self, blob_id: str, owner: Optional[str]) -> None:
+        """Record who may read a blob (caller holds the lock)."""
+        if owner is None:
+            self._owners[blob_id] = None  # Stored without an identity: the URL is enough
+        elif blob_id not in self._owners:
+            self._owners[blob_id] = {owner}
+        elif self._owners[blob_id] is not None:
+            self._owners[blob_id].add(owner)
+
+    def _forget(self, blob_id: str) -> None:
+        """Drop a blob's metadata once no tier holds it (caller holds the lock)."""
+        self._content_types.pop(blob_id, None)
+        self._owners.pop(blob_id, None)
+
+    def signature(self, blob_id: str) -> str:
+        """Return the `sig` that reference URLs for `blob_id` carry."""
+        return hmac.new(self._secret, blob_id.encode(), hashlib.sha256).hexdigest()
+
+    def may_read(self, blob_id: str, sig: Optional[str], identity: Optional[str] = None) -> bool:
+        """Check a fetch: the URL's signature must match, and the reader must own an owned blob."""
+        if not isinstance(sig, str) or not hmac.compare_digest(sig, self.signature(blob_id)):
+            return False
+        with self._lock:
+            owners = self._owners.get(blob_id)
+        return owners is None or identity in owners
+
+    def _remember(self, blob_id: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return  # Disk only
+        self._blobs[blob_id] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            evicted_id, evicted = self._blobs.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            if evicted_id not in self._disk:
+                self._forget(evicted_id)
+
+    def _write(self, blob_id: str, data: bytes) -> bool:
+        """Write the blob's file if it is missing; return whether it is on disk."""
+        if self.directory is None:
+            return False
+        path = self._path(blob_id)
+        if path.exists():
+            return True
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # Atomic, so readers never see a partial blob
+            return True
+        except OSError as e:
+            logger.warning(f"Failed to write blob {blob_id}: {e}")
+            return False
+
+    def _record_file(self, blob_id: str, size: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            previous = self._disk.pop(blob_id, None)
+            if previous is not None:
+                self._disk_bytes -= previous[0]
+            self._disk[blob_id] = (size, now)
+            self._disk_bytes += size
+            expired = self._expired_files(now)
+        self._delete_files(expired)
+
+    def _expired_files(self, now: float) -> list[str]:
+        """Drop files over the size or age limit from the index (caller holds the lock)."""
+        victims = []
+        while self._disk:
+            blob_id, (size, stored_at) = next(iter(self._disk.items()))
+            too_big = self.max_disk_bytes is not None and self._disk_bytes > self.max_disk_bytes
+            too_old = self.ttl is not None and now - stored_at > self.ttl
+            if not (too_big or too_old):
+                break
+            self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            if blob_id not in self._blobs:
+                self._forget(blob_id)
+            victims.append(blob_id)
+        return victims
+
+    def _delete_files(self, blob_ids: list[str]) -> None:
+        for blob_id in blob_ids:
+            self.stats["disk_evictions"] += 1
+            try:
+                self._path(blob_id).unlink()
+            except OSError:
+                pass
+
+    def prune(self) -> int:
+        """Delete blob files past the TTL now, rather than on the next put.
+
+        Returns:
+            Files deleted
+        """
+        with self._lock:
+            expired = self._expired_files(time.monotonic())
+        self._delete_files(expired)
+        return len(expired)
+
+    def content_type(self, blob_id: str) -> str:
+        return self._content_types.get(blob_id, "application/octet-stream")
+
+    def size(self, blob_id: str) -> Optional[int]:
+        """Return the blob's size in bytes, or None if it is unknown."""
+        with self._lock:
+            data = self._blobs.get(blob_id)
+        if data is not None:
+            return len(data)
+        if self.directory is not None and _valid_id(blob_id):
+            try:
+                return self._path(blob_id).stat().st_size
+            except OSError:
+                pass
+        return None
+
+    def read(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        """Return bytes [start, end) of a blob (the whole blob by default), or None.
+
+        Disk-tier reads only load the requested range.
+        """
+        with self._lock:
+            data = self._blobs.get(blob_id)
+            if data is not None:
+                self._blobs.move_to_end(blob_id)
+                self.stats["memory_hits"] += 1
+                return data[start:end]
+        if self.directory is None or not _valid_id(blob_id):
+            self.stats["misses"] += 1
+            return None
+        try:
+            with open(self._path(blob_id), "rb") as f:
+                f.seek(start)
+                chunk = f.read() if end is None else f.read(max(0, end - start))
+        except OSError:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        return chunk
+
+    async def size_async(self, blob_id: str) -> Optional[int]:
+        """`size` in a worker thread (it may stat the blob's file)."""
+        return await asyncio.to_thread(self.size, blob_id)
+
+    async def read_async(self, blob_id: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        """`read` in a worker thread, so disk-tier reads don't stall the event loop."""
+        return await asyncio.to_thread(self.read, blob_id, start, end)
+
+    def __contains__(self, blob_id: str) -> bool:
+        return self.size(blob_id) is not None
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            **self.stats,
+            "memory_blobs": len(self._blobs),
+            "memory_bytes": self._memory_bytes,
+            "disk_blobs": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+def _valid_id(blob_id: str) -> bool:
+    # Blob IDs come from URLs; only hex digests may reach the filesystem
+    return len(blob_id) == 64 and all(c in "0123456789abcdef" for c in blob_id)
+
+def _oversized(message: dict[str, Any], threshold: int) -> bool:
+    payload = message.get("payload")
+    return isinstance(payload, dict) and "$blob" not in payload and not fits_within(payload, threshold)
+
+def externalize(message: dict[str, Any], threshold: int, store: Optional[BlobStore] = None) -> dict[str, Any]:
+    """Move an oversized message payload into the blob store.
+
+    If the payload's JSON exceeds `threshold` bytes, it is stored as a blob
+    and the message gets a new payload: the original's short scalar fields
+    (e.g., run_id, event) plus "$blob": {"id", "size", "content_type",
+    "url"}. Clients fetch the URL to get the full original payload. Smaller
+    messages are returned unchanged.
+    """
+    if not _oversized(message, threshold):
+        return message
+    payload = message["payload"]
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if len(data) <= threshold:
+        return message
+
+    ref = (store if store is not None else blob_store).put(data)
+    inline = {
+        k: v for k, v in payload.items()
+        if v is None or isinstance(v, (bool, int, float)) or (isinstance(v, str) and len(v) <= _MAX_INLINE_SCALAR)
+    }
+    return {**message, "payload": {**inline, "$blob": ref}}
+
+async def externalize_async(message: dict[str, Any], threshold: int, store: Optional[BlobStore] = None) -> dict[str, Any]:
+    """`externalize` for the event loop: oversized payloads are serialized, hashed and stored in a worker thread."""
+    if not _oversized(message, threshold):
+        return message
+    return await asyncio.to_thread(externalize, message, threshold, store)
+
+# Global store; blobs spill to a per-process temp directory, removed at exit
+_BLOB_DIRECTORY = Path(tempfile.gettempdir()) / f"agentprinter-blobs-{os.getpid()}"
+blob_store = BlobStore(directory=_BLOB_DIRECTORY)
+atexit.register(shutil.rmtree, _BLOB_DIRECTORY, True)
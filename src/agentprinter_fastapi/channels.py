@@ -0,0 +1,256 @@
+"""Per-run event channels so any number of viewers can watch an agent run."""
+import asyncio
+import itertools
+import secrets
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+from .envelope import make_envelope
+from .runs import RunIdInUse, current_client
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[dict], Awaitable[None]]
+
+_subscription_ids = itertools.count(1)
+
+class Subscription:
+    """One viewer of a run: a queue of frames drained to `send` by a pump task."""
+
+    def __init__(
+        self,
+        channel: "RunChannel",
+        send: Send,
+        trace_id: str,
+        owner: Optional[str],
+        max_queue: int,
+        raw: bool = False,
+    ):
+        self.id = next(_subscription_ids)
+        self.channel = channel
+        self.send = send
+        self.trace_id = trace_id
+        self.owner = owner
+        self.raw = raw  # Deliver bare AgentEvent payloads instead of envelopes
+        self.queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(max_queue)
+        self.task: Optional[asyncio.Task] = None
+
+    async def _pump(self) -> None:
+        try:
+            while True:
+                payload = await self.queue.get()
+                if payload is None:
+                    return
+                await self.send(payload if self.raw else make_envelope("agent.event", payload, self.trace_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Dropping viewer {self.id} of run {self.channel.run_id}: {e}")
+        finally:
+            self.channel._detach(self)
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def wait_closed(self) -> None:
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
+
+class RunChannel:
+    """Bounded, compacted event log of one run plus its live subscribers.
+
+    Consecutive token events are merged in the log, so a viewer attaching
+    mid-run catches up with the accumulated text rather than every token,
+    then receives the live tail. The merged text is kept as a list of parts
+    and only joined when a viewer catches up or the token run ends, so
+    publishing stays linear in the output size. When the log exceeds
+    `max_events` the oldest entries are dropped. A viewer that falls
+    `max_queue` events behind is disconnected rather than slowing the run down.
+
+    `owner` is the client (connection or multiplexed session) that started
+    the run; other clients need `share_token` to watch it (see `can_view`).
+    """
+
+    def __init__(self, run_id: str, max_events: int = 500, max_queue: int = 1000, owner: Optional[str] = None):
+        """Initialize run channel.
+
+        Args:
+            run_id: Run this channel carries
+            max_events: Max entries kept in the catch-up log
+            max_queue: Max frames buffered per subscriber
+            owner: Client ID allowed to watch without the share token
+        """
+        self.run_id = run_id
+        self.max_events = max_events
+        self.max_queue = max_queue
+        self.owner = owner
+        self.share_token = secrets.token_urlsafe(16)
+        self.log: deque[dict[str, Any]] = deque()
+        self._token_parts: Optional[list[str]] = None  # Parts of the trailing token entry
+        self.dropped = 0  # Log entries evicted by the bound
+        self.closed = False
+        self.subscribers: Dict[int, Subscription] = {}
+
+    def publish(self, event: str, data: Any) -> None:
+        """Record an event and queue it for every subscriber (never blocks)."""
+        payload = {"run_id": self.run_id, "event": event, "data": data}
+        if event == "token" and isinstance(data, str) and self._token_parts is not None:
+            self._token_parts.append(data)
+        else:
+            self._join_tokens()
+            self.log.append(payload)
+            if event == "token" and isinstance(data, str):
+                self._token_parts = [data]
+            if len(self.log) > self.max_events:
+                self.log.popleft()
+                self.dropped += 1
+
+        for subscription in list(self.subscribers.values()):
+            try:
+                subscription.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                logger.warning(f"Viewer {subscription.id} of run {self.run_id} fell behind; disconnecting")
+                self.unsubscribe(subscription)
+
+    def subscribe(
+        self,
+        send: Send,
+        trace_id: str = "agent-stream",
+        owner: Optional[str] = None,
+        raw: bool = False,
+    ) -> Subscription:
+        """Attach a viewer: it gets the compacted log, then the live tail.
+
+        Args:
+            send: Async callable that delivers a frame (e.g., websocket.send_json)
+            trace_id: Trace ID stamped on the viewer's frames
+            owner: Optional owner key (e.g., connection id) for bulk unsubscribe
+            raw: Send bare {"run_id", "event", "data"} payloads (e.g., to an adapter's on_event)
+        """
+        subscription = Subscription(self, send, trace_id, owner, max(self.max_queue, len(self.log) + 1), raw)
+        if self._token_parts is not None:
+            self._join_tokens()
+            self._token_parts = [self.log[-1]["data"]]
+        # Catch-up and registration happen without yielding, so the viewer
+        # sees every event exactly once
+        for payload in self.log:
+            subscription.queue.put_nowait(payload)
+        if self.closed:
+            subscription.queue.put_nowait(None)
+        else:
+            self.subscribers[subscription.id] = subscription
+        subscription.task = asyncio.create_task(subscription._pump())
+        return subscription
+
+    def _join_tokens(self) -> None:
+        """Write the trailing token parts into the last log entry and stop merging."""
+        if self._token_parts is None:
+            return
+        if len(self._token_parts) > 1:
+            self.log[-1] = {**self.log[-1], "data": "".join(self._token_parts)}
+        self._token_parts = None
+
+    def can_view(self, viewer: Optional[str], token: Optional[str] = None) -> bool:
+        """Check whether a client may watch this run: its owner, or anyone with the share token."""
+        if token is not None and secrets.compare_digest(str(token), self.share_token):
+            return True
+        return viewer is not None and viewer == self.owner
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.cancel()
+        self._detach(subscription)
+
+    def _detach(self, subscription: Subscription) -> None:
+        self.subscribers.pop(subscription.id, None)
+
+    def close(self) -> None:
+        """End the run: subscribers drain their queued events, then stop."""
+        self.closed = True
+        for subscription in list(self.subscribers.values()):
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                subscription.cancel()
+        self.subscribers.clear()
+
+class RunChannelRegistry:
+    """Open run channels by run ID."""
+
+    def __init__(self, max_events: int = 500, max_queue: int = 1000):
+        """Initialize channel registry.
+
+        Args:
+            max_events: Catch-up log bound for new channels
+            max_queue: Per-subscriber frame buffer for new channels
+        """
+        self.max_events = max_events
+        self.max_queue = max_queue
+        self.channels: Dict[str, RunChannel] = {}
+
+    def open(self, run_id: str, owner: Optional[str] = None) -> RunChannel:
+        """Open a run's channel, owned by `owner` (default: the bound client's connection).
+
+        Raises:
+            RunIdInUse: If a live run already has a channel under `run_id`
+        """
+        existing = self.channels.get(run_id)
+        if existing is not None and not existing.closed:
+            raise RunIdInUse(run_id)
+        if owner is None:
+            owner = current_client()[0]
+        channel = RunChannel(run_id, self.max_events, self.max_queue, owner)
+        self.channels[run_id] = channel
+        return channel
+
+    def get(self, run_id: str) -> Optional[RunChannel]:
+        return self.channels.get(run_id)
+
+    def close(self, run_id: str, channel: Optional[RunChannel] = None) -> None:
+        """Close a run's channel; with `channel`, only if it is still the one registered."""
+        current = self.channels.get(run_id)
+        if current is None or (channel is not None and current is not channel):
+            return
+        del self.channels[run_id]
+        current.close()
+
+    def subscribe(
+        self,
+        run_id: str,
+        send: Send,
+        trace_id: str = "agent-stream",
+        owner: Optional[str] = None,
+        raw: bool = False,
+    ) -> Subscription:
+        """Attach a viewer to a live run.
+
+        Raises:
+            KeyError: If no run with this ID is streaming
+        """
+        channel = self.channels.get(run_id)
+        if channel is None:
+            raise KeyError(f"No active run: {run_id}")
+        return channel.subscribe(send, trace_id, owner, raw)
+
+    def can_view(self, run_id: str, viewer: Optional[str], token: Optional[str] = None) -> bool:
+        """Check whether `viewer` may subscribe to a live run (see `RunChannel.can_view`)."""
+        channel = self.channels.get(run_id)
+        return channel is not None and channel.can_view(viewer, token)
+
+    def unsubscribe(self, run_id: str, owner: str) -> int:
+        """Detach `owner`'s viewers from a run. Returns how many were removed."""
+        channel = self.channels.get(run_id)
+        if channel is None:
+            return 0
+        mine = [s for s in channel.subscribers.values() if s.owner == owner]
+        for subscription in mine:
+            channel.unsubscribe(subscription)
+        return len(mine)
+
+    def unsubscribe_owner(self, owner: str) -> None:
+        """Detach every viewer belonging to `owner` (e.g., a closed connection)."""
+        for run_id in list(self.channels):
+            self.unsubscribe(run_id, owner)
+
+# Global registry
+run_channels = RunChannelRegistry()
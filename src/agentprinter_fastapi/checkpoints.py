@@ -0,0 +1,203 @@
+"""Per-run checkpoints of completed graph nodes, so interrupted runs can resume."""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore:
+    """In-memory checkpoint store, bounded by run count and age.
+
+    A checkpoint is a JSON-serializable dict: `run_id`, `status` ("running",
+    "completed" or "error"), `owner`, `resume_token_hash`, `initial_state`,
+    `node_outputs`, `completed_nodes` (in completion order), `final_state`
+    and `updated_at`. A "running" checkpoint whose run is not in progress
+    was interrupted.
+
+    Code on the event loop should use `save_async`/`load_async`, which keep
+    file I/O (in `FileCheckpointStore`) off the loop.
+
+    At most `max_runs` checkpoints are kept (the least recently updated are
+    evicted), and with a `ttl` checkpoints not updated for that many seconds
+    expire.
+    """
+
+    def __init__(self, max_runs: int = 1000, ttl: Optional[float] = None):
+        """Initialize checkpoint store.
+
+        Args:
+            max_runs: Checkpoints kept; the least recently updated are evicted
+            ttl: Seconds after its last update that a checkpoint expires (None = never)
+        """
+        self.max_runs = max_runs
+        self.ttl = ttl
+        self._max_memory = max_runs  # Checkpoints held in memory
+        self._checkpoints: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, checkpoint: dict[str, Any], now: float) -> bool:
+        return self.ttl is not None and now - checkpoint.get("updated_at", 0) > self.ttl
+
+    def _remember(self, run_id: str, checkpoint: dict[str, Any]) -> None:
+        # Caller holds the lock
+        self._checkpoints[run_id] = checkpoint
+        self._checkpoints.move_to_end(run_id)
+        while len(self._checkpoints) > self._max_memory:
+            self._checkpoints.popitem(last=False)
+
+    def save(self, run_id: str, checkpoint: dict[str, Any]) -> None:
+        """Store the latest checkpoint for a run."""
+        checkpoint = {**checkpoint, "run_id": run_id, "updated_at": time.time()}
+        with self._lock:
+            self._remember(run_id, checkpoint)
+
+    def load(self, run_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            checkpoint = self._checkpoints.get(run_id)
+            if checkpoint is not None and self._expired(checkpoint, time.time()):
+                del self._checkpoints[run_id]
+                checkpoint = None
+        return dict(checkpoint) if checkpoint is not None else None
+
+    async def save_async(self, run_id: str, checkpoint: dict[str, Any]) -> None:
+        self.save(run_id, checkpoint)
+
+    async def load_async(self, run_id: str) -> Optional[dict[str, Any]]:
+        return self.load(run_id)
+
+    def delete(self, run_id: str) -> None:
+        with self._lock:
+            self._checkpoints.pop(run_id, None)
+
+    def interrupted(self) -> list[str]:
+        """Return the run IDs whose last checkpoint is still "running"."""
+        now = time.time()
+        with self._lock:
+            return [
+                run_id for run_id, c in self._checkpoints.items()
+                if c.get("status") == "running" and not self._expired(c, now)
+            ]
+
+class FileCheckpointStore(CheckpointStore):
+    """Checkpoint store backed by one JSON file per run, surviving restarts.
+
+    Memory only caches the `max_cached` most recently used checkpoints. The
+    files are bounded by `max_runs` and `ttl` like the in-memory store; they
+    are pruned every `prune_every` saves (and by `prune()`).
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        max_runs: int = 10_000,
+        ttl: Optional[float] = None,
+        max_cached: int = 256,
+        prune_every: int = 100,
+    ):
+        """Initialize file checkpoint store.
+
+        Args:
+            directory: Directory holding one checkpoint file per run
+            max_runs: Checkpoint files kept; the least recently updated are deleted
+            ttl: Seconds after its last update that a checkpoint expires (None = never)
+            max_cached: Checkpoints cached in memory
+            prune_every: Saves between pruning passes over the directory
+        """
+        super().__init__(max_runs=max_runs, ttl=ttl)
+        self._max_memory = max_cached
+        self.prune_every = prune_every
+        self._saves = 0
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, run_id: str) -> Path:
+        # Run IDs come from clients: hashing keeps them inside the directory
+        # and distinct IDs (e.g., "a/b" and "a_b") in distinct files
+        return self.directory / f"{hashlib.sha256(run_id.encode('utf-8')).hexdigest()}.json"
+
+    def save(self, run_id: str, checkpoint: dict[str, Any]) -> None:
+        checkpoint = {**checkpoint, "run_id": run_id, "updated_at": time.time()}
+        with self._lock:
+            self._remember(run_id, checkpoint)
+            self._saves += 1
+            prune = self._saves % self.prune_every == 0
+        path = self._path(run_id)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, default=str)
+            os.replace(tmp, path)  # Atomic, so a crash never leaves a torn checkpoint
+        except OSError as e:
+            logger.warning(f"Failed to write checkpoint for run {run_id}: {e}")
+        if prune:
+            self.prune()
+
+    async def save_async(self, run_id: str, checkpoint: dict[str, Any]) -> None:
+        await asyncio.to_thread(self.save, run_id, checkpoint)
+
+    async def load_async(self, run_id: str) -> Optional[dict[str, Any]]:
+        return await asyncio.to_thread(self.load, run_id)
+
+    def prune(self) -> int:
+        """Delete expired checkpoint files and the oldest beyond `max_runs`.
+
+        Returns:
+            Number of files deleted
+        """
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        files.sort()
+        now = time.time()
+        doomed = [path for mtime, path in files if self.ttl is not None and now - mtime > self.ttl]
+        kept = len(files) - len(doomed)
+        if kept > self.max_runs:
+            doomed.extend(path for _, path in files[len(doomed):len(doomed) + kept - self.max_runs])
+        for path in doomed:
+            path.unlink(missing_ok=True)
+        return len(doomed)
+
+    def load(self, run_id: str) -> Optional[dict[str, Any]]:
+        checkpoint = super().load(run_id)
+        if checkpoint is not None:
+            return checkpoint
+        try:
+            with open(self._path(run_id), encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint for run {run_id}: {e}")
+            return None
+        if checkpoint.get("run_id") != run_id or self._expired(checkpoint, time.time()):
+            return None
+        with self._lock:
+            self._remember(run_id, checkpoint)
+        return dict(checkpoint)
+
+    def delete(self, run_id: str) -> None:
+        super().delete(run_id)
+        self._path(run_id).unlink(missing_ok=True)
+
+    def interrupted(self) -> list[str]:
+        run_ids = []
+        now = time.time()
+        for path in self.directory.glob("*.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if checkpoint.get("status") == "running" and "run_id" in checkpoint and not self._expired(checkpoint, now):
+                run_ids.append(checkpoint["run_id"])
+        return run_ids
@@ -0,0 +1,93 @@
+"""Deadlines for bounding action handlers, agent runs and LLM streams."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work runs past its deadline."""
+
+    def __init__(self, timeout: float, **details: Any):
+        super().__init__(f"Deadline of {timeout * 1000:.0f}ms exceeded")
+        self.timeout = timeout
+        self.details = {"timeout_ms": int(timeout * 1000), **details}
+
+class Deadline:
+    """A point in monotonic time after which work should be abandoned."""
+
+    __slots__ = ("timeout", "when")
+
+    def __init__(self, timeout: float):
+        """Create a deadline `timeout` seconds from now.
+
+        Args:
+            timeout: Time budget in seconds
+        """
+        self.timeout = timeout
+        self.when = time.monotonic() + timeout
+
+    @classmethod
+    def coerce(cls, value: "Deadline | float | None") -> Optional["Deadline"]:
+        """Turn a Deadline, a timeout in seconds or None into a Deadline.
+
+        None falls back to the deadline of the enclosing scope, if any.
+        """
+        if value is None:
+            return current_deadline()
+        if isinstance(value, Deadline):
+            return value
+        return cls(float(value))
+
+    @staticmethod
+    def earliest(*deadlines: Optional["Deadline"]) -> Optional["Deadline"]:
+        """Return the deadline that expires first, ignoring None."""
+        candidates = [d for d in deadlines if d is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda d: d.when)
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.when - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.when
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("agentprinter_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline of the enclosing `enforce_deadline` scope, if any."""
+    return _current_deadline.get()
+
+@asynccontextmanager
+async def enforce_deadline(deadline: Optional[Deadline], **details: Any):
+    """Cancel the enclosed block when `deadline` passes.
+
+    The deadline is also published to `current_deadline()` so nested runners
+    and adapters pick it up without threading it through every call. An
+    enclosing deadline that expires sooner stays the published one.
+
+    Raises:
+        DeadlineExceeded: If the block was cancelled because the deadline passed
+    """
+    if deadline is None:
+        yield
+        return
+
+    token = _current_deadline.set(Deadline.earliest(deadline, current_deadline()))
+    timeout = asyncio.timeout(deadline.remaining())
+    try:
+        async with timeout:
+            yield
+    except TimeoutError as e:
+        if isinstance(e, DeadlineExceeded) or not timeout.expired():
+            raise
+        logger.warning(f"Deadline exceeded: {details}")
+        raise DeadlineExceeded(deadline.timeout, **details) from e
+    finally:
+        _current_deadline.reset(token)
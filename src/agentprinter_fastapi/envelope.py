@@ -0,0 +1,102 @@
+"""Fast envelope factory for trusted, server-originated messages.
+
+Server frames are built as plain dicts in the same shape as
+`Message.model_dump(mode='json')`, skipping pydantic validation, `uuid4()`
+and the model round-trip. Set AGENTPRINTER_VALIDATE_ENVELOPES=1 (or call
+`set_envelope_validation(True)`) to validate every frame, e.g. in tests.
+"""
+import itertools
+import os
+import secrets
+from datetime import datetime, timezone
+from typing import Any, Optional, Type
+from pydantic import BaseModel
+from .schemas.protocol import Message, MessageHeader, ErrorPayload
+
+_validate_envelopes = os.environ.get("AGENTPRINTER_VALIDATE_ENVELOPES", "") == "1"
+
+def set_envelope_validation(enabled: bool) -> None:
+    """Enable or disable full pydantic validation of server envelopes."""
+    global _validate_envelopes
+    _validate_envelopes = enabled
+
+def envelope_validation_enabled() -> bool:
+    return _validate_envelopes
+
+# Process-unique prefix plus a monotonic counter: unique and ordered within a
+# process, and far cheaper than uuid4()
+_ID_PREFIX = secrets.token_hex(6)
+_id_counter = itertools.count(1)
+
+def next_message_id() -> str:
+    """Return a cheap, monotonically increasing message id."""
+    return f"{_ID_PREFIX}-{next(_id_counter):012x}"
+
+def _utc_timestamp() -> str:
+    # Same format pydantic uses for UTC datetimes in JSON mode
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+# Header defaults in field order, so frames serialize like validated messages
+_HEADER_TEMPLATE: dict[str, Any] = {
+    name: (None if field.is_required() or field.default_factory is not None else field.default)
+    for name, field in MessageHeader.model_fields.items()
+}
+
+def make_envelope(
+    type: str,
+    payload: dict[str, Any],
+    trace_id: str,
+    payload_model: Optional[Type[BaseModel]] = None,
+    **header: Any,
+) -> dict[str, Any]:
+    """Build a JSON-ready message dict for a trusted payload.
+
+    Args:
+        type: Message type (e.g., "agent.event", "ui.patch")
+        payload: JSON-serializable payload dict
+        trace_id: Distributed tracing ID
+        payload_model: Model the payload follows, checked when validation is on
+        **header: Extra MessageHeader fields (version, session_id, ...)
+
+    Returns:
+        Message dict, equivalent to Message(...).model_dump(mode='json')
+    """
+    frame = {
+        "type": type,
+        "header": {
+            **_HEADER_TEMPLATE,
+            "id": next_message_id(),
+            "trace_id": trace_id,
+            "timestamp": _utc_timestamp(),
+            **header,
+        },
+        "payload": payload,
+    }
+    if _validate_envelopes:
+        if payload_model is not None:
+            payload_model.model_validate(payload)
+        return Message.model_validate(frame).model_dump(mode='json')
+    return frame
+
+def protocol_error_frame(trace_id: str, code: str, message: str, details: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Build a protocol.error frame with an ErrorPayload-shaped payload."""
+    payload = {"code": code, "message": message, "details": details if details is not None else {}}
+    return make_envelope("protocol.error", payload, trace_id, payload_model=ErrorPayload)
+
+# Errors whose payload never changes; validated once at import
+_STATIC_ERRORS: dict[str, dict[str, Any]] = {
+    error.code: error.model_dump(mode='json')
+    for error in (
+        ErrorPayload(code="auth_failed", message="Authentication failed"),
+        ErrorPayload(code="connection_rate_limit_exceeded", message="Connection rate limit exceeded"),
+    )
+}
+
+def static_error_frame(code: str, trace_id: str) -> dict[str, Any]:
+    """Build a precomputed protocol.error frame (e.g. auth_failed).
+
+    Raises:
+        KeyError: If `code` is not a static error
+    """
+    payload = _STATIC_ERRORS[code]
+    return make_envelope("protocol.error", {**payload, "details": {}}, trace_id)
@@ -0,0 +1,239 @@
+"""Credit-based flow control for outbound WebSocket traffic.
+
+A client that wants flow control grants credits in its `protocol.hello`
+payload, e.g. {"credits": {"messages": 32, "bytes": 65536}}, and tops them
+up with `protocol.ack` messages carrying the same "credits" object. Each
+frame sent uses one message credit and its JSON size in byte credits; when
+either runs out, frames are buffered (patches coalesced) until the next
+grant, and senders wait once the buffer is full. Clients that never grant
+credits are not flow controlled.
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+import logging
+from .envelope import protocol_error_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BUFFERED = 256
+
+PATCH_TYPES = ("ui.patch", "state.patch")
+
+def coalesce_patches(patches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine patch messages into one, based on the latest.
+
+    The combined payload is {"patches": [...]}, holding each patch's payload
+    in order (payloads that are already combined are flattened).
+    """
+    if len(patches) == 1:
+        return patches[0]
+    ops: List[Any] = []
+    for patch in patches:
+        payload = patch.get("payload", {})
+        if isinstance(payload, dict) and isinstance(payload.get("patches"), list):
+            ops.extend(payload["patches"])
+        else:
+            ops.append(payload)
+    combined = patches[-1].copy()
+    combined["payload"] = {"patches": ops}
+    return combined
+
+def parse_credits(payload: Dict[str, Any]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """Read (messages, bytes) credits from a hello/ack payload.
+
+    Returns:
+        None if the payload grants no credits
+
+    Raises:
+        ValueError: If a credit count is not a non-negative integer
+    """
+    credits = payload.get("credits")
+    if credits is None:
+        return None
+    if not isinstance(credits, dict):
+        raise ValueError("credits must be an object")
+    counts = []
+    for unit in ("messages", "bytes"):
+        value = credits.get(unit)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            raise ValueError(f"credits.{unit} must be a non-negative integer")
+        counts.append(value)
+    return counts[0], counts[1]
+
+def _frame_size(message: Any) -> int:
+    return len(json.dumps(message, separators=(",", ":"), default=str).encode("utf-8"))
+
+class FlowController:
+    """Sends frames while the client's credits last and holds back the rest.
+
+    Until the first grant the window is unlimited. A grant in
+    `protocol.hello` sets the window; grants in `protocol.ack` add to it.
+    A unit that was never granted (e.g., bytes when only messages were) is
+    not limited. A frame is sent while any byte credit remains, so frames
+    larger than the window can't stall the connection; the overdraft is
+    deducted from the next grant.
+
+    Frames that can't be sent are buffered, and buffered ui.patch/state.patch
+    frames for the same session and type are coalesced into one frame. Once
+    `max_buffered` frames are waiting, `send_json` blocks until credits
+    return, so a handler streaming a run is slowed down rather than losing
+    frames. Sends that must not block (`wait=False`, and any send from the
+    `reader` task, which has to keep reading grants) are buffered past the
+    limit instead. Then the oldest frames that carry a `header.seq` (e.g.,
+    broadcasts, which are also queued for replay) are dropped, and once
+    credits return the client first gets a protocol.error "messages_dropped"
+    with the dropped sequence numbers, which it can recover with
+    `protocol.resume`. Frames without a sequence number are never dropped.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+        reader: Optional[asyncio.Task] = None,
+    ):
+        """Initialize flow controller.
+
+        Args:
+            send: Coroutine function that writes one frame to the socket
+            max_buffered: Frames held while out of credits before senders wait
+            reader: Task that reads the client's grants; its sends never wait
+        """
+        self.send = send
+        self.max_buffered = max_buffered
+        self.reader = reader
+        self.messages: Optional[int] = None  # Remaining credits (None = unlimited)
+        self.bytes: Optional[int] = None
+        self._buffer: deque[Dict[str, Any]] = deque()
+        self._room = asyncio.Event()  # Set when buffered frames go out
+        self._dropped = 0
+        self._dropped_seqs: Tuple[Optional[int], Optional[int]] = (None, None)  # (first, last)
+        self.stats = {"sent": 0, "buffered": 0, "coalesced": 0, "dropped": 0, "grants": 0, "waits": 0}
+
+    @property
+    def limited(self) -> bool:
+        return self.messages is not None or self.bytes is not None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def _can_send(self) -> bool:
+        return (self.messages is None or self.messages > 0) and (self.bytes is None or self.bytes > 0)
+
+    async def send_json(self, message: Dict[str, Any], wait: bool = True) -> None:
+        """Send a frame now if credits allow, otherwise buffer it.
+
+        Args:
+            message: Frame to send
+            wait: Block while the buffer is full instead of growing it
+        """
+        wait = wait and (self.reader is None or asyncio.current_task() is not self.reader)
+        while True:
+            if not self._buffer and not self._dropped and self._can_send():
+                await self._deliver(message)
+                return
+            if not wait or len(self._buffer) < self.max_buffered or self._coalesces(message):
+                self._hold(message)
+                return
+            self.stats["waits"] += 1
+            self._room.clear()
+            await self._room.wait()
+
+    async def grant(self, messages: Optional[int] = None, bytes: Optional[int] = None, reset: bool = False) -> None:
+        """Apply a client's credit grant and send what it allows.
+
+        Args:
+            messages: Message credits granted (None = unchanged)
+            bytes: Byte credits granted (None = unchanged)
+            reset: Replace the remaining credits instead of adding to them
+        """
+        self.stats["grants"] += 1
+        if messages is not None:
+            self.messages = messages if reset or self.messages is None else self.messages + messages
+        if bytes is not None:
+            self.bytes = bytes if reset or self.bytes is None else self.bytes + bytes
+        await self.drain()
+
+    async def drain(self) -> None:
+        """Send buffered frames while credits last."""
+        if self._dropped and self._can_send():
+            notice = protocol_error_frame(
+                trace_id=str(uuid4()),
+                code="messages_dropped",
+                message=f"{self._dropped} messages were dropped while the client was out of credits",
+                details={
+                    "dropped": self._dropped,
+                    "first_seq": self._dropped_seqs[0],
+                    "last_seq": self._dropped_seqs[1],
+                },
+            )
+            self._dropped, self._dropped_seqs = 0, (None, None)
+            await self._deliver(notice)
+        while self._buffer and self._can_send():
+            await self._deliver(self._buffer.popleft())
+            self._room.set()
+
+    def close(self) -> None:
+        """Stop flow control (e.g., when the socket closes).
+
+        Buffered frames are discarded and blocked senders resume, sending
+        straight to the socket from then on.
+        """
+        self.messages = self.bytes = None
+        self._buffer.clear()
+        self._dropped, self._dropped_seqs = 0, (None, None)
+        self._room.set()
+
+    async def _deliver(self, message: Dict[str, Any]) -> None:
+        if self.messages is not None:
+            self.messages -= 1
+        if self.bytes is not None:
+            self.bytes -= _frame_size(message)
+        self.stats["sent"] += 1
+        await self.send(message)
+
+    def _coalesces(self, message: Dict[str, Any]) -> bool:
+        if not self._buffer or message.get("type") not in PATCH_TYPES:
+            return False
+        last = self._buffer[-1]
+        return last.get("type") == message["type"] and _session(last) == _session(message)
+
+    def _hold(self, message: Dict[str, Any]) -> None:
+        if self._coalesces(message):
+            self._buffer[-1] = coalesce_patches([self._buffer[-1], message])
+            self.stats["coalesced"] += 1
+            return
+        self._buffer.append(message)
+        self.stats["buffered"] += 1
+        excess = len(self._buffer) - self.max_buffered
+        if excess <= 0:
+            return
+        # Drop the oldest replayable frames; the rest stay buffered
+        kept: deque[Dict[str, Any]] = deque()
+        for frame in self._buffer:
+            seq = _seq(frame)
+            if excess > 0 and seq is not None:
+                excess -= 1
+                self._dropped += 1
+                self.stats["dropped"] += 1
+                first, last = self._dropped_seqs
+                self._dropped_seqs = (seq if first is None else min(first, seq), seq if last is None else max(last, seq))
+            else:
+                kept.append(frame)
+        self._buffer = kept
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "pending": len(self._buffer), "messages": self.messages, "bytes": self.bytes}
+
+def _session(message: Dict[str, Any]) -> Any:
+    header = message.get("header")
+    return header.get("session_id") if isinstance(header, dict) else None
+
+def _seq(message: Dict[str, Any]) -> Optional[int]:
+    header = message.get("header")
+    seq = header.get("seq") if isinstance(header, dict) else None
+    return seq if isinstance(seq, int) and not isinstance(seq, bool) else None
@@ -0,0 +1,182 @@
+"""Bounded run-history store for agent adapters."""
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RunHistoryStore:
+    """Keeps the most recent run records in memory and spills older ones to SQLite.
+
+    Records are plain dicts. `append` stamps `run_id`, `status` and
+    `finished_at` if missing. Iteration, indexing and `len()` cover only the
+    in-memory ring; `get` and `query` also search the spill file.
+
+    Evicted records are written in batches of `spill_batch`, one transaction
+    each, so a full ring doesn't cost a synchronous commit per finished run.
+    Records waiting for the next batch are still found by `get` and `query`;
+    call `flush()` (or `close()`) to write them out.
+
+    Any object with the same `append`/`get`/`query` methods can stand in for
+    this store in the adapters.
+    """
+
+    def __init__(self, max_records: int = 1000, spill_path: Optional[Path | str] = None, spill_batch: int = 64):
+        """Initialize history store.
+
+        Args:
+            max_records: Records kept in memory; older records are evicted
+            spill_path: Optional SQLite file that receives evicted records
+            spill_batch: Evicted records written to the spill file per commit
+        """
+        self.max_records = max_records
+        self.spill_batch = spill_batch
+        self._records: deque[dict[str, Any]] = deque()
+        self._pending: list[dict[str, Any]] = []  # Evicted, not yet written
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if spill_path is not None:
+            self._db = sqlite3.connect(str(spill_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, status TEXT, started_at REAL, finished_at REAL, record TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at)")
+            self._db.commit()
+
+    def append(self, record: dict[str, Any]) -> None:
+        """Add a run record, evicting (and spilling) the oldest if full."""
+        record.setdefault("run_id", None)
+        record.setdefault("status", "unknown")
+        record.setdefault("finished_at", time.time())
+        record.setdefault("started_at", record["finished_at"])
+
+        with self._lock:
+            self._records.append(record)
+            while len(self._records) > self.max_records:
+                self._spill(self._records.popleft())
+            if len(self._pending) >= self.spill_batch:
+                self._write_pending()
+
+    def get(self, run_id: str) -> Optional[dict[str, Any]]:
+        """Return the record for `run_id`, from memory or the spill file."""
+        with self._lock:
+            for record in reversed(self._records):
+                if record.get("run_id") == run_id:
+                    return record
+            for record in reversed(self._pending):
+                if record.get("run_id") == run_id:
+                    return record
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT record FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Return up to `limit` most recent records matching the filters.
+
+        Args:
+            status: Only records with this status (e.g., "success", "error")
+            since: Only runs started at or after this Unix time
+            until: Only runs started before this Unix time
+            limit: Max records to return
+
+        Returns:
+            Records ordered oldest to newest
+        """
+        def matches(record: dict[str, Any]) -> bool:
+            started = record.get("started_at") or 0
+            return (
+                (status is None or record.get("status") == status)
+                and (since is None or started >= since)
+                and (until is None or started < until)
+            )
+
+        with self._lock:
+            results = [r for r in reversed(self._records) if matches(r)][:limit]
+            if len(results) < limit:
+                results.extend([r for r in reversed(self._pending) if matches(r)][:limit - len(results)])
+            if len(results) < limit and self._db is not None:
+                sql = "SELECT record FROM runs WHERE 1=1"
+                params: list[Any] = []
+                if status is not None:
+                    sql += " AND status = ?"
+                    params.append(status)
+                if since is not None:
+                    sql += " AND started_at >= ?"
+                    params.append(since)
+                if until is not None:
+                    sql += " AND started_at < ?"
+                    params.append(until)
+                sql += " ORDER BY started_at DESC LIMIT ?"
+                params.append(limit - len(results))
+                results.extend(json.loads(row[0]) for row in self._db.execute(sql, params))
+        results.reverse()
+        return results
+
+    def _spill(self, record: dict[str, Any]) -> None:
+        if self._db is not None:
+            self._pending.append(record)
+
+    def _write_pending(self) -> None:
+        # Caller holds the lock
+        if self._db is None or not self._pending:
+            return
+        rows = [
+            (
+                record.get("run_id"),
+                record.get("status"),
+                record.get("started_at"),
+                record.get("finished_at"),
+                json.dumps(record, default=str),
+            )
+            for record in self._pending
+        ]
+        self._pending = []
+        try:
+            self._db.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to spill {len(rows)} run records: {e}")
+
+    def flush(self) -> None:
+        """Write evicted records still waiting for a batch to the spill file."""
+        with self._lock:
+            self._write_pending()
+
+    def clear(self) -> None:
+        """Drop all in-memory records (the spill file is kept).
+
+        Evicted records still waiting for a batch are written first, so none
+        reappear in the spill file after the clear.
+        """
+        with self._lock:
+            self._write_pending()
+            self._records.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_pending()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(list(self._records))
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        return self._records[index]
@@ -0,0 +1,249 @@
+"""Exact-match cache of streamed LLM responses."""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Request options that change how a call is made, not what it returns
+_TRANSPORT_PARAMS = frozenset({"timeout", "extra_headers", "extra_query", "stream", "stream_options", "user"})
+
+def cache_key(
+    model: str,
+    messages: list[dict],
+    params: Optional[dict[str, Any]] = None,
+    endpoint: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> str:
+    """Return a sha256 key for a completion request.
+
+    The request is serialized as canonical JSON (sorted keys, no whitespace);
+    transport-only options and params set to None are ignored. `endpoint`
+    identifies the provider (e.g., the base URL), so OpenAI-compatible servers
+    that serve the same model name don't share entries. `tenant` keeps
+    entries of different credentials apart (see `credential_tenant`).
+    """
+    normalized = {
+        "endpoint": endpoint.rstrip("/") if endpoint else None,
+        "tenant": tenant,
+        "model": model,
+        "messages": messages,
+        "params": {
+            k: v for k, v in (params or {}).items()
+            if v is not None and k not in _TRANSPORT_PARAMS
+        },
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def credential_tenant(api_key: str) -> str:
+    """Return a cache tenant for an API key without keeping the key itself."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """LRU cache of recorded chunk streams, with an optional on-disk tier.
+
+    Entries are the response's chunks in order, so a hit can be replayed with
+    the original chunk boundaries. Only use it for deterministic prompts
+    (e.g., temperature 0), since a hit always returns the recorded answer.
+    Entry files are deleted, oldest first, once they exceed `max_disk_bytes`
+    or are older than `ttl`. `get` and `put` do file I/O; use `get_async`
+    and `put_async` on the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        directory: Optional[Path | str] = None,
+        max_disk_bytes: Optional[int] = 256 * 1024 * 1024,
+        ttl: Optional[float] = 7 * 24 * 3600.0,
+    ):
+        """Initialize response cache.
+
+        Args:
+            max_entries: Responses kept in memory (least recently used are evicted)
+            directory: Optional directory for the on-disk tier
+            max_disk_bytes: Bytes of entry files kept on disk (None = unbounded)
+            ttl: Seconds an entry file is kept after it was written (None = forever)
+        """
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, list[str]] = OrderedDict()
+        self._disk: OrderedDict[str, tuple[int, float]] = OrderedDict()  # key -> (size, written_at), oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "disk_evictions": 0}
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._index_files()
+
+    def _index_files(self) -> None:
+        """Index entry files left by earlier processes, oldest first."""
+        files = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for written_at, key, size in sorted(files):
+            self._disk[key] = (size, written_at)
+            self._disk_bytes += size
+        self._delete_files(self._expired_files(time.time()))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[list[str]]:
+        """Return the recorded chunks for `key`, or None on a miss."""
+        with self._lock:
+            chunks = self._entries.get(key)
+            if chunks is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return list(chunks)
+
+        chunks = self._read(key)
+        with self._lock:
+            if chunks is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            self._remember(key, chunks)
+        return list(chunks)
+
+    def put(self, key: str, chunks: list[str]) -> None:
+        """Record a completed response's chunks."""
+        chunks = list(chunks)
+        with self._lock:
+            self._remember(key, chunks)
+            self.stats["stores"] += 1
+        size = self._write(key, chunks)
+        if size is not None:
+            self._record_file(key, size)
+
+    async def get_async(self, key: str) -> Optional[list[str]]:
+        """`get` with disk reads in a worker thread."""
+        if self.directory is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, chunks: list[str]) -> None:
+        """`put` with disk writes in a worker thread."""
+        if self.directory is None:
+            return self.put(key, chunks)
+        await asyncio.to_thread(self.put, key, chunks)
+
+    def _remember(self, key: str, chunks: list[str]) -> None:
+        self._entries[key] = chunks
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[list[str]]:
+        if self.directory is None:
+            return None
+        with self._lock:
+            entry = self._disk.get(key)
+        if entry is None:
+            # Possibly written by another process sharing the directory
+            try:
+                stat = self._path(key).stat()
+            except OSError:
+                return None
+            entry = (stat.st_size, stat.st_mtime)
+        if self.ttl is not None and time.time() - entry[1] > self.ttl:
+            with self._lock:
+                if self._disk.pop(key, None) is not None:
+                    self._disk_bytes -= entry[0]
+            self._delete_files([key])
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)["chunks"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def _write(self, key: str, chunks: list[str]) -> Optional[int]:
+        """Write the entry's file; return its size, or None if it wasn't written."""
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"chunks": chunks}, f, ensure_ascii=False)
+            os.replace(tmp, path)  # Atomic, so readers never see a partial entry
+            return path.stat().st_size
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+            return None
+
+    def _record_file(self, key: str, size: int) -> None:
+        now = time.time()
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_bytes -= previous[0]
+            self._disk[key] = (size, now)
+            self._disk_bytes += size
+            expired = self._expired_files(now)
+        self._delete_files(expired)
+
+    def _expired_files(self, now: float) -> list[str]:
+        """Drop files over the size or age limit from the index (caller holds the lock)."""
+        victims = []
+        while self._disk:
+            key, (size, written_at) = next(iter(self._disk.items()))
+            too_big = self.max_disk_bytes is not None and self._disk_bytes > self.max_disk_bytes
+            too_old = self.ttl is not None and now - written_at > self.ttl
+            if not (too_big or too_old):
+                break
+            self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            victims.append(key)
+        return victims
+
+    def _delete_files(self, keys: list[str]) -> None:
+        for key in keys:
+            self.stats["disk_evictions"] += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def prune(self) -> int:
+        """Delete entry files past the TTL now, rather than on the next put.
+
+        Returns:
+            Files deleted
+        """
+        with self._lock:
+            expired = self._expired_files(time.time())
+        self._delete_files(expired)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Drop in-memory entries (the on-disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or key in self._disk
@@ -0,0 +1,108 @@
+"""Shared, pooled LLM API clients."""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _PooledClient:
+    client: Any
+    semaphore: asyncio.Semaphore
+    in_flight: int = 0
+
+class OpenAIClientPool:
+    """Reuses one `AsyncOpenAI` client (and its HTTP connection pool) per
+    (api_key, base_url), so completions skip TCP/TLS setup.
+
+    Clients are bound to the event loop they were created on, so the pool
+    keeps a separate set per running loop. Each client has a semaphore that
+    caps concurrent requests through it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 60.0,
+    ):
+        """Initialize client pool.
+
+        Args:
+            max_concurrency: Max in-flight requests per client
+            max_connections: Max open HTTP connections per client
+            max_keepalive_connections: Max idle connections kept open per client
+            keepalive_expiry: Seconds an idle connection is kept open
+        """
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, _PooledClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _create_client(self, api_key: str, base_url: Optional[str]) -> Any:
+        try:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        except ImportError:
+            raise ImportError("openai package required: pip install openai")
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+        )
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+    def _entry(self, api_key: str, base_url: Optional[str] = None) -> _PooledClient:
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        key = (api_key, base_url)
+        entry = clients.get(key)
+        if entry is None:
+            entry = _PooledClient(self._create_client(api_key, base_url), asyncio.Semaphore(self.max_concurrency))
+            clients[key] = entry
+        return entry
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> Any:
+        """Return the shared client for (api_key, base_url) on the running loop."""
+        return self._entry(api_key, base_url).client
+
+    @asynccontextmanager
+    async def acquire(self, api_key: str, base_url: Optional[str] = None) -> AsyncIterator[Any]:
+        """Wait for a concurrency slot and yield the shared client."""
+        entry = self._entry(api_key, base_url)
+        async with entry.semaphore:
+            entry.in_flight += 1
+            try:
+                yield entry.client
+            finally:
+                entry.in_flight -= 1
+
+    def get_stats(self) -> dict:
+        """Return per-client in-flight counts for the running loop."""
+        clients = self._clients.get(asyncio.get_running_loop(), {})
+        return {
+            "clients": len(clients),
+            "in_flight": sum(e.in_flight for e in clients.values()),
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def aclose(self) -> None:
+        """Close the clients created on the running loop."""
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for entry in clients.values():
+            try:
+                await entry.client.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled OpenAI client: {e}")
+
+# Global pool
+openai_client_pool = OpenAIClientPool()
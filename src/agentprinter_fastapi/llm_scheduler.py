@@ -0,0 +1,236 @@
+"""Client-side request scheduling against LLM provider rate limits."""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+def estimate_tokens(messages: list[dict], max_tokens: Optional[int] = None) -> int:
+    """Roughly estimate the tokens a chat completion will count against TPM.
+
+    Uses ~4 characters per prompt token plus the completion allowance.
+    """
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return prompt_chars // 4 + len(messages) * 4 + (max_tokens or 256)
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Check whether an error is a provider 429 (e.g., openai.RateLimitError)."""
+    return getattr(error, "status_code", None) == 429
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    wakeup: Optional[asyncio.Future] = field(default=None, compare=False)
+
+class LLMScheduler:
+    """Queues LLM calls so they stay within requests- and tokens-per-minute budgets.
+
+    Calls are admitted in priority order once the sliding-window budgets allow
+    them. A 429 from the provider pauses admissions for a jittered backoff
+    (or the server's Retry-After) and the call is retried, so a burst of
+    rejections does not turn into a retry storm.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        window: float = 60.0,
+        max_retries: int = 3,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        rng: Callable[[], float] = random.random,
+    ):
+        """Initialize scheduler.
+
+        Args:
+            rpm: Max requests per window (None = unlimited)
+            tpm: Max estimated tokens per window (None = unlimited)
+            window: Budget window in seconds
+            max_retries: Retries after a 429 before giving up
+            base_backoff: First backoff in seconds, doubled on each retry
+            max_backoff: Backoff cap in seconds
+            clock: Monotonic clock (injectable for tests)
+            sleep: Async sleep (injectable for tests)
+            rng: Random source in [0, 1) used for jitter
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+        self._queue: list[_Ticket] = []
+        self._seq = itertools.count()
+        self._admitted: deque[tuple[float, int]] = deque()  # (admitted_at, tokens)
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        self.stats = {
+            "submitted": 0,
+            "admitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "total_queue_time": 0.0,
+            "max_queue_time": 0.0,
+        }
+
+    async def submit(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Any:
+        """Run `call` once the budgets allow it, retrying on 429.
+
+        Args:
+            call: Zero-argument async callable performing the request
+            estimated_tokens: Tokens the call is expected to use
+            priority: PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND or any int (lower first)
+
+        Returns:
+            The call's result
+        """
+        self.stats["submitted"] += 1
+        seq = next(self._seq)  # Retries keep their place in line
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens, priority, seq)
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                self.stats["rate_limited"] += 1
+                self.stats["retries"] += 1
+                self._pause(attempt, _retry_after(e))
+                attempt += 1
+                continue
+            self.stats["completed"] += 1
+            return result
+
+    def _pause(self, attempt: int, retry_after: Optional[float]) -> None:
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+            delay = backoff * (0.5 + self._rng() / 2)  # Jitter spreads retries apart
+        self._paused_until = max(self._paused_until, self._clock() + delay)
+        logger.warning(f"LLM provider rate limited; pausing admissions for {delay:.2f}s")
+
+    async def _admit(self, tokens: int, priority: int, seq: int) -> None:
+        ticket = _Ticket(priority, seq, tokens, self._clock())
+        heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                if self._queue[0] is not ticket:
+                    ticket.wakeup = asyncio.get_running_loop().create_future()
+                    await ticket.wakeup
+                    continue
+                delay = self._budget_delay(tokens)
+                if delay <= 0:
+                    break
+                # A head preempted by a higher-priority call re-checks after this
+                await self._sleep(delay)
+        except BaseException:
+            self._remove(ticket)
+            raise
+
+        heapq.heappop(self._queue)
+        now = self._clock()
+        self._admitted.append((now, tokens))
+        self._window_tokens += tokens
+        waited = now - ticket.enqueued_at
+        self.stats["admitted"] += 1
+        self.stats["total_queue_time"] += waited
+        self.stats["max_queue_time"] = max(self.stats["max_queue_time"], waited)
+        self._wake_head()
+
+    def _wake_head(self) -> None:
+        if self._queue:
+            wakeup = self._queue[0].wakeup
+            if wakeup is not None and not wakeup.done():
+                wakeup.set_result(None)
+
+    def _remove(self, ticket: _Ticket) -> None:
+        was_head = bool(self._queue) and self._queue[0] is ticket
+        try:
+            self._queue.remove(ticket)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+        if was_head:
+            self._wake_head()
+
+    def _expire(self, now: float) -> None:
+        while self._admitted and self._admitted[0][0] <= now - self.window:
+            _, tokens = self._admitted.popleft()
+            self._window_tokens -= tokens
+
+    def _budget_delay(self, tokens: int) -> float:
+        """Seconds until a call of `tokens` fits both budgets (0 = now)."""
+        now = self._clock()
+        self._expire(now)
+        delay = self._paused_until - now
+
+        if self.rpm is not None and len(self._admitted) >= self.rpm:
+            oldest = self._admitted[len(self._admitted) - self.rpm][0]
+            delay = max(delay, oldest + self.window - now)
+
+        if self.tpm is not None and self._window_tokens + tokens > self.tpm and self._admitted:
+            # Wait until enough old calls leave the window (or all, if the
+            # call alone exceeds the budget)
+            used = self._window_tokens
+            for admitted_at, spent in self._admitted:
+                used -= spent
+                if used + tokens <= self.tpm:
+                    break
+            delay = max(delay, admitted_at + self.window - now)
+
+        return delay
+
+    def get_stats(self) -> dict:
+        """Return queue, budget usage and retry counters."""
+        now = self._clock()
+        self._expire(now)
+        admitted = self.stats["admitted"]
+        return {
+            **self.stats,
+            "queued": len(self._queue),
+            "avg_queue_time": self.stats["total_queue_time"] / admitted if admitted > 0 else 0.0,
+            "requests_in_window": len(self._admitted),
+            "tokens_in_window": self._window_tokens,
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "paused_for": max(0.0, self._paused_until - now),
+        }
@@ -3,15 +3,34 @@ from typing import List, Any, Dict
 import logging
 import asyncio
 from collections import defaultdict
+from typing import Optional
+from .blobs import BlobStore, externalize_async
+from .flow import FlowController, coalesce_patches
 
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
-    def __init__(self, patch_coalesce_window: float = 0.05):
+    def __init__(
+        self,
+        patch_coalesce_window: float = 0.05,
+        blob_threshold: Optional[int] = None,
+        blob_store: Optional[BlobStore] = None,
+    ):
+        """Initialize connection manager.
+        
+        Args:
+            patch_coalesce_window: Seconds patches are held back to coalesce them
+            blob_threshold: Payloads larger than this many bytes are stored in the
+                blob store and sent (and kept for replay) as references (None = inline)
+            blob_store: Store for oversized payloads (defaults to the global blob_store)
+        """
         self.active_connections: List[WebSocket] = []
         self.patch_coalesce_window = patch_coalesce_window  # 50ms default
         self.pending_patches: Dict[str, List[Dict]] = defaultdict(list)
         self.patch_tasks: Dict[str, asyncio.Task] = {}
+        self.blob_threshold = blob_threshold
+        self.blob_store = blob_store
+        self.flow_controls: Dict[WebSocket, FlowController] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
@@ -20,6 +39,11 @@ class ConnectionManager:
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.flow_controls.pop(websocket, None)
+    
+    def attach_flow(self, websocket: WebSocket, flow: FlowController):
+        """Send broadcasts to `websocket` through its credit window."""
+        self.flow_controls[websocket] = flow
 
     async def _flush_patches(self, session_id: str):
         """Flush coalesced patches for a session."""
@@ -31,14 +55,7 @@ class ConnectionManager:
                 self.pending_patches[session_id] = []
                 
                 # If multiple patches, combine them into a single message
-                if len(patches) > 1:
-                    # Combine patches - take the latest version and merge operations
-                    combined_patch = patches[-1].copy()  # Use latest patch as base
-                    # Merge all patch operations
-                    combined_ops = [p.get("payload", {}) for p in patches]
-                    combined_patch["payload"] = {"patches": combined_ops}
-                else:
-                    combined_patch = patches[0]
+                combined_patch = coalesce_patches(patches)
                 
                 # Send the coalesced patch
                 await self._send_message(combined_patch)
@@ -54,6 +71,10 @@ class ConnectionManager:
     async def _send_message(self, payload: Dict):
         """Send a message to all connections and fallback transports."""
         
+        # The polling queue then retains the reference, not the payload
+        if self.blob_threshold is not None and isinstance(payload, dict):
+            payload = await externalize_async(payload, self.blob_threshold, self.blob_store)
+        
         # Extract session_id
         session_id = None
         if isinstance(payload, dict) and "header" in payload:
@@ -84,7 +105,13 @@ class ConnectionManager:
         # Snapshot list to avoid modification during iteration issues
         for connection in list(self.active_connections):
             try:
-                await connection.send_json(payload)
+                # Flow-controlled clients buffer (and coalesce) when out of credits;
+                # a slow client never holds up the broadcast
+                flow = self.flow_controls.get(connection)
+                if flow is not None:
+                    await flow.send_json(payload, wait=False)
+                else:
+                    await connection.send_json(payload)
             except Exception as e:
                 logger.warning(f"Error broadcasting to client, removing: {e}")
                 self.disconnect(connection)
@@ -0,0 +1,286 @@
+"""Agent performance metrics: per-run timing spans and aggregated histograms."""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+import logging
+from .devtools import DevtoolsPanel, devtools
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds; values above the last bound land in the +Inf bucket
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+# Label that agents beyond `AgentMetrics.max_agents` are folded into
+OTHER_AGENT = "other"
+
+# Metric name -> (bucket bounds, help text)
+METRICS = {
+    "ttft_seconds": (LATENCY_BUCKETS, "Time from run start to the first streamed token"),
+    "tokens_per_second": (RATE_BUCKETS, "Streamed tokens per second after the first token"),
+    "tool_seconds": (LATENCY_BUCKETS, "Duration of tool calls and graph nodes"),
+    "run_seconds": (LATENCY_BUCKETS, "End-to-end run latency"),
+}
+
+class Histogram:
+    """Fixed-bucket histogram; observing a value is a bisect and a few adds."""
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate the q-th percentile (0-100) by interpolating within its bucket."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i > 0 else self.min
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                low, high = max(low, self.min), min(high, self.max)
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def snapshot(self) -> dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+class RunSpan:
+    """Timings of one agent run, recorded into AgentMetrics when it finishes.
+
+    Feed it the run's AgentEvent types through `on_event` (or call `token`,
+    `tool_start` and `tool_end` directly). Only counters and timestamps are
+    updated while the run streams; histograms are touched once per tool call
+    and once at `finish`.
+    """
+
+    __slots__ = ("metrics", "agent", "run_id", "started_at", "first_token_at", "ended_at", "tokens", "tools", "status", "_open_tools")
+
+    def __init__(self, metrics: "AgentMetrics", agent: str, run_id: Optional[str] = None):
+        self.metrics = metrics
+        self.agent = agent
+        self.run_id = run_id
+        self.started_at = metrics.clock()
+        self.first_token_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.tokens = 0
+        self.tools: list[tuple[Optional[str], float]] = []  # (name, seconds) per finished call
+        self.status = "running"
+        self._open_tools: list[tuple[Optional[str], float]] = []
+
+    def token(self, count: int = 1) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = self.metrics.clock()
+        self.tokens += count
+
+    def tool_start(self, name: Optional[str] = None) -> None:
+        self._open_tools.append((name, self.metrics.clock()))
+
+    def tool_end(self, name: Optional[str] = None) -> None:
+        """Close the latest open call named `name` (or the latest one, when unnamed)."""
+        for i in range(len(self._open_tools) - 1, -1, -1):
+            open_name, started = self._open_tools[i]
+            if name is None or open_name == name:
+                del self._open_tools[i]
+                seconds = self.metrics.clock() - started
+                self.tools.append((open_name, seconds))
+                self.metrics.observe("tool_seconds", self.agent, seconds)
+                return
+
+    def on_event(self, event: str, data: Any = None) -> None:
+        """Update the span from an AgentEvent type and its data."""
+        if event == "token":
+            self.token()
+        elif event == "tool_call":
+            self.tool_start(_tool_name(data))
+        elif event == "tool_result":
+            self.tool_end(_tool_name(data))
+        elif event == "error":
+            self.status = "error"
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.first_token_at - self.started_at if self.first_token_at is not None else None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.ended_at - self.started_at if self.ended_at is not None else None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if self.first_token_at is None or self.ended_at is None:
+            return None
+        streaming = self.ended_at - self.first_token_at
+        return self.tokens / streaming if streaming > 0 else None
+
+    def finish(self, status: Optional[str] = None) -> None:
+        """End the span and record it (only the first call counts)."""
+        if self.ended_at is not None:
+            return
+        self.ended_at = self.metrics.clock()
+        if status is not None:
+            self.status = status
+        elif self.status == "running":
+            self.status = "success"
+        self.metrics._record(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "agent": self.agent,
+            "run_id": self.run_id,
+            "status": self.status,
+            "ttft_seconds": self.ttft,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "run_seconds": self.duration,
+            "tools": [{"name": name, "seconds": seconds} for name, seconds in self.tools],
+        }
+
+def _tool_name(data: Any) -> Optional[str]:
+    if isinstance(data, dict):
+        return data.get("node") or data.get("tool")
+    return None
+
+class AgentMetrics:
+    """Histograms of TTFT, tokens/s, tool latency and run latency, keyed by agent.
+
+    Finished runs are also kept in a bounded list of recent spans and logged
+    to the devtools panel as performance messages. Agent names can derive
+    from client input, so only the first `max_agents` get their own label;
+    later ones are recorded as "other".
+    """
+
+    def __init__(
+        self,
+        max_recent: int = 100,
+        devtools: Optional[DevtoolsPanel] = devtools,
+        clock: Callable[[], float] = time.perf_counter,
+        max_agents: int = 50,
+    ):
+        """Initialize metrics.
+
+        Args:
+            max_recent: Finished run spans kept for inspection
+            devtools: Panel finished runs are logged to (None = don't log)
+            clock: Monotonic clock in seconds
+            max_agents: Distinct agent labels kept before folding into "other"
+        """
+        self.devtools = devtools
+        self.clock = clock
+        self.max_agents = max_agents
+        self.agents: set[str] = set()
+        self.histograms: Dict[tuple[str, str], Histogram] = {}
+        self.recent: deque[dict[str, Any]] = deque(maxlen=max_recent)
+        self.runs = {"started": 0, "success": 0, "error": 0, "cancelled": 0}
+        self._lock = threading.Lock()
+
+    def start_run(self, agent: str, run_id: Optional[str] = None) -> RunSpan:
+        """Start timing a run of `agent`; call `finish` on the span when it ends."""
+        self.runs["started"] += 1
+        return RunSpan(self, self.label(agent), run_id)
+
+    def label(self, agent: str) -> str:
+        """Return the label `agent` is recorded under, registering it while there is room."""
+        with self._lock:
+            if agent in self.agents:
+                return agent
+            if len(self.agents) < self.max_agents:
+                self.agents.add(agent)
+                return agent
+        return OTHER_AGENT
+
+    def observe(self, metric: str, agent: str, value: float) -> None:
+        agent = self.label(agent)
+        with self._lock:
+            histogram = self.histograms.get((metric, agent))
+            if histogram is None:
+                histogram = self.histograms[(metric, agent)] = Histogram(METRICS[metric][0])
+            histogram.observe(value)
+
+    def _record(self, span: RunSpan) -> None:
+        if span.ttft is not None:
+            self.observe("ttft_seconds", span.agent, span.ttft)
+        if span.tokens_per_second is not None:
+            self.observe("tokens_per_second", span.agent, span.tokens_per_second)
+        self.observe("run_seconds", span.agent, span.duration)
+        self.runs[span.status] = self.runs.get(span.status, 0) + 1
+
+        summary = span.to_dict()
+        self.recent.append(summary)
+        if self.devtools is not None:
+            self.devtools.log_performance(f"agent run {span.agent}", span.duration * 1000, summary)
+
+    def get(self, metric: str, agent: str) -> Optional[Histogram]:
+        return self.histograms.get((metric, agent))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return {"metrics": {metric: {agent: summary}}, "runs": counts, "recent": spans}."""
+        metrics: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for (metric, agent), histogram in sorted(self.histograms.items()):
+                metrics.setdefault(metric, {})[agent] = histogram.snapshot()
+        return {"metrics": metrics, "runs": dict(self.runs), "recent": list(self.recent)}
+
+    def prometheus(self, prefix: str = "agentprinter_agent_") -> str:
+        """Render the histograms in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric, (_, help_text) in METRICS.items():
+                series = sorted((agent, h) for (name, agent), h in self.histograms.items() if name == metric)
+                if not series:
+                    continue
+                name = prefix + metric
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for agent, histogram in series:
+                    label = _escape_label(agent)
+                    cumulative = 0
+                    for bound, n in zip(histogram.bounds, histogram.counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{{agent="{label}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{agent="{label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{agent="{label}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{agent="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.agents.clear()
+        self.recent.clear()
+        self.runs = {k: 0 for k in self.runs}
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Global instance
+agent_metrics = AgentMetrics()
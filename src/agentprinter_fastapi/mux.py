@@ -0,0 +1,161 @@
+"""Multiplexing of several logical sessions over one WebSocket connection."""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+from .flow import FlowController
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 16
+
+class TooManySessions(Exception):
+    """Raised when a connection opens more logical sessions than allowed."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"At most {limit} sessions may be open on one connection")
+        self.limit = limit
+
+class SessionChannel:
+    """One logical session on a shared WebSocket.
+
+    Handlers receive it in place of the WebSocket: `send_json` stamps the
+    session's ID on outgoing frames and sends them through the session's own
+    credit window (`flow`), and `client_id` is the key its runs and
+    subscriptions are tracked under. Other attributes are read from the
+    underlying WebSocket.
+
+    Work submitted to the channel (e.g., user.action handlers) runs in
+    order, one job at a time, each in its own task. Sessions don't wait for
+    each other, and the connection keeps reading messages while jobs run.
+    """
+
+    def __init__(
+        self,
+        websocket: Any,
+        connection_id: str,
+        session_id: Optional[str] = None,
+        reader: Optional[asyncio.Task] = None,
+    ):
+        """Initialize session channel.
+
+        Args:
+            websocket: Shared WebSocket connection
+            connection_id: ID of the connection
+            session_id: Logical session (None = the connection's primary channel)
+            reader: Task reading the connection, whose sends never wait for credits
+        """
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.session_id = session_id
+        self.client_id = connection_id if session_id is None else f"{connection_id}:{session_id}"
+        self.identity: Optional[str] = None  # Authenticated user, set by the auth hook
+        self.flow = FlowController(websocket.send_json, reader=reader)
+        self.current: Optional[asyncio.Task] = None  # Task running the job in progress
+        self._jobs: deque[Callable[[], Awaitable[None]]] = deque()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def send_json(self, message: dict[str, Any], wait: bool = True) -> None:
+        """Send a frame on this session; see `FlowController.send_json`."""
+        if self.session_id is not None:
+            header = message.get("header")
+            if isinstance(header, dict) and header.get("session_id") != self.session_id:
+                # Copy, since frames may be shared (e.g., cached or fanned out)
+                message = {**message, "header": {**header, "session_id": self.session_id}}
+        await self.flow.send_json(message, wait=wait)
+
+    def submit(self, job: Callable[[], Awaitable[None]]) -> None:
+        """Queue a coroutine function to run after the session's earlier jobs."""
+        self._jobs.append(job)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+
+    async def _work(self) -> None:
+        while self._jobs:
+            job = self._jobs.popleft()
+            self.current = task = asyncio.create_task(job())
+            # wait() rather than await, so cancelling the job doesn't stop the queue
+            await asyncio.wait({task})
+            self.current = None
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Job on session {self.client_id} failed: {task.exception()}")
+
+    def close(self) -> None:
+        """Drop queued jobs and stop flow control.
+
+        The job in progress (and any run it started) is left to finish.
+        """
+        self._jobs.clear()
+        self.flow.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.websocket, name)
+
+class SessionMux:
+    """Routes a connection's messages to logical sessions by `header.session_id`.
+
+    A client opens a session with `protocol.open` and ends it with
+    `protocol.close`. Messages for sessions that were never opened go to the
+    primary channel, which behaves like a plain connection, so clients that
+    don't multiplex are unaffected.
+    """
+
+    def __init__(
+        self,
+        websocket: Any,
+        connection_id: str,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        reader: Optional[asyncio.Task] = None,
+    ):
+        """Initialize session mux.
+
+        Args:
+            websocket: Shared WebSocket connection
+            connection_id: ID of the connection
+            max_sessions: Logical sessions that may be open at once
+            reader: Task reading the connection (see `FlowController`)
+        """
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.max_sessions = max_sessions
+        self.reader = reader
+        self.identity: Optional[str] = None
+        self.primary = SessionChannel(websocket, connection_id, reader=reader)
+        self.sessions: Dict[str, SessionChannel] = {}
+
+    def identify(self, identity: Optional[str]) -> None:
+        """Record the connection's authenticated identity on every channel."""
+        self.identity = identity
+        for channel in self.channels():
+            channel.identity = identity
+
+    def open(self, session_id: str) -> SessionChannel:
+        """Open a logical session (idempotent).
+
+        Raises:
+            TooManySessions: If `max_sessions` are already open
+        """
+        channel = self.sessions.get(session_id)
+        if channel is not None:
+            return channel
+        if len(self.sessions) >= self.max_sessions:
+            raise TooManySessions(self.max_sessions)
+        channel = self.sessions[session_id] = SessionChannel(self.websocket, self.connection_id, session_id, self.reader)
+        channel.identity = self.identity
+        return channel
+
+    def close(self, session_id: str) -> Optional[SessionChannel]:
+        """Close a logical session, returning its channel if it was open."""
+        return self.sessions.pop(session_id, None)
+
+    def route(self, session_id: Optional[str]) -> SessionChannel:
+        """Return the channel for a message's session ID."""
+        if session_id is not None:
+            channel = self.sessions.get(session_id)
+            if channel is not None:
+                return channel
+        return self.primary
+
+    def channels(self) -> list[SessionChannel]:
+        """Return the primary channel and every open session."""
+        return [self.primary, *self.sessions.values()]
@@ -0,0 +1,280 @@
+"""Incremental JSON parsing of streamed LLM output into StatePatch operations."""
+import json
+from typing import Any, Awaitable, Callable, Optional
+from .schemas.patch import StatePatch
+from .envelope import make_envelope
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = frozenset("+-0123456789.eE")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+def escape_pointer(key: str) -> str:
+    """Escape an object key for use in a JSON pointer (RFC 6901)."""
+    return key.replace("~", "~0").replace("/", "~1")
+
+def _decode_string(raw: str) -> str:
+    # strict=False tolerates raw newlines, which models often emit inside strings
+    return json.loads(f'"{raw}"', strict=False)
+
+def _decode_partial_string(raw: str) -> str:
+    # Drop an escape sequence cut off by the chunk boundary
+    for cut in range(0, 7):
+        try:
+            return _decode_string(raw[:len(raw) - cut] if cut else raw)
+        except ValueError:
+            continue
+    return ""
+
+class _Frame:
+    __slots__ = ("is_object", "path", "key", "index")
+
+    def __init__(self, is_object: bool, path: str):
+        self.is_object = is_object
+        self.path = path
+        self.key: Optional[str] = None
+        self.index = 0
+
+class PartialJSONParser:
+    """Parses a JSON document as it streams in and emits StatePatch operations.
+
+    Objects and arrays are emitted empty as soon as they open; strings,
+    numbers and literals are emitted once complete, at their JSON-pointer path
+    under `base_path`. The root container uses "replace", everything below it
+    "add", so applying the patches in order rebuilds the document. Text before
+    the first `{` or `[` (e.g., a Markdown code fence) and after the root
+    closes is ignored.
+
+    With `partial_strings`, a string still streaming is also emitted as a
+    "replace" with its text so far, at most once per `feed` call.
+    """
+
+    def __init__(self, base_path: str = "", start_version: int = 1, partial_strings: bool = False):
+        """Initialize parser.
+
+        Args:
+            base_path: JSON pointer the document is patched into (e.g., "/form")
+            start_version: Version of the first emitted patch
+            partial_strings: Also emit growing string values before they complete
+        """
+        self.base_path = base_path
+        self.partial_strings = partial_strings
+        self.done = False
+        self._next_version = start_version
+        self._stack: list[_Frame] = []
+        self._state = "start"  # start, value, key, colon, comma, string, number, literal, done
+        self._token: list[str] = []
+        self._escaped = False
+        self._string_is_key = False
+        self._string_emitted = False  # A partial value was already emitted for this string
+        self._value_path = base_path
+        self._patches: list[StatePatch] = []
+
+    def _emit(self, op: str, path: str, value: Any) -> None:
+        self._patches.append(StatePatch(op=op, path=path, value=value, version=self._next_version))
+        self._next_version += 1
+
+    def _begin_value(self) -> None:
+        """Compute the path of the value about to start."""
+        if not self._stack:
+            self._value_path = self.base_path
+            return
+        frame = self._stack[-1]
+        if frame.is_object:
+            self._value_path = f"{frame.path}/{escape_pointer(frame.key)}"
+        else:
+            self._value_path = f"{frame.path}/{frame.index}"
+
+    def _complete_value(self, value: Any) -> None:
+        op = "replace" if not self._stack or self._string_emitted else "add"
+        self._emit(op, self._value_path, value)
+        self._string_emitted = False
+        self._after_value()
+
+    def _after_value(self) -> None:
+        if self._stack:
+            self._state = "comma"
+        else:
+            self._state = "done"
+            self.done = True
+
+    def _open(self, is_object: bool) -> None:
+        self._emit("replace" if not self._stack else "add", self._value_path, {} if is_object else [])
+        self._stack.append(_Frame(is_object, self._value_path))
+        self._state = "key" if is_object else "value_or_end"
+
+    def _close(self) -> None:
+        self._stack.pop()
+        self._after_value()
+
+    def _start_value(self, ch: str) -> None:
+        self._begin_value()
+        if ch == "{":
+            self._open(True)
+        elif ch == "[":
+            self._open(False)
+        elif ch == '"':
+            self._state = "string"
+            self._string_is_key = False
+            self._token = []
+        elif ch == "-" or ch.isdigit():
+            self._state = "number"
+            self._token = [ch]
+        elif ch in "tfn":
+            self._state = "literal"
+            self._token = [ch]
+        else:
+            raise ValueError(f"Unexpected character {ch!r} at {self._value_path or '/'}")
+
+    def feed(self, text: str) -> list[StatePatch]:
+        """Consume a chunk of streamed text.
+
+        Returns:
+            Patches for the values that opened or completed in this chunk
+
+        Raises:
+            ValueError: If the stream is not valid JSON
+        """
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            state = self._state
+
+            if state == "start":
+                # Skip preamble such as ```json
+                starts = [p for p in (text.find("{", i), text.find("[", i)) if p != -1]
+                if not starts:
+                    break
+                i = min(starts)
+                self._start_value(text[i])
+                i += 1
+                continue
+
+            if state == "string":
+                # Scan to the closing quote, tracking escapes across chunks
+                j = i
+                while j < n:
+                    ch = text[j]
+                    if self._escaped:
+                        self._escaped = False
+                    elif ch == "\\":
+                        self._escaped = True
+                    elif ch == '"':
+                        break
+                    j += 1
+                self._token.append(text[i:j])
+                if j == n:
+                    i = n
+                    break
+                raw = "".join(self._token)
+                i = j + 1
+                if self._string_is_key:
+                    self._stack[-1].key = _decode_string(raw)
+                    self._state = "colon"
+                else:
+                    self._complete_value(_decode_string(raw))
+                continue
+
+            ch = text[i]
+
+            if state == "number":
+                if ch in _NUMBER_CHARS:
+                    self._token.append(ch)
+                    i += 1
+                    continue
+                self._complete_value(json.loads("".join(self._token)))
+                continue  # Re-read the delimiter in the "comma" state
+
+            if state == "literal":
+                if ch.isalpha():
+                    self._token.append(ch)
+                    i += 1
+                    continue
+                word = "".join(self._token)
+                if word not in _LITERALS:
+                    raise ValueError(f"Invalid literal {word!r} at {self._value_path}")
+                self._complete_value(_LITERALS[word])
+                continue
+
+            i += 1
+            if ch in _WHITESPACE:
+                continue
+
+            if state in ("value", "value_or_end"):
+                if state == "value_or_end" and ch == "]":
+                    self._close()
+                else:
+                    self._start_value(ch)
+            elif state == "key":
+                if ch == '"':
+                    self._state = "string"
+                    self._string_is_key = True
+                    self._token = []
+                elif ch == "}" and self._stack[-1].key is None:
+                    self._close()
+                else:
+                    raise ValueError(f"Expected object key at {self._stack[-1].path or '/'}, got {ch!r}")
+            elif state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Expected ':' at {self._stack[-1].path or '/'}, got {ch!r}")
+                self._state = "value"
+            elif state == "comma":
+                frame = self._stack[-1]
+                if ch == ",":
+                    if frame.is_object:
+                        self._state = "key"
+                    else:
+                        frame.index += 1
+                        self._state = "value"
+                elif ch == ("}" if frame.is_object else "]"):
+                    self._close()
+                else:
+                    raise ValueError(f"Expected ',' or end of container at {frame.path or '/'}, got {ch!r}")
+
+        if self.partial_strings and self._state == "string" and not self._string_is_key and self._token:
+            self._emit("replace" if self._string_emitted else "add", self._value_path, _decode_partial_string("".join(self._token)))
+            self._string_emitted = True
+
+        patches, self._patches = self._patches, []
+        return patches
+
+    def close(self) -> list[StatePatch]:
+        """Finish the stream, completing a trailing root-level number or literal.
+
+        Raises:
+            ValueError: If the document is incomplete
+        """
+        if self._state in ("number", "literal") and not self._stack:
+            self.feed(" ")
+        if not self.done:
+            raise ValueError("Incomplete JSON document")
+        patches, self._patches = self._patches, []
+        return patches
+
+def state_patch_frame(patches: list[StatePatch], trace_id: str, **header: Any) -> dict[str, Any]:
+    """Build one state.patch message for a batch of operations.
+
+    A single operation is the payload itself; several are sent as
+    {"patches": [...]}, matching how ConnectionManager coalesces patches.
+    """
+    ops = [p.model_dump(mode="json") for p in patches]
+    payload = ops[0] if len(ops) == 1 else {"patches": ops}
+    return make_envelope("state.patch", payload, trace_id, **header)
+
+def json_patch_stream(
+    on_patches: Callable[[list[StatePatch]], Awaitable[None]],
+    base_path: str = "",
+    partial_strings: bool = False,
+) -> Callable[[str], Awaitable[None]]:
+    """Return an `on_chunk` callback that turns streamed JSON into patch batches.
+
+    Pass it to `OpenAIStreamAdapter.stream_completion` or `LangChainAdapter`;
+    `on_patches` is awaited once per chunk that completed anything.
+    """
+    parser = PartialJSONParser(base_path, partial_strings=partial_strings)
+
+    async def on_chunk(text: str) -> None:
+        patches = parser.feed(text)
+        if patches:
+            await on_patches(patches)
+
+    on_chunk.parser = parser  # type: ignore[attr-defined]
+    return on_chunk
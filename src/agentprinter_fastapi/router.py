@@ -4,12 +4,22 @@ from uuid import uuid4
 import logging
 import asyncio
 import json
+from functools import partial
 from typing import Any
 
 from .manager import ConnectionManager
 from .schemas import Message, MessageHeader, ComponentNode, Page, ErrorPayload
 from .actions import action_router
 from .actions import InvalidActionPayloadError
+from .deadlines import DeadlineExceeded
+from .runs import RunIdInUse, run_registry, bind_client
+from .channels import run_channels
+from .metrics import agent_metrics
+from .blobs import blob_store, externalize_async
+from .run_scheduler import handle_cancel_action
+from .flow import parse_credits
+from .mux import DEFAULT_MAX_SESSIONS, SessionChannel, SessionMux, TooManySessions
+from .envelope import make_envelope, protocol_error_frame, static_error_frame, envelope_validation_enabled, next_message_id
 from .transports import sse_transport, http_polling, router as transports_router
 
 logger = logging.getLogger(__name__)
@@ -24,34 +34,64 @@ def make_protocol_error(trace_id: str, code: str, message: str, details: dict[st
         details: Additional error context (defaults to empty dict)
     
     Returns:
-        Message with validated ErrorPayload
+        Message with an ErrorPayload-shaped payload. Server-built errors are
+        trusted, so the model is constructed without validation unless
+        envelope validation is enabled.
     """
     if details is None:
         details = {}
     
-    error_payload = ErrorPayload(code=code, message=message, details=details)
-    return Message(
+    if envelope_validation_enabled():
+        error_payload = ErrorPayload(code=code, message=message, details=details)
+        return Message(
+            type="protocol.error",
+            header=MessageHeader(trace_id=trace_id),
+            payload=error_payload.model_dump(mode='json')
+        )
+    return Message.model_construct(
         type="protocol.error",
-        header=MessageHeader(trace_id=trace_id),
-        payload=error_payload.model_dump(mode='json')
+        header=MessageHeader.model_construct(id=next_message_id(), trace_id=trace_id),
+        payload={"code": code, "message": message, "details": details}
     )
 
 router = APIRouter()
 router.include_router(transports_router)  # Include SSE/HTTP fallback endpoints
+action_router.register_target_handler("agent:cancel", handle_cancel_action)
 manager = ConnectionManager() # Global connection manager for this module
 
 _initial_page: Page | None = None
+_initial_page_payload: dict[str, Any] | None = None  # Cached JSON dump of _initial_page
+_initial_page_blob: tuple[int, dict[str, Any]] | None = None  # (threshold, externalized payload) of _initial_page
 _auth_hook = None  # Optional auth hook function
 _template_loader = None  # Optional template loader function
 _version_negotiation_hook = None  # Optional version negotiation hook function
 _max_message_size: int | None = None  # Optional max message size in bytes
+_blob_threshold: int | None = None  # Optional payload size (bytes) above which payloads go to the blob store
+_max_sessions: int = DEFAULT_MAX_SESSIONS  # Logical sessions per WebSocket connection
+
+# Static hello payloads, shared by every connection
+_WS_HELLO_PAYLOAD = {"message": "Connected to AgentPrinter", "server": "agentprinter-fastapi"}
+_SSE_HELLO_PAYLOAD = {"message": "Connected to AgentPrinter via SSE", "server": "agentprinter-fastapi"}
 
 def set_initial_page(page: Page):
-    global _initial_page
+    global _initial_page, _initial_page_payload, _initial_page_blob
     _initial_page = page
+    _initial_page_payload = page.model_dump(mode='json') if page is not None else None
+    _initial_page_blob = None
+
+def _page_payload(page: Page) -> dict[str, Any]:
+    """Dump a page for ui.render, reusing the cached dump of the initial page."""
+    if page is _initial_page and _initial_page_payload is not None:
+        return _initial_page_payload
+    return page.model_dump(mode='json')
 
 def set_auth_hook(hook):
-    """Set an optional auth hook function that receives websocket scope."""
+    """Set an optional auth hook function that receives websocket scope.
+    
+    A falsy result rejects the connection. A string result is taken as the
+    authenticated user's identity: runs are then scheduled, checkpointed
+    and resumable under it rather than under the connection.
+    """
     global _auth_hook
     _auth_hook = hook
 
@@ -70,23 +110,58 @@ def set_max_message_size(size: int | None):
     global _max_message_size
     _max_message_size = size
 
+def set_blob_threshold(size: int | None):
+    """Send payloads larger than `size` bytes as blob references (served at /blobs/{id}). None inlines everything."""
+    global _blob_threshold
+    _blob_threshold = size
+    manager.blob_threshold = size
+    http_polling.blob_threshold = size
+
+def set_max_sessions(limit: int):
+    """Set how many logical sessions one WebSocket connection may multiplex (via protocol.open)."""
+    global _max_sessions
+    _max_sessions = limit
+
+async def _render_frame(page: Page, trace_id: str) -> dict[str, Any]:
+    """Build the ui.render frame, with an oversized page sent as a blob reference."""
+    global _initial_page_blob
+    if _blob_threshold is None:
+        return make_envelope("ui.render", _page_payload(page), trace_id)
+    cached = _initial_page_blob
+    if page is _initial_page and cached is not None and cached[0] == _blob_threshold and _still_stored(cached[1]):
+        # Stored once; later connections reuse the reference
+        return make_envelope("ui.render", cached[1], trace_id)
+    render_msg = await externalize_async(make_envelope("ui.render", _page_payload(page), trace_id), _blob_threshold)
+    if page is _initial_page:
+        _initial_page_blob = (_blob_threshold, render_msg["payload"])
+    return render_msg
+
+def _still_stored(payload: dict[str, Any]) -> bool:
+    """Check that a payload's blob reference (if any) hasn't been evicted."""
+    ref = payload.get("$blob")
+    return ref is None or ref["id"] in blob_store
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     
+    # Get client ID for rate limiting and run tracking
+    client_id = str(uuid4())  # Unique per connection, unlike id(), which is reused after GC
+    
+    # Logical sessions multiplexed over this socket, routed by header.session_id
+    # (this task reads credit grants, so its own replies never wait for them)
+    mux = SessionMux(websocket, client_id, max_sessions=_max_sessions, reader=asyncio.current_task())
+    manager.attach_flow(websocket, mux.primary.flow)
+    
     # Check connection rate limit (only if explicitly configured)
-    from .backpressure import connection_rate_limiter
+    from .backpressure import connection_rate_limiter, rate_limiter
     # Only enforce if rate is configured low (not default high value of 100)
     if connection_rate_limiter.rate < 100:
         connection_id = websocket.client.host if websocket.client and hasattr(websocket.client, 'host') else str(id(websocket))
         if not connection_rate_limiter.is_allowed(connection_id):
             trace_id = str(uuid4())
-            error_msg = make_protocol_error(
-                trace_id=trace_id,
-                code="connection_rate_limit_exceeded",
-                message="Connection rate limit exceeded"
-            )
-            await websocket.send_json(error_msg.model_dump(mode='json'))
+            error_msg = static_error_frame("connection_rate_limit_exceeded", trace_id)
+            await websocket.send_json(error_msg)
             await websocket.close()
             manager.disconnect(websocket)
             return
@@ -97,14 +172,12 @@ async def websocket_endpoint(websocket: WebSocket):
         if _auth_hook:
             auth_result = _auth_hook(websocket.scope)
             if not auth_result:
-                error_msg = make_protocol_error(
-                    trace_id=trace_id,
-                    code="auth_failed",
-                    message="Authentication failed"
-                )
-                await websocket.send_json(error_msg.model_dump(mode='json'))
+                error_msg = static_error_frame("auth_failed", trace_id)
+                await websocket.send_json(error_msg)
                 await websocket.close()
                 return
+            if isinstance(auth_result, str):
+                mux.identify(auth_result)
         
         # Version negotiation
         negotiated_version = "1.0.0"  # Default version
@@ -119,48 +192,17 @@ async def websocket_endpoint(websocket: WebSocket):
             if client_version:
                 negotiated_version = _version_negotiation_hook(client_version)
                 if negotiated_version is None:
-                    error_msg = make_protocol_error(
+                    error_msg = protocol_error_frame(
                         trace_id=trace_id,
                         code="version_mismatch",
                         message=f"Protocol version mismatch. Client requested {client_version}, server does not support it."
                     )
-                    await websocket.send_json(error_msg.model_dump(mode='json'))
+                    await websocket.send_json(error_msg)
                     await websocket.close()
                     return
         
-        # Send Proof of Life (Hello)
-        hello_msg = Message(
-            type="protocol.hello",
-            header=MessageHeader(trace_id=trace_id, version=negotiated_version),
-            payload={
-                "message": "Connected to AgentPrinter",
-                "server": "agentprinter-fastapi"
-            }
-        )
-        
-        # Send using pydantic dump
-        await websocket.send_json(hello_msg.model_dump(mode='json'))
-        
-        # Use template loader if available, otherwise use initial page
-        page_to_send = None
-        if _template_loader:
-            page_to_send = _template_loader()
-        elif _initial_page:
-            page_to_send = _initial_page
-        
-        if page_to_send:
-            render_msg = Message(
-                type="ui.render",
-                header=MessageHeader(trace_id=trace_id),
-                payload=page_to_send.model_dump(mode='json')
-            )
-            await websocket.send_json(render_msg.model_dump(mode='json'))
-        
-        # Get client ID for rate limiting
-        client_id = str(id(websocket))
-        
-        # Import rate limiter
-        from .backpressure import rate_limiter
+        # Send Proof of Life (Hello) and the initial page
+        await _send_greeting(mux.primary, trace_id, negotiated_version)
         
         while True:
             # Wait for messages
@@ -168,84 +210,272 @@ async def websocket_endpoint(websocket: WebSocket):
             
             # Check message size limit
             if _max_message_size is not None and len(data.encode('utf-8')) > _max_message_size:
-                error_msg = make_protocol_error(
+                error_msg = protocol_error_frame(
                     trace_id=trace_id,
                     code="message_too_large",
                     message=f"Message size {len(data.encode('utf-8'))} exceeds maximum {_max_message_size} bytes",
                     details={"size": len(data.encode('utf-8')), "max_size": _max_message_size}
                 )
-                await websocket.send_json(error_msg.model_dump(mode='json'))
+                await websocket.send_json(error_msg)
                 continue
             
-            # Check rate limit for inbound messages
+            # Parse incoming message; unparseable ones are charged to the primary channel
+            try:
+                message = Message.model_validate_json(data)
+                channel = mux.route(message.header.session_id)
+            except Exception as e:
+                message, channel, parse_error = None, mux.primary, e
+            
+            # Check rate limit for inbound messages (per connection, shared by its sessions)
             if not rate_limiter.is_allowed(client_id):
-                error_msg = make_protocol_error(
+                error_msg = protocol_error_frame(
                     trace_id=trace_id,
                     code="rate_limit_exceeded",
                     message="Rate limit exceeded for inbound messages",
                     details={"remaining": rate_limiter.get_remaining(client_id)}
                 )
-                await websocket.send_json(error_msg.model_dump(mode='json'))
+                await channel.send_json(error_msg)
                 continue
             
             try:
-                # Parse incoming message
-                message = Message.model_validate_json(data)
+                if message is None:
+                    raise parse_error
                 
-                # Route user.action messages
+                # Route user.action messages; handlers run as the session's
+                # jobs so this loop keeps reading (cancels, credit grants,
+                # other sessions) while they do
                 if message.type == "user.action":
+                    if _is_cancel(message):
+                        # Handled here, so it can reach the session's job in progress
+                        await _handle_action(message, channel)
+                    else:
+                        channel.submit(partial(_handle_action, message, channel))
+                
+                # Watch a run's events (catch-up, then live): the run's own
+                # client, or anyone holding its share token
+                elif message.type == "agent.subscribe":
+                    run_id = message.payload.get("run_id")
                     try:
-                        await action_router.handle_message(message, websocket)
-                    except InvalidActionPayloadError as e:
-                        error_msg = make_protocol_error(
+                        if not _may_view(run_id, channel.client_id, message.payload.get("token")):
+                            raise KeyError(run_id)  # Indistinguishable from an unknown run
+                        run_channels.subscribe(run_id, channel.send_json, message.header.trace_id, owner=channel.client_id)
+                    except KeyError:
+                        error_msg = protocol_error_frame(
                             trace_id=message.header.trace_id,
-                            code="invalid_action_payload",
-                            message="Invalid user.action payload",
-                            details={"issues": e.issues},
+                            code="unknown_run",
+                            message=f"No active run: {run_id}",
+                            details={"run_id": run_id}
                         )
-                        await websocket.send_json(error_msg.model_dump(mode="json"))
-                    except KeyError as e:
-                        # Unknown action
-                        error_msg = make_protocol_error(
+                        await channel.send_json(error_msg)
+                
+                # Hand the run's owner a token other clients can subscribe with
+                elif message.type == "agent.share":
+                    run_id = message.payload.get("run_id")
+                    run_channel = run_channels.get(run_id)
+                    if run_channel is None or not _may_view(run_id, channel.client_id):
+                        error_msg = protocol_error_frame(
+                            trace_id=message.header.trace_id,
+                            code="unknown_run",
+                            message=f"No active run: {run_id}",
+                            details={"run_id": run_id}
+                        )
+                        await channel.send_json(error_msg)
+                    else:
+                        share_msg = make_envelope("agent.share", {"run_id": run_id, "token": run_channel.share_token}, message.header.trace_id)
+                        await channel.send_json(share_msg)
+                
+                elif message.type == "agent.unsubscribe":
+                    run_channels.unsubscribe(message.payload.get("run_id"), channel.client_id)
+                
+                # Open a logical session on this socket
+                elif message.type == "protocol.open":
+                    session_id = message.header.session_id
+                    if not session_id:
+                        error_msg = protocol_error_frame(
                             trace_id=message.header.trace_id,
-                            code="unknown_action",
-                            message=str(e)
+                            code="invalid_message",
+                            message="protocol.open requires header.session_id",
                         )
-                        await websocket.send_json(error_msg.model_dump(mode='json'))
-                    except Exception as e:
-                        # Handler error
-                        logger.exception("Error in action handler")
-                        error_msg = make_protocol_error(
+                        await channel.send_json(error_msg)
+                        continue
+                    try:
+                        session = mux.open(session_id)
+                    except TooManySessions as e:
+                        error_msg = protocol_error_frame(
                             trace_id=message.header.trace_id,
-                            code="handler_error",
-                            message=str(e)
+                            code="too_many_sessions",
+                            message=str(e),
+                            details={"session_id": session_id, "max_sessions": e.limit}
                         )
-                        await websocket.send_json(error_msg.model_dump(mode='json'))
+                        await channel.send_json(error_msg)
+                        continue
+                    await _send_greeting(session, message.header.trace_id, negotiated_version)
+                
+                # Close a logical session, releasing its runs and subscriptions
+                elif message.type == "protocol.close":
+                    session = mux.close(message.header.session_id) if message.header.session_id else None
+                    if session is not None:
+                        session.close()
+                        _release_channel(session)
+                
+                # Credit grants: hello sets the session's window, ack tops it up
+                elif message.type in ("protocol.hello", "protocol.ack"):
+                    try:
+                        credits = parse_credits(message.payload)
+                    except ValueError as e:
+                        error_msg = protocol_error_frame(
+                            trace_id=message.header.trace_id,
+                            code="invalid_credits",
+                            message=str(e),
+                        )
+                        await channel.send_json(error_msg)
+                        continue
+                    if credits is not None:
+                        await channel.flow.grant(*credits, reset=message.type == "protocol.hello")
                 
                 # Handle resume
                 elif message.type == "protocol.resume":
                      current_session_id = message.header.session_id or "default"
                      last_seen_seq = message.payload.get("last_seen_seq")
                      
+                     # Keep the session's in-flight runs alive on this connection,
+                     # if the client proves they are its own
+                     run_registry.on_resume(
+                         current_session_id,
+                         channel.client_id,
+                         message.payload.get("resume_token"),
+                         channel.identity,
+                     )
+                     
                      if last_seen_seq is not None:
                          # Replay messages
                          messages = http_polling.dequeue_messages(current_session_id, cursor=last_seen_seq, count=100)
                          for msg in messages:
-                             await websocket.send_json(msg)
+                             await channel.send_json(msg)
                 
             except Exception as e:
                 logger.warning(f"Failed to parse message: {data}. Error: {e}")
-                error_msg = make_protocol_error(
+                error_msg = protocol_error_frame(
                     trace_id=trace_id,
                     code="invalid_message",
                     message="Failed to parse message envelope",
                     details={"parse_error": str(e)}
                 )
-                await websocket.send_json(error_msg.model_dump(mode='json'))
+                await channel.send_json(error_msg)
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         logger.info("Client disconnected")
+    finally:
+        manager.disconnect(websocket)
+        rate_limiter.forget(client_id)
+        # Cancel abandoned runs unless the session resumes within the grace period
+        for channel in mux.channels():
+            channel.close()
+            _release_channel(channel)
+
+def _is_cancel(message: Message) -> bool:
+    return isinstance(message.payload, dict) and message.payload.get("target") == "agent:cancel"
+
+async def _handle_action(message: Message, channel: SessionChannel) -> None:
+    """Run a user.action handler, reporting failures as protocol.error."""
+    # Runs started by the handler belong to this session
+    bind_client(channel.client_id, message.header.session_id, channel.identity)
+    try:
+        await action_router.handle_message(message, channel)
+    except InvalidActionPayloadError as e:
+        error_msg = protocol_error_frame(
+            trace_id=message.header.trace_id,
+            code="invalid_action_payload",
+            message="Invalid user.action payload",
+            details={"issues": e.issues},
+        )
+        await channel.send_json(error_msg)
+    except DeadlineExceeded as e:
+        error_msg = protocol_error_frame(
+            trace_id=message.header.trace_id,
+            code="deadline_exceeded",
+            message=str(e),
+            details=e.details,
+        )
+        await channel.send_json(error_msg)
+    except RunIdInUse as e:
+        error_msg = protocol_error_frame(
+            trace_id=message.header.trace_id,
+            code="run_id_in_use",
+            message=str(e),
+            details={"run_id": e.run_id},
+        )
+        await channel.send_json(error_msg)
+    except KeyError as e:
+        # Unknown action
+        error_msg = protocol_error_frame(
+            trace_id=message.header.trace_id,
+            code="unknown_action",
+            message=str(e)
+        )
+        await channel.send_json(error_msg)
+    except Exception as e:
+        # Handler error
+        logger.exception("Error in action handler")
+        error_msg = protocol_error_frame(
+            trace_id=message.header.trace_id,
+            code="handler_error",
+            message=str(e)
+        )
+        await channel.send_json(error_msg)
+
+async def _send_greeting(channel: SessionChannel, trace_id: str, version: str) -> None:
+    """Send protocol.hello and the initial page (if any) on a new connection or session."""
+    # The resume token lets a reconnecting client keep this connection's runs
+    hello_payload = {**_WS_HELLO_PAYLOAD, "resume_token": run_registry.resume_token(channel.client_id)}
+    hello_msg = make_envelope("protocol.hello", hello_payload, trace_id, version=version)
+    await channel.send_json(hello_msg)
+    
+    # Use template loader if available, otherwise use initial page
+    page_to_send = None
+    if _template_loader:
+        page_to_send = _template_loader()
+    elif _initial_page:
+        page_to_send = _initial_page
+    
+    if page_to_send:
+        await channel.send_json(await _render_frame(page_to_send, trace_id))
+
+def _may_view(run_id: Any, client_id: str, token: Any = None) -> bool:
+    """Check whether a client may watch a run: it started (or resumed) it, or holds the share token."""
+    if not isinstance(run_id, str):
+        return False
+    return run_registry.owns(run_id, client_id) or run_channels.can_view(run_id, client_id, token)
+
+def _release_channel(channel: SessionChannel) -> None:
+    """Release a closed session's runs (after the resume grace period) and subscriptions."""
+    run_registry.on_disconnect(channel.client_id)
+    run_channels.unsubscribe_owner(channel.client_id)
+
+
+def _http_authorized(request: Request) -> bool:
+    """Run the auth hook (if set) for an HTTP request, with a scope shaped like the WebSocket one."""
+    return bool(_http_auth_result(request))
+
+def _http_auth_result(request: Request) -> Any:
+    """Return the auth hook's result for an HTTP request (True when no hook is set)."""
+    if not _auth_hook:
+        return True
+    mock_scope = {
+        "type": "http",
+        "method": request.method,
+        "path": request.url.path,
+        "query_string": request.url.query.encode() if request.url.query else b"",
+        "headers": dict(request.headers),
+    }
+    return _auth_hook(mock_scope)
+
+def _auth_failed_response() -> Response:
+    return Response(
+        content=json.dumps({"error": "Authentication failed"}),
+        status_code=401,
+        media_type="application/json"
+    )
 
 
 @router.get("/sse")
@@ -258,22 +488,8 @@ async def sse_endpoint(request: Request):
     session_id = request.query_params.get("session_id", f"sse-{uuid4()}")
     
     # Auth check (reuse auth hook if available)
-    if _auth_hook:
-        # Create a mock scope for auth hook
-        mock_scope = {
-            "type": "http",
-            "method": "GET",
-            "path": "/sse",
-            "query_string": request.url.query.encode() if request.url.query else b"",
-            "headers": dict(request.headers),
-        }
-        auth_result = _auth_hook(mock_scope)
-        if not auth_result:
-            return Response(
-                content=json.dumps({"error": "Authentication failed"}),
-                status_code=401,
-                media_type="application/json"
-            )
+    if not _http_authorized(request):
+        return _auth_failed_response()
     
     # Version negotiation
     negotiated_version = "1.0.0"
@@ -292,15 +508,8 @@ async def sse_endpoint(request: Request):
         trace_id = str(uuid4())
         
         # Send protocol.hello
-        hello_msg = Message(
-            type="protocol.hello",
-            header=MessageHeader(trace_id=trace_id, version=negotiated_version),
-            payload={
-                "message": "Connected to AgentPrinter via SSE",
-                "server": "agentprinter-fastapi"
-            }
-        )
-        yield f"data: {json.dumps(hello_msg.model_dump(mode='json'))}\n\n"
+        hello_msg = make_envelope("protocol.hello", _SSE_HELLO_PAYLOAD, trace_id, version=negotiated_version)
+        yield f"data: {json.dumps(hello_msg)}\n\n"
         
         # Send initial page if available
         page_to_send = None
@@ -310,12 +519,7 @@ async def sse_endpoint(request: Request):
             page_to_send = _initial_page
         
         if page_to_send:
-            render_msg = Message(
-                type="ui.render",
-                header=MessageHeader(trace_id=trace_id),
-                payload=page_to_send.model_dump(mode='json')
-            )
-            yield f"data: {json.dumps(render_msg.model_dump(mode='json'))}\n\n"
+            yield f"data: {json.dumps(await _render_frame(page_to_send, trace_id))}\n\n"
         
         # Register client for future messages
         message_queue = asyncio.Queue()
@@ -351,3 +555,87 @@ async def sse_endpoint(request: Request):
             "X-Accel-Buffering": "no"
         }
     )
+
+
+@router.get("/metrics")
+async def metrics_endpoint(request: Request, format: str = "prometheus"):
+    """Agent performance histograms (TTFT, tokens/s, tool and run latency).
+    
+    Returns the Prometheus text format, or the summaries and recent runs as
+    JSON with `?format=json`.
+    """
+    if not _http_authorized(request):
+        return _auth_failed_response()
+    
+    if format == "json":
+        return agent_metrics.snapshot()
+    return Response(content=agent_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single `bytes=` range into [start, end), or None if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            return (max(0, size - length), size) if length > 0 else None
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        return None
+    return start, min(end, size)
+
+
+@router.get("/blobs/{blob_id}")
+async def blob_endpoint(blob_id: str, request: Request):
+    """Serve a stored blob, honoring single `Range: bytes=` requests.
+    
+    Requests pass the same auth hook as /ws and /sse, and must carry the
+    `sig` of the blob's reference URL; blobs stored for an authenticated
+    identity are only served to it. Blobs are immutable, so responses carry
+    the blob ID as a strong ETag and may be cached indefinitely, but only by
+    the client: they can hold one user's data.
+    """
+    auth_result = _http_auth_result(request)
+    if not auth_result:
+        return _auth_failed_response()
+    
+    identity = auth_result if isinstance(auth_result, str) else None
+    # Unreadable blobs look exactly like unknown ones
+    size = None
+    if blob_store.may_read(blob_id, request.query_params.get("sig"), identity):
+        size = await blob_store.size_async(blob_id)
+    if size is None:
+        return Response(content=json.dumps({"error": "Unknown blob"}), status_code=404, media_type="application/json")
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{blob_id}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    media_type = blob_store.content_type(blob_id)
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        data = await blob_store.read_async(blob_id, start, end)
+        if data is None:
+            return Response(status_code=404)
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        return Response(content=data, status_code=206, headers=headers, media_type=media_type)
+    
+    data = await blob_store.read_async(blob_id)
+    if data is None:
+        return Response(status_code=404)
+    return Response(content=data, headers=headers, media_type=media_type)
@@ -0,0 +1,259 @@
+"""Admission control for agent runs: global and per-tenant caps with fair queuing."""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+from .envelope import make_envelope, protocol_error_frame
+from .runs import current_client, current_identity, run_registry
+
+logger = logging.getLogger(__name__)
+
+class RunCancelled(Exception):
+    """Raised in a queued run's task when it is cancelled before it starts."""
+
+    def __init__(self, run_id: str):
+        super().__init__(f"Run {run_id} was cancelled while queued")
+        self.run_id = run_id
+
+class _Waiter:
+    __slots__ = ("run_id", "tenant", "connection_id", "session_id", "position", "granted", "cancelled", "wakeup")
+
+    def __init__(self, run_id: str, tenant: str):
+        self.run_id = run_id
+        self.tenant = tenant
+        self.connection_id, self.session_id = current_client()
+        self.position = 0
+        self.granted = False
+        self.cancelled = False
+        self.wakeup = asyncio.Event()
+
+class RunScheduler:
+    """Limits how many agent runs execute at once, overall and per tenant.
+
+    Runs over a cap wait in a per-tenant FIFO queue. Free slots are handed
+    out round-robin across tenants with queued runs, so one tenant launching
+    dozens of runs delays only its own. A tenant is typically a user or
+    workspace; it defaults to the authenticated identity, else the client's
+    connection. Never the client-supplied session ID, which a client could
+    change on every message to dodge its cap.
+    """
+
+    def __init__(self, max_concurrent: int = 16, max_per_tenant: int = 4):
+        """Initialize run scheduler.
+
+        Args:
+            max_concurrent: Runs executing at once across all tenants
+            max_per_tenant: Runs executing at once per tenant
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_tenant = max_per_tenant
+        self.running: Dict[str, str] = {}  # run_id -> tenant
+        self._tenant_running: Dict[str, int] = {}
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()  # Rotation order
+        self._waiters: Dict[str, _Waiter] = {}
+        self.stats = {"started": 0, "queued": 0, "cancelled": 0}
+
+    @staticmethod
+    def default_tenant() -> str:
+        connection_id = current_client()[0]
+        if connection_id is not None:
+            # Sessions multiplexed on a connection ("<connection>:<session>") share its quota
+            connection_id = connection_id.partition(":")[0]
+        return current_identity() or connection_id or "default"
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        run_id: str,
+        tenant: Optional[str] = None,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """Hold an execution slot for `run_id` for the duration of the block.
+
+        Args:
+            run_id: Run waiting for the slot
+            tenant: Fairness and per-tenant cap key (defaults to `default_tenant()`)
+            on_queued: Awaited with the run's 1-based queue position whenever it
+                changes while waiting, and with 0 when a queued run starts
+
+        Raises:
+            RunCancelled: If `cancel(run_id)` is called while the run is queued
+        """
+        tenant = tenant or self.default_tenant()
+        await self._acquire(run_id, tenant, on_queued)
+        try:
+            yield
+        finally:
+            self._release(run_id)
+
+    async def _acquire(self, run_id: str, tenant: str, on_queued: Optional[Callable[[int], Awaitable[None]]]) -> None:
+        if not self._queues and self._has_room(tenant):
+            self._start(run_id, tenant)
+            return
+
+        waiter = _Waiter(run_id, tenant)
+        self._queues.setdefault(tenant, deque()).append(waiter)
+        self._waiters[run_id] = waiter
+        self.stats["queued"] += 1
+        self._dispatch()
+
+        reported = None
+        try:
+            while not waiter.granted:
+                if waiter.cancelled:
+                    raise RunCancelled(run_id)
+                if on_queued is not None and waiter.position != reported:
+                    reported = waiter.position
+                    await on_queued(reported)
+                    continue  # The position may have moved during the send
+                waiter.wakeup.clear()
+                await waiter.wakeup.wait()
+        except BaseException:
+            if waiter.granted:
+                self._release(run_id)
+            else:
+                self._remove(waiter)
+            raise
+
+        if on_queued is not None and reported:
+            try:
+                await on_queued(0)
+            except BaseException:
+                self._release(run_id)
+                raise
+
+    def _has_room(self, tenant: str) -> bool:
+        return len(self.running) < self.max_concurrent and self._tenant_running.get(tenant, 0) < self.max_per_tenant
+
+    def _start(self, run_id: str, tenant: str) -> None:
+        self.running[run_id] = tenant
+        self._tenant_running[tenant] = self._tenant_running.get(tenant, 0) + 1
+        self.stats["started"] += 1
+
+    def _release(self, run_id: str) -> None:
+        tenant = self.running.pop(run_id, None)
+        if tenant is None:
+            return
+        remaining = self._tenant_running[tenant] - 1
+        if remaining:
+            self._tenant_running[tenant] = remaining
+        else:
+            del self._tenant_running[tenant]
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        if self._waiters.pop(waiter.run_id, None) is None:
+            return
+        queue = self._queues.get(waiter.tenant)
+        if queue is not None:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.tenant]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots round-robin across tenants, then renumber the queue."""
+        while len(self.running) < self.max_concurrent:
+            for tenant in self._queues:
+                if self._tenant_running.get(tenant, 0) < self.max_per_tenant:
+                    break
+            else:
+                break
+            queue = self._queues.pop(tenant)
+            waiter = queue.popleft()
+            if queue:
+                self._queues[tenant] = queue  # Back of the rotation
+            del self._waiters[waiter.run_id]
+            self._start(waiter.run_id, tenant)
+            waiter.granted = True
+            waiter.wakeup.set()
+        self._renumber()
+
+    def _renumber(self) -> None:
+        # Positions follow dispatch order: one run per tenant per round
+        position = 0
+        queues = [list(q) for q in self._queues.values()]
+        for depth in range(max(map(len, queues), default=0)):
+            for queue in queues:
+                if depth < len(queue):
+                    position += 1
+                    waiter = queue[depth]
+                    if waiter.position != position:
+                        waiter.position = position
+                        waiter.wakeup.set()
+
+    def position(self, run_id: str) -> Optional[int]:
+        """Return a queued run's 1-based position, or None if it isn't queued."""
+        waiter = self._waiters.get(run_id)
+        return waiter.position if waiter is not None else None
+
+    def is_queued(self, run_id: str) -> bool:
+        return run_id in self._waiters
+
+    def owner_of(self, run_id: str) -> Optional[tuple[Optional[str], Optional[str]]]:
+        """Return the (connection_id, session_id) that queued `run_id`, if queued."""
+        waiter = self._waiters.get(run_id)
+        return (waiter.connection_id, waiter.session_id) if waiter is not None else None
+
+    def cancel(self, run_id: str) -> bool:
+        """Drop a queued run; its `slot()` raises RunCancelled.
+
+        Returns:
+            True if the run was queued
+        """
+        waiter = self._waiters.get(run_id)
+        if waiter is None:
+            return False
+        waiter.cancelled = True
+        waiter.wakeup.set()
+        self._remove(waiter)
+        self.stats["cancelled"] += 1
+        return True
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            **self.stats,
+            "running": len(self.running),
+            "queued_now": len(self._waiters),
+            "tenants_waiting": len(self._queues),
+        }
+
+async def handle_cancel_action(message: Any, websocket: Any) -> None:
+    """Handle the `agent:cancel` action target.
+
+    Cancels the run named by the payload's `run_id`, queued or running, if it
+    belongs to the requesting connection (the server-assigned ID bound with
+    `bind_client`; the client-supplied session ID is not trusted). The
+    client gets an agent.event error with code "cancelled", or a
+    protocol.error "unknown_run".
+    """
+    run_id = message.payload.get("run_id")
+    trace_id = message.header.trace_id
+    connection_id, _ = current_client()
+
+    owner = run_scheduler.owner_of(run_id)
+    handle = run_registry.runs.get(run_id)
+    if owner is None and handle is not None:
+        owner = (handle.connection_id, handle.session_id)
+    owned = owner is not None and connection_id is not None and owner[0] == connection_id
+    if not owned:
+        await websocket.send_json(protocol_error_frame(
+            trace_id=trace_id,
+            code="unknown_run",
+            message=f"No active run: {run_id}",
+            details={"run_id": run_id}
+        ))
+        return
+
+    # A run waiting for a slot is tracked too, so cancelling its task also dequeues it
+    if not await run_registry.cancel_run(run_id, reason="cancelled by client"):
+        run_scheduler.cancel(run_id)
+    await websocket.send_json(make_envelope(
+        "agent.event",
+        {"run_id": run_id, "event": "error", "data": {"error": "Run cancelled", "code": "cancelled"}},
+        trace_id
+    ))
+
+# Global instance; pass it to AgentRunner to cap concurrent runs
+run_scheduler = RunScheduler()
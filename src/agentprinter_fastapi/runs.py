@@ -0,0 +1,243 @@
+"""Registry of in-flight agent runs, cancelled when their client goes away."""
+import asyncio
+import hashlib
+import hmac
+import inspect
+import secrets
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RunIdInUse(Exception):
+    """Raised when a run is started under the ID of a run that is still live."""
+
+    def __init__(self, run_id: str):
+        super().__init__(f"Run {run_id} is already in progress")
+        self.run_id = run_id
+
+@dataclass
+class RunHandle:
+    """An in-flight run and the resources to release when it is cancelled."""
+    run_id: str
+    task: Optional[asyncio.Task] = None
+    connection_id: Optional[str] = None
+    session_id: Optional[str] = None
+    identity: Optional[str] = None
+    started_at: float = field(default_factory=time.monotonic)
+    closers: list[Callable[[], Any]] = field(default_factory=list)
+
+    def add_closer(self, closer: Callable[[], Any]) -> None:
+        """Register a sync or async callable that closes an upstream stream."""
+        self.closers.append(closer)
+
+# Connection/session the current task is serving, set by the WebSocket endpoint
+_current_client: ContextVar[tuple[Optional[str], Optional[str]]] = ContextVar(
+    "agentprinter_client", default=(None, None)
+)
+_current_identity: ContextVar[Optional[str]] = ContextVar("agentprinter_identity", default=None)
+_current_run: ContextVar[Optional[RunHandle]] = ContextVar("agentprinter_run", default=None)
+
+def bind_client(connection_id: Optional[str], session_id: Optional[str] = None, identity: Optional[str] = None) -> None:
+    """Mark the current context (and tasks spawned from it) as serving a client.
+
+    Args:
+        connection_id: Server-assigned ID of the client's connection
+        session_id: Session the client claims (client-supplied, so never
+            trusted for access or quota decisions)
+        identity: Authenticated user the auth hook vouched for, if any
+    """
+    _current_client.set((connection_id, session_id))
+    _current_identity.set(identity)
+
+def current_client() -> tuple[Optional[str], Optional[str]]:
+    """Return the (connection_id, session_id) bound to the current context."""
+    return _current_client.get()
+
+def current_identity() -> Optional[str]:
+    """Return the authenticated identity bound to the current context, if any."""
+    return _current_identity.get()
+
+def current_run() -> Optional[RunHandle]:
+    """Return the run tracked by the enclosing `RunRegistry.track` scope, if any."""
+    return _current_run.get()
+
+class RunRegistry:
+    """Tracks in-flight runs per connection and session.
+
+    When a connection drops, its runs are cancelled after a grace period unless
+    the session resumes on a new connection first. Resuming takes proof of
+    ownership: the authenticated identity the runs were started under, or
+    the connection's resume token (see `resume_token`).
+    """
+
+    def __init__(self, grace_period: float = 10.0):
+        """Initialize run registry.
+
+        Args:
+            grace_period: Seconds to wait for a resume before cancelling runs
+        """
+        self.grace_period = grace_period
+        self.runs: Dict[str, RunHandle] = {}
+        self._pending_cancels: Dict[str, asyncio.TimerHandle] = {}  # connection_id -> timer
+        self._cancel_tasks: Set[asyncio.Task] = set()
+        self._secret = secrets.token_bytes(32)  # Signs resume tokens
+
+    def register(
+        self,
+        run_id: str,
+        task: Optional[asyncio.Task] = None,
+        connection_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> RunHandle:
+        """Register a run. Connection and session default to the bound client.
+
+        Raises:
+            RunIdInUse: If another task is still running under `run_id`
+        """
+        existing = self.runs.get(run_id)
+        if (
+            existing is not None
+            and existing.task is not None
+            and not existing.task.done()
+            and existing.task is not task
+        ):
+            raise RunIdInUse(run_id)
+        bound_connection, bound_session = _current_client.get()
+        handle = RunHandle(
+            run_id=run_id,
+            task=task,
+            connection_id=connection_id or bound_connection,
+            session_id=session_id or bound_session,
+            identity=_current_identity.get(),
+        )
+        self.runs[run_id] = handle
+        return handle
+
+    def unregister(self, run_id: str) -> None:
+        self.runs.pop(run_id, None)
+
+    @asynccontextmanager
+    async def track(self, run_id: str, connection_id: Optional[str] = None, session_id: Optional[str] = None):
+        """Track the current task as `run_id` for the duration of the block."""
+        handle = self.register(run_id, asyncio.current_task(), connection_id, session_id)
+        token = _current_run.set(handle)
+        try:
+            yield handle
+        finally:
+            _current_run.reset(token)
+            if self.runs.get(run_id) is handle:
+                self.unregister(run_id)
+
+    def owns(self, run_id: str, connection_id: Optional[str]) -> bool:
+        """Check whether a run is tracked for `connection_id` (a server-assigned client ID)."""
+        handle = self.runs.get(run_id)
+        return handle is not None and connection_id is not None and handle.connection_id == connection_id
+
+    def runs_for_connection(self, connection_id: str) -> list[RunHandle]:
+        return [h for h in self.runs.values() if h.connection_id == connection_id]
+
+    def runs_for_session(self, session_id: str) -> list[RunHandle]:
+        return [h for h in self.runs.values() if h.session_id == session_id]
+
+    async def cancel_run(self, run_id: str, reason: str = "cancelled") -> bool:
+        """Close a run's upstream streams and cancel its task.
+
+        Returns:
+            True if the run was registered
+        """
+        handle = self.runs.pop(run_id, None)
+        if handle is None:
+            return False
+
+        logger.info(f"Cancelling run {run_id}: {reason}")
+        for closer in handle.closers:
+            try:
+                result = closer()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Error closing upstream for run {run_id}: {e}")
+
+        # Never cancel the caller itself (e.g. the endpoint reporting a disconnect)
+        if handle.task is not None and not handle.task.done() and handle.task is not asyncio.current_task():
+            handle.task.cancel()
+        return True
+
+    def on_disconnect(self, connection_id: str) -> None:
+        """Schedule cancellation of a dropped connection's runs after the grace period."""
+        if not self.runs_for_connection(connection_id):
+            return
+
+        loop = asyncio.get_running_loop()
+        self._cancel_pending(connection_id)
+        self._pending_cancels[connection_id] = loop.call_later(
+            self.grace_period,
+            lambda: self._start_cancel(connection_id),
+        )
+
+    def resume_token(self, connection_id: str) -> str:
+        """Return the token that lets a new connection resume `connection_id`'s runs.
+
+        Sessions multiplexed on a connection ("<connection>:<session>") share
+        its token. Tokens are derived from a per-registry secret, so nothing
+        is stored per connection.
+        """
+        connection = connection_id.partition(":")[0]
+        return hmac.new(self._secret, connection.encode(), hashlib.sha256).hexdigest()
+
+    def on_resume(
+        self,
+        session_id: str,
+        connection_id: str,
+        resume_token: Optional[str] = None,
+        identity: Optional[str] = None,
+    ) -> int:
+        """Move a resumed session's runs to the new connection and keep them alive.
+
+        Only runs the caller proves it owns are moved: those started under
+        `identity`, or on the connection `resume_token` was issued for.
+
+        Returns:
+            Number of runs moved
+        """
+        moved = 0
+        for handle in self.runs_for_session(session_id):
+            if not self._may_resume(handle, resume_token, identity):
+                continue
+            moved += 1
+            old_connection = handle.connection_id
+            handle.connection_id = connection_id
+            if old_connection and old_connection != connection_id and not self.runs_for_connection(old_connection):
+                self._cancel_pending(old_connection)
+        return moved
+
+    def _may_resume(self, handle: RunHandle, resume_token: Optional[str], identity: Optional[str]) -> bool:
+        if identity is not None and handle.identity == identity:
+            return True
+        if not isinstance(resume_token, str) or handle.connection_id is None:
+            return False
+        return hmac.compare_digest(resume_token, self.resume_token(handle.connection_id))
+
+    def _start_cancel(self, connection_id: str) -> None:
+        # Keep a reference so the task isn't garbage-collected mid-cancellation
+        task = asyncio.get_running_loop().create_task(self._cancel_connection(connection_id))
+        self._cancel_tasks.add(task)
+        task.add_done_callback(self._cancel_tasks.discard)
+
+    def _cancel_pending(self, connection_id: str) -> None:
+        timer = self._pending_cancels.pop(connection_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    async def _cancel_connection(self, connection_id: str) -> None:
+        self._pending_cancels.pop(connection_id, None)
+        for handle in self.runs_for_connection(connection_id):
+            await self.cancel_run(handle.run_id, reason=f"client {connection_id} disconnected")
+
+# Global registry
+run_registry = RunRegistry()
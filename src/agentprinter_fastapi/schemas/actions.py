@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import Literal, Optional
 
 class ActionPayload(BaseModel):
     """What to do when an event fires."""
@@ -9,3 +9,5 @@ class ActionPayload(BaseModel):
     mode: Literal["stream", "http"] = "stream"
     # Mapping form data/state to action arguments
     payload_mapping: dict[str, str] = Field(default_factory=dict)
+    # Send only the first N chunks of large tool results (None = all)
+    max_tool_chunks: Optional[int] = Field(default=None, ge=0, strict=True)
@@ -4,5 +4,5 @@ from typing import Literal, Any
 class AgentEvent(BaseModel):
     """A single event from the agent's lifecycle."""
     run_id: str
-    event: Literal["start", "token", "tool_call", "tool_result", "finish", "error"]
-    data: Any # String token, or dict tool call details
+    event: Literal["start", "token", "tool_call", "tool_result", "tool_result_chunk", "finish", "error"]
+    data: Any # String token, or dict tool call details (see tool_chunks for large results)
@@ -30,6 +30,7 @@ class MessageHeader(BaseModel):
     session_id: str | None = Field(default=None, description="Session identity")
     workspace_id: str | None = Field(default=None, description="Workspace identity for multi-tenancy")
     user_id: str | None = Field(default=None, description="User identity")
+    deadline_ms: int | None = Field(default=None, ge=0, description="Client time budget in milliseconds for handling this message")
 
 class Message(BaseModel):
     """The universal envelope for all WebSocket communication."""
@@ -0,0 +1,107 @@
+"""Share one execution among identical concurrent agent runs."""
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+Emit = Callable[[dict], Awaitable[None]]
+
+def flight_key(target: str, input_data: Any) -> str:
+    """Return a key for `target` run on `input_data`, normalized as canonical JSON."""
+    encoded = json.dumps(input_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"{target}:{hashlib.sha256(encoded.encode('utf-8')).hexdigest()}"
+
+@dataclass
+class Flight:
+    """One in-flight execution and the subscribers attached to it."""
+    key: str
+    events: list[dict] = field(default_factory=list)
+    subscribers: list[Emit] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+    async def emit(self, event: dict) -> None:
+        """Record an event and deliver it to every current subscriber."""
+        self.events.append(event)
+        for subscriber in list(self.subscribers):
+            try:
+                await subscriber(event)
+            except Exception as e:
+                logger.warning(f"Dropping singleflight subscriber of {self.key}: {e}")
+                self._unsubscribe(subscriber)
+
+    async def attach(self, subscriber: Emit) -> None:
+        """Replay the events so far to `subscriber`, then subscribe it to live ones."""
+        delivered = 0
+        while delivered < len(self.events):
+            await subscriber(self.events[delivered])
+            delivered += 1
+        # No await between the last replayed event and subscribing, so no
+        # event is missed or delivered twice
+        self.subscribers.append(subscriber)
+
+    def _unsubscribe(self, subscriber: Emit) -> None:
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+class SingleFlight:
+    """Runs at most one execution per key; concurrent callers share its events and result.
+
+    The first caller starts the execution in its own task. Later callers with
+    the same key get the events emitted so far replayed, then the live
+    stream, and the same result or exception. A caller that is cancelled
+    detaches; the execution is cancelled once no callers remain.
+    """
+
+    def __init__(self):
+        self.flights: Dict[str, Flight] = {}
+        self.stats = {"started": 0, "joined": 0}
+
+    async def run(
+        self,
+        key: str,
+        start: Callable[[Emit], Awaitable[Any]],
+        on_event: Emit,
+    ) -> Any:
+        """Run `start(emit)` for `key`, or join the execution already running.
+
+        Args:
+            key: Identity of the execution (see `flight_key`)
+            start: Starts the execution; it must send its events through `emit`
+            on_event: This caller's event callback
+
+        Returns:
+            The execution's result
+        """
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(key)
+            flight.subscribers.append(on_event)
+            flight.task = asyncio.create_task(start(flight.emit))
+            flight.task.add_done_callback(lambda _: self._finish(flight))
+            self.flights[key] = flight
+            self.stats["started"] += 1
+        else:
+            self.stats["joined"] += 1
+            await flight.attach(on_event)
+
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight._unsubscribe(on_event)
+            if not flight.subscribers and not flight.task.done():
+                flight.task.cancel()
+            raise
+
+    def _finish(self, flight: Flight) -> None:
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            # Retrieved here so a run nobody awaits anymore doesn't log a warning
+            logger.debug(f"Singleflight {flight.key} failed: {flight.task.exception()}")
+
+# Global instance; pass it to the adapters to share runs across connections
+agent_singleflight = SingleFlight()
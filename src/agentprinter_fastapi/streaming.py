@@ -0,0 +1,68 @@
+"""Append-only buffer for streamed text output."""
+from typing import Optional
+
+class StreamBuffer:
+    """Accumulates streamed text chunks in linear time.
+
+    Chunks are kept in a list and joined lazily; the joined string is cached
+    until the next append, so repeated snapshots are cheap. With `max_chars`
+    set, only (roughly) the most recent `max_chars` characters are retained
+    and `text` returns exactly the last `max_chars`; `total_chars` still
+    counts everything appended.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None):
+        """Initialize stream buffer.
+
+        Args:
+            max_chars: Keep only the last `max_chars` characters (None = keep all)
+        """
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self._chunks: list[str] = []
+        self._retained = 0  # Characters currently held in `_chunks`
+        self._joined: Optional[str] = ""
+
+    def append(self, text: str) -> None:
+        """Append a chunk in O(1) amortized time."""
+        if not text:
+            return
+        self._chunks.append(text)
+        self._retained += len(text)
+        self.total_chars += len(text)
+        self._joined = None
+        if self.max_chars is not None and self._retained > 2 * self.max_chars:
+            # Compact at twice the window, so trimming stays amortized O(1)
+            self._chunks = [self.text]
+            self._retained = len(self._chunks[0])
+
+    @property
+    def text(self) -> str:
+        """Return the retained output as one string (cached until the next append)."""
+        if self._joined is None:
+            joined = "".join(self._chunks)
+            if self.max_chars is not None and len(joined) > self.max_chars:
+                joined = joined[-self.max_chars:] if self.max_chars else ""
+            self._joined = joined
+        return self._joined
+
+    def snapshot(self) -> str:
+        """Return the current output; later appends do not affect the result."""
+        return self.text
+
+    @property
+    def truncated(self) -> bool:
+        """True if older output has been dropped by the retention window."""
+        return self.total_chars > len(self.text)
+
+    def clear(self) -> None:
+        self._chunks.clear()
+        self._retained = 0
+        self.total_chars = 0
+        self._joined = ""
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __str__(self) -> str:
+        return self.text
@@ -0,0 +1,112 @@
+"""Split large tool_result events into sequenced chunks plus a summary."""
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Tuple
+from pydantic_core import to_jsonable_python
+
+DEFAULT_THRESHOLD = 64 * 1024  # Characters of output before a result is chunked
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# Chunk cap the client asked for in its user.action, set by the action router
+_requested_max_chunks: ContextVar[Optional[int]] = ContextVar("agentprinter_max_tool_chunks", default=None)
+
+@contextmanager
+def max_chunks_requested(limit: Optional[int]):
+    """Apply the client's cap on chunks per large tool result within the block (and tasks spawned in it)."""
+    token = _requested_max_chunks.set(limit)
+    try:
+        yield
+    finally:
+        _requested_max_chunks.reset(token)
+
+def requested_max_chunks() -> Optional[int]:
+    """Return the chunk cap requested by the client being served, if any."""
+    return _requested_max_chunks.get()
+
+def chunk_tool_result(
+    data: Any,
+    threshold: int = DEFAULT_THRESHOLD,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunks: Optional[int] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Yield the (event, data) pairs that carry one tool_result.
+
+    Results whose `output` is at most `threshold` characters (as text, or as
+    JSON for other values) are yielded unchanged. Larger ones become
+    `tool_result_chunk` events with data {"call_id", "tool", "node", "seq",
+    "text"} (keys copied from the result when present), followed by the
+    `tool_result` summary: the result's other keys with `output` replaced by
+    "chunked": {"encoding", "chars", "chunks", "sent", "complete"}. Clients
+    join the chunk texts in `seq` order, and JSON-decode them when
+    `encoding` is "json".
+
+    Args:
+        data: tool_result event data
+        threshold: Largest output sent in one event
+        chunk_size: Characters per chunk
+        max_chunks: Send only the first N chunks (defaults to the cap set by
+            `max_chunks_requested`, None = all); the summary then has
+            "complete": False
+    """
+    if max_chunks is None:
+        max_chunks = requested_max_chunks()
+    if not isinstance(data, dict) or data.get("output") is None:
+        yield "tool_result", data
+        return
+
+    output = data["output"]
+    if isinstance(output, str):
+        text, encoding = output, "text"
+    else:
+        if threshold > 0 and fits_within(output, threshold):
+            yield "tool_result", data
+            return
+        text, encoding = json.dumps(to_jsonable_python(output, serialize_unknown=True), ensure_ascii=False, separators=(",", ":")), "json"
+    if len(text) <= threshold:
+        yield "tool_result", data
+        return
+
+    chunks = -(-len(text) // chunk_size)
+    sent = chunks if max_chunks is None else min(chunks, max_chunks)
+    ids = {k: data[k] for k in ("call_id", "tool", "node") if k in data}
+    for seq in range(sent):
+        yield "tool_result_chunk", {**ids, "seq": seq, "text": text[seq * chunk_size:(seq + 1) * chunk_size]}
+
+    summary = {k: v for k, v in data.items() if k != "output"}
+    summary["chunked"] = {
+        "encoding": encoding,
+        "chars": len(text),
+        "chunks": chunks,
+        "sent": sent,
+        "complete": sent == chunks,
+    }
+    yield "tool_result", summary
+
+def fits_within(value: Any, threshold: int) -> bool:
+    """Cheap check that `value` serializes within `threshold` characters, so small values skip json.dumps.
+
+    Sizes are overestimated (strings count double for escapes); anything
+    uncertain returns False and is measured by serializing.
+    """
+    budget = threshold
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            budget -= 2 * len(item) + 2
+        elif item is None or isinstance(item, (bool, int, float)):
+            budget -= 24
+        elif isinstance(item, dict):
+            budget -= 2 + 2 * len(item)
+            for key, v in item.items():
+                budget -= len(str(key)) + 3
+                stack.append(v)
+        elif isinstance(item, (list, tuple)):
+            budget -= 2 + len(item)
+            stack.extend(item)
+        else:
+            return False  # Unknown size; serialize to find out
+        if budget < 0:
+            return False
+    return True
@@ -0,0 +1,458 @@
+"""Tool registry and executor built on the Tool contract."""
+import asyncio
+import functools
+import inspect
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import logging
+from .schemas.tools import Tool
+from .deadlines import Deadline, DeadlineExceeded, current_deadline, enforce_deadline
+from .singleflight import flight_key
+from .tool_chunks import DEFAULT_CHUNK_SIZE, DEFAULT_THRESHOLD, chunk_tool_result
+
+logger = logging.getLogger(__name__)
+
+Validator = Callable[[Any, list], list[dict[str, Any]]]
+Emit = Callable[[dict], Awaitable[None]]
+
+# JSON-schema type name -> Python check (bool is not a number in JSON schema)
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool) or isinstance(v, float) and v.is_integer(),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+def _issue(loc: list, msg: str, type_: str) -> dict[str, Any]:
+    return {"loc": list(loc), "msg": msg, "type": type_}
+
+def compile_schema(schema: dict[str, Any]) -> Validator:
+    """Compile a JSON schema into a validator function.
+
+    The schema is walked once; the returned `validate(value, loc)` only runs
+    the checks the schema declares and returns a list of
+    {"loc", "msg", "type"} issues (empty when valid). Supports type, enum,
+    const, properties/required/additionalProperties, items, min/max
+    (exclusive) bounds, lengths, pattern, allOf/anyOf/oneOf and local
+    `#/...` $refs. Unknown keywords are ignored.
+    """
+    return _compile(schema, schema, {})
+
+def _compile(schema: Any, root: dict, refs: dict[str, Validator]) -> Validator:
+    if schema is True or schema == {}:
+        return lambda value, loc: []
+    if schema is False:
+        return lambda value, loc: [_issue(loc, "No value is allowed here", "false_schema")]
+
+    checks: list[Validator] = []
+
+    if "$ref" in schema:
+        ref = schema["$ref"]
+        if ref not in refs:
+            if not ref.startswith("#"):
+                raise ValueError(f"Only local $refs are supported: {ref}")
+            target: Any = root
+            for part in filter(None, ref[1:].split("/")):
+                target = target[part.replace("~1", "/").replace("~0", "~")]
+            refs[ref] = lambda value, loc: compiled(value, loc)  # Allows recursive refs
+            compiled = _compile(target, root, refs)
+            refs[ref] = compiled
+        resolve = refs[ref]
+        checks.append(lambda value, loc: resolve(value, loc))
+
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        type_checks = [_TYPE_CHECKS[t] for t in types if t in _TYPE_CHECKS]
+        expected = " or ".join(types)
+
+        def check_type(value, loc):
+            if any(check(value) for check in type_checks):
+                return []
+            return [_issue(loc, f"Expected {expected}", "type_error")]
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda value, loc: [] if value in allowed else [_issue(loc, f"Must be one of {allowed}", "enum")])
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda value, loc: [] if value == const else [_issue(loc, f"Must equal {const!r}", "const")])
+
+    for keyword, failed, msg in (
+        ("minimum", lambda v, b: v < b, "at least"),
+        ("maximum", lambda v, b: v > b, "at most"),
+        ("exclusiveMinimum", lambda v, b: v <= b, "greater than"),
+        ("exclusiveMaximum", lambda v, b: v >= b, "less than"),
+    ):
+        if keyword in schema:
+            checks.append(_bound_check(schema[keyword], failed, f"Must be {msg} {schema[keyword]}", keyword, _TYPE_CHECKS["number"]))
+    for keyword, failed, msg, applies in (
+        ("minLength", lambda v, b: len(v) < b, "at least {} characters", _TYPE_CHECKS["string"]),
+        ("maxLength", lambda v, b: len(v) > b, "at most {} characters", _TYPE_CHECKS["string"]),
+        ("minItems", lambda v, b: len(v) < b, "at least {} items", _TYPE_CHECKS["array"]),
+        ("maxItems", lambda v, b: len(v) > b, "at most {} items", _TYPE_CHECKS["array"]),
+    ):
+        if keyword in schema:
+            checks.append(_bound_check(schema[keyword], failed, "Must have " + msg.format(schema[keyword]), keyword, applies))
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+        checks.append(lambda value, loc: [] if not isinstance(value, str) or pattern.search(value)
+                      else [_issue(loc, f"Must match {pattern.pattern!r}", "pattern")])
+
+    if any(k in schema for k in ("properties", "required", "additionalProperties")):
+        properties = {name: _compile(sub, root, refs) for name, sub in schema.get("properties", {}).items()}
+        required = list(schema.get("required", []))
+        additional = schema.get("additionalProperties", True)
+        extra = None if additional is True else _compile(additional, root, refs) if additional is not False else False
+
+        def check_object(value, loc):
+            if not isinstance(value, dict):
+                return []
+            issues = [_issue(loc + [name], "Field required", "missing") for name in required if name not in value]
+            for name, item in value.items():
+                validate = properties.get(name)
+                if validate is not None:
+                    issues.extend(validate(item, loc + [name]))
+                elif extra is False:
+                    issues.append(_issue(loc + [name], "Extra fields not permitted", "extra_forbidden"))
+                elif extra is not None:
+                    issues.extend(extra(item, loc + [name]))
+            return issues
+        checks.append(check_object)
+
+    if "items" in schema and isinstance(schema["items"], dict):
+        validate_item = _compile(schema["items"], root, refs)
+
+        def check_items(value, loc):
+            if not isinstance(value, list):
+                return []
+            issues = []
+            for i, item in enumerate(value):
+                issues.extend(validate_item(item, loc + [i]))
+            return issues
+        checks.append(check_items)
+
+    if "allOf" in schema:
+        subs = [_compile(s, root, refs) for s in schema["allOf"]]
+        checks.append(lambda value, loc: [issue for sub in subs for issue in sub(value, loc)])
+    for keyword in ("anyOf", "oneOf"):
+        if keyword in schema:
+            checks.append(_combinator_check(keyword, [_compile(s, root, refs) for s in schema[keyword]]))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, loc):
+        issues = []
+        for check in checks:
+            issues.extend(check(value, loc))
+        return issues
+    return validate
+
+def _bound_check(bound: Any, failed: Callable[[Any, Any], bool], msg: str, keyword: str, applies: Callable[[Any], bool]) -> Validator:
+    return lambda value, loc: [_issue(loc, msg, keyword)] if applies(value) and failed(value, bound) else []
+
+def _combinator_check(keyword: str, subs: list[Validator]) -> Validator:
+    def check(value, loc):
+        matches = sum(1 for sub in subs if not sub(value, loc))
+        if matches == 0 or (keyword == "oneOf" and matches > 1):
+            return [_issue(loc, f"Must match {'exactly one' if keyword == 'oneOf' else 'at least one'} of the allowed schemas", keyword)]
+        return []
+    return check
+
+@dataclass
+class RegisteredTool:
+    """A tool's contract, implementation and execution policy."""
+    tool: Tool
+    fn: Callable[..., Any]
+    validate_input: Validator
+    validate_output: Optional[Validator] = None
+    timeout: Optional[float] = None
+    pure: bool = False
+    semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def name(self) -> str:
+        return self.tool.name
+
+class ToolRegistry:
+    """Tools by name, with their schemas compiled once at registration."""
+
+    def __init__(self):
+        self.tools: Dict[str, RegisteredTool] = {}
+
+    def register(
+        self,
+        tool: Tool,
+        fn: Callable[..., Any],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        pure: bool = False,
+    ) -> RegisteredTool:
+        """Register a tool implementation.
+
+        Args:
+            tool: Tool contract (name, description, input/output schemas)
+            fn: Sync or async callable taking the tool's arguments as keywords
+            max_concurrency: Max calls of this tool running at once (None = unbounded)
+            timeout: Seconds a call may run before it fails (None = executor default)
+            pure: Output depends only on the arguments, so results may be cached
+        """
+        registered = RegisteredTool(
+            tool=tool,
+            fn=fn,
+            validate_input=compile_schema(tool.input_schema),
+            validate_output=compile_schema(tool.output_schema) if tool.output_schema else None,
+            timeout=timeout,
+            pure=pure,
+            semaphore=asyncio.Semaphore(max_concurrency) if max_concurrency else None,
+        )
+        self.tools[tool.name] = registered
+        return registered
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: dict[str, Any],
+        output_schema: Optional[dict[str, Any]] = None,
+        **options: Any,
+    ):
+        """Decorator for registering a tool.
+
+        Example:
+            @tool_registry.tool("add", "Add numbers", {"type": "object", ...}, pure=True)
+            async def add(a: int, b: int) -> int:
+                ...
+        """
+        def decorator(fn: Callable):
+            contract = Tool(name=name, description=description, input_schema=input_schema, output_schema=output_schema or {})
+            self.register(contract, fn, **options)
+            return fn
+        return decorator
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self.tools.get(name)
+
+    def list_tools(self) -> list[Tool]:
+        """Return the registered Tool contracts (e.g., for a tool panel)."""
+        return [registered.tool for registered in self.tools.values()]
+
+@dataclass
+class ToolCall:
+    """A requested tool invocation."""
+    name: str
+    arguments: dict[str, Any] = field(default_factory=dict)
+    call_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+@dataclass
+class ToolResult:
+    """Outcome of a tool call; `error`/`code` are set when it failed."""
+    call_id: str
+    tool: str
+    output: Any = None
+    error: Optional[str] = None
+    code: Optional[str] = None
+    issues: list[dict[str, Any]] = field(default_factory=list)
+    cached: bool = False
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def event_data(self) -> dict[str, Any]:
+        """AgentEvent data for the tool_result event."""
+        data: dict[str, Any] = {"tool": self.tool, "call_id": self.call_id}
+        if self.ok:
+            data["output"] = self.output
+            if self.cached:
+                data["cached"] = True
+        else:
+            data["error"] = self.error
+            data["code"] = self.code
+            if self.issues:
+                data["issues"] = self.issues
+        return data
+
+class ToolResultCache:
+    """LRU cache of pure tools' outputs, keyed by tool name and canonical arguments."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, self._entries[key]
+        self.stats["misses"] += 1
+        return False, None
+
+    def put(self, key: str, output: Any) -> None:
+        self._entries[key] = output
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ToolExecutor:
+    """Runs tool calls from a registry, concurrently where they are independent.
+
+    Every call is validated against the tool's compiled input schema, waits
+    for the tool's concurrency slot, and runs under its timeout (capped by the
+    enclosing deadline). Sync tools run on the agent thread pool. Failures
+    become error results rather than exceptions, so one bad call doesn't
+    sink a batch.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[ToolRegistry] = None,
+        cache: Optional[ToolResultCache] = None,
+        default_timeout: Optional[float] = 30.0,
+        thread_pool: Optional[Any] = None,
+        result_threshold: Optional[int] = DEFAULT_THRESHOLD,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        """Initialize tool executor.
+
+        Args:
+            registry: Tools to run (defaults to the global tool_registry)
+            cache: Optional result cache used for tools registered as pure
+            default_timeout: Seconds a call may run when its tool has no timeout
+            thread_pool: AgentThreadPool for sync tools (defaults to agent_thread_pool)
+            result_threshold: Outputs larger than this many characters are emitted
+                as tool_result_chunk events plus a summary (None = never)
+            chunk_size: Characters per tool_result_chunk
+        """
+        self.registry = registry if registry is not None else tool_registry
+        self.cache = cache
+        self.default_timeout = default_timeout
+        self.thread_pool = thread_pool
+        self.result_threshold = result_threshold
+        self.chunk_size = chunk_size
+
+    async def execute(
+        self,
+        call: ToolCall,
+        on_event: Optional[Emit] = None,
+        run_id: Optional[str] = None,
+        max_chunks: Optional[int] = None,
+    ) -> ToolResult:
+        """Run one tool call, emitting tool_call and tool_result AgentEvents.
+
+        Args:
+            call: Tool name, arguments and call ID
+            on_event: Async callback for the AgentEvent dicts
+            run_id: Run the events belong to
+            max_chunks: Emit only the first N chunks of a large output (defaults
+                to the client's requested max_tool_chunks; None = all); the
+                returned result always has the full output
+        """
+        if on_event is not None:
+            await on_event({
+                "run_id": run_id,
+                "event": "tool_call",
+                "data": {"tool": call.name, "call_id": call.call_id, "input": call.arguments}
+            })
+
+        result = await self._run(call)
+
+        if on_event is not None:
+            data = result.event_data()
+            if self.result_threshold is None:
+                await on_event({"run_id": run_id, "event": "tool_result", "data": data})
+            else:
+                for event_type, part in chunk_tool_result(data, self.result_threshold, self.chunk_size, max_chunks):
+                    await on_event({"run_id": run_id, "event": event_type, "data": part})
+        return result
+
+    async def execute_many(
+        self,
+        calls: Iterable[ToolCall],
+        on_event: Optional[Emit] = None,
+        run_id: Optional[str] = None,
+        max_chunks: Optional[int] = None,
+    ) -> list[ToolResult]:
+        """Run independent tool calls concurrently.
+
+        Results are returned in call order; tool_result events are emitted as
+        each call finishes.
+        """
+        return list(await asyncio.gather(*(self.execute(call, on_event, run_id, max_chunks) for call in calls)))
+
+    async def _run(self, call: ToolCall) -> ToolResult:
+        started = time.perf_counter()
+        result = ToolResult(call_id=call.call_id, tool=call.name)
+        registered = self.registry.get(call.name)
+        if registered is None:
+            result.error, result.code = f"Unknown tool: {call.name}", "unknown_tool"
+            return result
+
+        issues = registered.validate_input(call.arguments, [])
+        if issues:
+            result.error, result.code, result.issues = f"Invalid input for tool {call.name}", "invalid_tool_input", issues
+            return result
+
+        key = None
+        if registered.pure and self.cache is not None:
+            key = flight_key(call.name, call.arguments)
+            hit, output = self.cache.get(key)
+            if hit:
+                result.output, result.cached = output, True
+                return result
+
+        try:
+            output = await self._invoke(registered, call)
+        except DeadlineExceeded as e:
+            result.error, result.code = str(e), "deadline_exceeded"
+        except Exception as e:
+            logger.warning(f"Tool {call.name} failed: {e}")
+            result.error, result.code = str(e), "tool_error"
+        else:
+            issues = registered.validate_output(output, []) if registered.validate_output is not None else []
+            if issues:
+                result.error, result.code, result.issues = f"Invalid output from tool {call.name}", "invalid_tool_output", issues
+            else:
+                result.output = output
+                if key is not None:
+                    self.cache.put(key, output)
+        result.duration = time.perf_counter() - started
+        return result
+
+    async def _invoke(self, registered: RegisteredTool, call: ToolCall) -> Any:
+        timeout = registered.timeout if registered.timeout is not None else self.default_timeout
+        deadline = Deadline.earliest(Deadline(timeout) if timeout is not None else None, current_deadline())
+        # Time spent waiting for a concurrency slot counts against the timeout
+        async with enforce_deadline(deadline, tool=call.name, call_id=call.call_id):
+            if registered.semaphore is None:
+                return await self._call(registered.fn, call.arguments)
+            async with registered.semaphore:
+                return await self._call(registered.fn, call.arguments)
+
+    async def _call(self, fn: Callable[..., Any], arguments: dict[str, Any]) -> Any:
+        if inspect.iscoroutinefunction(fn):
+            return await fn(**arguments)
+        if self.thread_pool is None:
+            from .agent_adapters import agent_thread_pool
+            self.thread_pool = agent_thread_pool
+        return await self.thread_pool.run(functools.partial(fn, **arguments))
+
+# Global registry
+tool_registry = ToolRegistry()
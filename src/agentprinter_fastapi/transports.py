@@ -1,8 +1,9 @@
 """SSE and HTTP fallback transport for clients that can't use WebSocket."""
-from typing import AsyncGenerator, Callable
+from typing import AsyncGenerator, Callable, Optional
 from fastapi import APIRouter
 import json
 import logging
+from .blobs import externalize
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +33,20 @@ class SSETransport:
 class HTTPPollingTransport:
     """HTTP polling fallback for clients without WebSocket or SSE support."""
     
-    def __init__(self):
+    def __init__(self, blob_threshold: Optional[int] = None):
+        """Initialize polling transport.
+        
+        Args:
+            blob_threshold: Payloads larger than this many bytes are queued as
+                blob references (None = queue messages as they are)
+        """
         self.message_queues: dict[str, list[dict]] = {}
+        self.blob_threshold = blob_threshold
     
     def enqueue_message(self, session_id: str, message: dict):
         """Queue a message for polling retrieval."""
+        if self.blob_threshold is not None:
+            message = externalize(message, self.blob_threshold)
         if session_id not in self.message_queues:
             self.message_queues[session_id] = []
         self.message_queues[session_id].append(message)
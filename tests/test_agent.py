@@ -68,3 +68,79 @@ async def test_agent_runner_handles_error():
     assert len(sent_messages) == 2
     assert sent_messages[1]["payload"]["event"] == "error"
     assert "Something went wrong" in str(sent_messages[1]["payload"]["data"])
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_agent_runner_coalesces_tokens_in_order():
+    """Test that consecutive tokens share frames and flush before non-token events."""
+    runner = AgentRunner(coalesce_tokens=True, flush_interval=1.0)
+    
+    sent_messages = []
+    class MockWebSocket:
+        async def send_json(self, data):
+            sent_messages.append(data)
+    
+    async def chatty_agent():
+        yield "start", "Agent starting"
+        for token in ["Hel", "lo", " wor", "ld"]:
+            yield "token", token
+        yield "tool_call", {"tool": "search"}
+        yield "token", "!"
+        yield "finish", "Agent done"
+    
+    await runner.run_stream("run-coalesce", "trace", MockWebSocket(), chatty_agent())
+    
+    events = [(m["payload"]["event"], m["payload"]["data"]) for m in sent_messages]
+    assert events == [
+        ("start", "Agent starting"),
+        ("token", "Hello world"),
+        ("tool_call", {"tool": "search"}),
+        ("token", "!"),
+        ("finish", "Agent done"),
+    ]
+    stats = runner.get_token_stats()
+    assert stats["tokens"] == 5
+    assert stats["frames"] == 2
+    assert stats["tokens_per_frame"] == 2.5
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_agent_runner_flushes_tokens_on_size_and_time():
+    """Test that the token buffer flushes when full and when tokens wait too long."""
+    runner = AgentRunner(coalesce_tokens=True, max_buffer_chars=4, flush_interval=0.02)
+    
+    sent_messages = []
+    class MockWebSocket:
+        async def send_json(self, data):
+            sent_messages.append(data)
+    
+    async def slow_agent():
+        yield "token", "ab"
+        yield "token", "cd"  # reaches max_buffer_chars
+        yield "token", "e"
+        await asyncio.sleep(0.1)  # flush interval passes while waiting
+        yield "token", "f"
+    
+    await runner.run_stream("run-flush", "trace", MockWebSocket(), slow_agent())
+    
+    assert [m["payload"]["data"] for m in sent_messages] == ["abcd", "e", "f"]
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_agent_runner_coalescing_delivers_tokens_before_error():
+    """Test that buffered tokens are sent before the error event."""
+    runner = AgentRunner(coalesce_tokens=True, flush_interval=1.0)
+    
+    sent_messages = []
+    class MockWebSocket:
+        async def send_json(self, data):
+            sent_messages.append(data)
+    
+    async def failing_agent():
+        yield "token", "partial"
+        raise ValueError("boom")
+    
+    await runner.run_stream("run-err", "trace", MockWebSocket(), failing_agent())
+    
+    assert [m["payload"]["event"] for m in sent_messages] == ["token", "error"]
+    assert sent_messages[0]["payload"]["data"] == "partial"
@@ -276,3 +276,339 @@ def test_adapters_dont_import_optional_dependencies():
     # Adapters should be created successfully
     assert adapter_lc is not None
     assert adapter_lg is not None
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_streams_events_while_agent_runs():
+    """Test that callback events reach on_event before the agent finishes."""
+    import threading
+    
+    seen_tool_call = threading.Event()
+    
+    async def on_event(event):
+        if event["event"] == "tool_call":
+            seen_tool_call.set()
+    
+    class BlockingAgent:
+        def invoke(self, input_data, config=None):
+            cb = config["callbacks"][0]
+            cb.on_tool_start({"name": "search"}, "query")
+            # Only continues once the event has been delivered live
+            delivered = seen_tool_call.wait(timeout=2)
+            cb.on_tool_end("result")
+            return {"output": "delivered live" if delivered else "buffered"}
+    
+    adapter = LangChainAgentAdapter(on_event=on_event)
+    result = await adapter.run_agent(BlockingAgent(), {"input": "test"})
+    
+    assert result["output"] == "delivered live"
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_bounds_buffered_events():
+    """Test that a slow consumer pauses the agent thread instead of buffering without limit."""
+    produced = []
+    lag = []
+    
+    async def slow_on_event(event):
+        if event["event"] == "tool_result":
+            # How far the agent thread has run ahead of this consumer
+            lag.append(len(produced) - len(lag))
+            await asyncio.sleep(0.01)
+    
+    class ChattyAgent:
+        def invoke(self, input_data, config=None):
+            cb = config["callbacks"][0]
+            for i in range(20):
+                cb.on_tool_end(str(i))
+                produced.append(i)
+            return {"output": "done"}
+    
+    adapter = LangChainAgentAdapter(on_event=slow_on_event, max_pending_events=2)
+    await adapter.run_agent(ChattyAgent(), {"input": "test"})
+    
+    assert len(lag) == 20
+    # Producer never gets more than the buffer (plus the event in flight) ahead
+    assert max(lag) <= 3
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_does_not_duplicate_finish():
+    """Test that a streamed finish event is not followed by a synthesized one."""
+    events = []
+    
+    async def on_event(event):
+        events.append(event)
+    
+    adapter = LangChainAgentAdapter(on_event=on_event)
+    
+    class FinishingAgent:
+        def invoke(self, input_data, config=None):
+            config["callbacks"][0].on_agent_finish(type('', (), {"return_values": {"output": "4"}})())
+            return {"output": "4"}
+    
+    await adapter.run_agent(FinishingAgent(), {"input": "2+2"})
+    
+    assert [e["event"] for e in events] == ["start", "finish"]
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_prefers_astream_events():
+    """Test that executors with astream_events are streamed natively, without thread hops."""
+    import threading
+    
+    events = []
+    threads = set()
+    
+    async def on_event(event):
+        events.append(event)
+    
+    class AsyncAgent:
+        def invoke(self, input_data, config=None):
+            raise AssertionError("sync path should not be used")
+        
+        async def astream_events(self, input_data, version=None):
+            threads.add(threading.get_ident())
+            yield {"event": "on_chain_start", "name": "Agent", "data": {}, "parent_ids": []}
+            yield {"event": "on_tool_start", "name": "calculator", "data": {"input": "2+2"}, "parent_ids": ["root"]}
+            yield {"event": "on_tool_end", "name": "calculator", "data": {"output": "4"}, "parent_ids": ["root"]}
+            yield {"event": "on_chat_model_stream", "data": {"chunk": type('', (), {"content": "The answer"})()}, "parent_ids": ["root"]}
+            yield {"event": "on_chain_end", "name": "Agent", "data": {"output": {"output": "The answer is 4"}}, "parent_ids": []}
+    
+    adapter = LangChainAgentAdapter(on_event=on_event)
+    result = await adapter.run_agent(AsyncAgent(), {"input": "2+2"})
+    
+    assert threads == {threading.get_ident()}
+    assert result == {"output": "The answer is 4"}
+    assert [e["event"] for e in events] == ["start", "tool_call", "tool_result", "token", "finish"]
+    assert events[-1]["data"]["output"] == "The answer is 4"
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_uses_ainvoke_with_callbacks():
+    """Test that ainvoke-only executors run on the loop and still stream callback events."""
+    events = []
+    
+    async def on_event(event):
+        events.append(event)
+    
+    class AinvokeAgent:
+        async def ainvoke(self, input_data, config=None):
+            cb = config["callbacks"][0]
+            cb.on_tool_start({"name": "search"}, "q")
+            await asyncio.sleep(0)
+            cb.on_tool_end("found")
+            return {"output": "ok"}
+    
+    adapter = LangChainAgentAdapter(on_event=on_event)
+    result = await adapter.run_agent(AinvokeAgent(), {"input": "q"})
+    
+    assert result == {"output": "ok"}
+    assert [e["event"] for e in events] == ["start", "tool_call", "tool_result", "finish"]
+
+
+@pytest.mark.asyncio
+async def test_sync_executors_run_on_bounded_pool():
+    """Test that sync-only executors share a bounded, instrumented thread pool."""
+    import time
+    from agentprinter_fastapi.agent_adapters import AgentThreadPool
+    
+    pool = AgentThreadPool(max_workers=2)
+    
+    async def on_event(event):
+        pass
+    
+    class SyncAgent:
+        def invoke(self, input_data, config=None):
+            time.sleep(0.05)
+            return {"output": input_data["input"]}
+    
+    try:
+        adapters = [LangChainAgentAdapter(on_event=on_event, thread_pool=pool) for _ in range(5)]
+        results = await asyncio.gather(*(
+            adapter.run_agent(SyncAgent(), {"input": i}) for i, adapter in enumerate(adapters)
+        ))
+    finally:
+        pool.shutdown()
+    
+    assert [r["output"] for r in results] == [0, 1, 2, 3, 4]
+    stats = pool.get_stats()
+    assert stats["submitted"] == 5
+    assert stats["completed"] == 5
+    assert stats["peak_active"] == 2
+
+
+@pytest.mark.asyncio
+async def test_thread_pool_counts_jobs_cancelled_before_starting():
+    """Test that jobs abandoned while queued are neither run nor left in the queued stat."""
+    import threading
+    from agentprinter_fastapi.agent_adapters import AgentThreadPool
+    
+    pool = AgentThreadPool(max_workers=1)
+    release = threading.Event()
+    ran = []
+    
+    try:
+        blocker = asyncio.create_task(pool.run(release.wait))
+        queued = asyncio.create_task(pool.run(ran.append, "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.get_stats()["queued"] == 1
+        
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        release.set()
+        await blocker
+        await asyncio.sleep(0.05)
+    finally:
+        pool.shutdown(wait=True)
+    
+    stats = pool.get_stats()
+    assert ran == []
+    assert stats["cancelled"] == 1 and stats["completed"] == 1
+    assert stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_langgraph_adapter_coalesces_chunks_and_filters_nodes():
+    """Test that stream chunks merge per node and excluded nodes stay off the wire."""
+    events = []
+    
+    async def on_event(event):
+        events.append(event)
+    
+    class ChattyGraph:
+        async def astream_events(self, initial_state, version=None):
+            yield {"event": "on_chain_start", "name": "writer", "data": {}}
+            for chunk in ["Hel", "lo ", "world"]:
+                yield {"event": "on_chain_stream", "name": "writer", "data": {"chunk": chunk}}
+            yield {"event": "on_chain_stream", "name": "_router", "data": {"chunk": "internal"}}
+            yield {"event": "on_chat_model_stream", "name": "llm", "data": {"chunk": "ignored"}}
+            yield {"event": "on_chain_stream", "name": "critic", "data": {"chunk": "ok"}}
+            yield {"event": "on_chain_stream", "name": "critic", "data": {"chunk": {"score": 1}}}
+            yield {"event": "on_chain_end", "name": "writer", "data": {"output": {"text": "Hello world"}}}
+    
+    adapter = LangGraphAgentAdapter(on_event=on_event, exclude_nodes=["_router"])
+    await adapter.run_graph(ChattyGraph(), {})
+    
+    tokens = [e["data"] for e in events if e["event"] == "token"]
+    assert tokens == ["Hello world", "ok", {"score": 1}]
+    assert [e["event"] for e in events] == ["start", "tool_call", "token", "token", "token", "tool_result", "finish"]
+    assert "_router" not in adapter.node_outputs
+
+
+@pytest.mark.asyncio
+async def test_langgraph_adapter_requests_filtered_v2_stream():
+    """Test that source-side filters are passed when astream_events supports them."""
+    seen_kwargs = {}
+    events = []
+    
+    async def on_event(event):
+        events.append(event)
+    
+    class FilteringGraph:
+        async def astream_events(self, initial_state, version=None, include_types=None, include_names=None, exclude_names=None):
+            seen_kwargs.update(version=version, include_types=include_types, include_names=include_names)
+            yield {"event": "on_chain_end", "name": "answer", "data": {"output": {"done": True}}}
+    
+    adapter = LangGraphAgentAdapter(on_event=on_event, include_nodes=["answer"], version="v2")
+    result = await adapter.run_graph(FilteringGraph(), {})
+    
+    assert result == {"done": True}
+    # Include filters are ORed upstream, so chain runs must not be requested too
+    assert seen_kwargs == {"version": "v2", "include_types": None, "include_names": ["answer"]}
+    
+    seen_kwargs.clear()
+    await LangGraphAgentAdapter(on_event=on_event, version="v2").run_graph(FilteringGraph(), {})
+    assert seen_kwargs == {"version": "v2", "include_types": ["chain"], "include_names": None}
+
+
+@pytest.mark.asyncio
+async def test_websocket_bridge_batches_ops_per_event():
+    """Ops from one event go out as one multi-op ui.patch."""
+    sent_messages = []
+    
+    async def mock_send(msg):
+        sent_messages.append(msg)
+    
+    bridge = AgentWebSocketBridge(websocket_send=mock_send)
+    await bridge.on_agent_event({"type": "agent.start"})
+    await bridge.on_agent_event({"type": "agent.result", "output": "42"})
+    
+    assert len(sent_messages) == 2
+    start_ops = sent_messages[0]["payload"]["patches"]
+    assert [op["target"] for op in start_ops] == ["agent_output", "agent_status"]
+    result_ops = sent_messages[1]["payload"]["patches"]
+    assert result_ops[0] == {"target": "agent_output", "text": "42", "operation": "append"}
+    assert result_ops[1]["text"] == "✅ Agent completed"  # Terminal status isn't throttled
+    assert bridge.get_accumulated_output() == "\n42"
+
+
+@pytest.mark.asyncio
+async def test_websocket_bridge_throttles_status_last_value_wins():
+    """Rapid status updates collapse to the latest one."""
+    sent_messages = []
+    
+    async def mock_send(msg):
+        sent_messages.append(msg)
+    
+    bridge = AgentWebSocketBridge(websocket_send=mock_send, status_interval=0.05)
+    await bridge.on_agent_event({"type": "agent.tool_start", "tool": "a"})
+    await bridge.on_agent_event({"type": "agent.tool_start", "tool": "b"})
+    await bridge.on_agent_event({"type": "agent.tool_start", "tool": "c"})
+    
+    assert [m["payload"]["text"] for m in sent_messages] == ["🔧 Using tool: a"]
+    await asyncio.sleep(0.1)
+    assert [m["payload"]["text"] for m in sent_messages] == ["🔧 Using tool: a", "🔧 Using tool: c"]
+
+
+@pytest.mark.asyncio
+async def test_websocket_bridge_merges_stream_appends_in_window():
+    """Node stream output within the flush window is sent as one append."""
+    sent_messages = []
+    
+    async def mock_send(msg):
+        sent_messages.append(msg)
+    
+    bridge = AgentWebSocketBridge(websocket_send=mock_send, append_window=0.05)
+    for part in ["Hel", "lo", " world"]:
+        await bridge.on_agent_event({"type": "graph.node_stream", "output": part})
+    assert sent_messages == []
+    
+    await asyncio.sleep(0.1)
+    assert len(sent_messages) == 1
+    assert sent_messages[0]["payload"] == {"target": "agent_output", "text": "Hello world", "operation": "append"}
+    
+    # flush() sends pending output immediately
+    await bridge.on_agent_event({"type": "graph.node_stream", "output": "!"})
+    await bridge.flush()
+    assert sent_messages[-1]["payload"]["text"] == "!"
+    assert bridge.get_accumulated_output() == "Hello world!"
+
+
+@pytest.mark.asyncio
+async def test_websocket_bridge_tracks_and_cancels_timed_flush():
+    """The timer's flush task is kept and nothing outlives close()."""
+    sent_messages = []
+    gate = asyncio.Event()
+    
+    async def slow_send(msg):
+        await gate.wait()
+        sent_messages.append(msg)
+    
+    bridge = AgentWebSocketBridge(websocket_send=slow_send, append_window=0.01)
+    await bridge.on_agent_event({"type": "graph.node_stream", "output": "a"})
+    await asyncio.sleep(0.05)
+    assert bridge._flush_task is not None and not bridge._flush_task.done()
+    
+    await bridge.on_agent_event({"type": "graph.node_stream", "output": "b"})
+    gate.set()
+    await bridge.flush()  # Waits for the timed send, then sends the rest in order
+    assert [m["payload"]["text"] for m in sent_messages] == ["a", "b"]
+    assert bridge._timer is None and bridge._flush_task is None
+    
+    await bridge.on_agent_event({"type": "graph.node_stream", "output": "c"})
+    assert bridge._timer is not None
+    bridge.close()
+    assert bridge._timer is None
+    await asyncio.sleep(0.05)
+    assert len(sent_messages) == 2
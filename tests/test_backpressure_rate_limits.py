@@ -165,3 +165,79 @@ async def test_rapid_patches_are_coalesced(app):
     patch_messages = [m for m in received_messages if m.get("type") == "ui.patch"]
     # With coalescing, we should get 1 message instead of 3
     assert len(patch_messages) <= 1, f"Expected coalesced patches (1 message), got {len(patch_messages)} separate messages"
+
+
+@pytest.mark.asyncio
+async def test_watermark_channel_pauses_producer_until_low_water():
+    """Test that the producer blocks at high water and resumes at low water."""
+    import asyncio
+    from agentprinter_fastapi.backpressure import WatermarkChannel
+    
+    release = asyncio.Event()
+    delivered = []
+    
+    async def slow_send(item):
+        await release.wait()
+        delivered.append(item)
+    
+    async with WatermarkChannel(slow_send, high_water=4, low_water=1) as channel:
+        for i in range(3):
+            await channel.put(i)
+        assert not channel.paused
+        await channel.put(3)
+        assert channel.paused
+        
+        blocked = asyncio.create_task(channel.put(4))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        
+        release.set()
+        await blocked
+    
+    assert delivered == [0, 1, 2, 3, 4]
+    assert channel.stats["pauses"] == 1
+    assert channel.stats["max_buffered"] == 4
+
+
+@pytest.mark.asyncio
+async def test_watermark_channel_surfaces_consumer_errors():
+    """Test that a failed send stops the producer instead of blocking it."""
+    import asyncio
+    from agentprinter_fastapi.backpressure import WatermarkChannel
+    
+    async def broken_send(item):
+        raise ConnectionError("socket closed")
+    
+    with pytest.raises(ConnectionError):
+        async with WatermarkChannel(broken_send, high_water=2) as channel:
+            for i in range(10):
+                await channel.put(i)
+                await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_chain_stream_reads_ahead_only_to_high_water():
+    """Test that a slow client pauses the LLM stream instead of buffering it all."""
+    import asyncio
+    from agentprinter_fastapi.adapters import LangChainAdapter
+    
+    produced = []
+    delivered = []
+    
+    class FastChain:
+        async def astream(self, input_data):
+            for i in range(50):
+                produced.append(i)
+                yield "abcd"
+    
+    async def slow_client(text):
+        await asyncio.sleep(0.001)
+        delivered.append(text)
+        # Characters read from the stream but not yet delivered
+        assert (len(produced) - len(delivered)) * 4 <= 16 + 4
+    
+    adapter = LangChainAdapter(slow_client, outbound_high_water=16, outbound_low_water=4)
+    result = await adapter.stream_chain(FastChain(), {})
+    
+    assert result == "abcd" * 50
+    assert len(delivered) == 50
@@ -0,0 +1,227 @@
+"""Tests for the blob store and oversized payload references."""
+import json
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi import set_auth_hook
+from agentprinter_fastapi.blobs import BlobStore, blob_store, externalize, externalize_async
+from agentprinter_fastapi.envelope import make_envelope
+from agentprinter_fastapi.manager import ConnectionManager
+from agentprinter_fastapi.router import router
+from agentprinter_fastapi.transports import http_polling
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_content_addressed_and_deduplicated():
+    store = BlobStore()
+    first = store.put(b"hello world")
+    second = store.put(b"hello world")
+
+    assert first == second
+    assert first["url"] == f"/blobs/{first['id']}?sig={store.signature(first['id'])}"
+    assert store.read(first["id"]) == b"hello world"
+    assert store.read(first["id"], 6, 11) == b"world"
+    assert store.get_stats()["dedup_hits"] == 1
+    assert store.read("0" * 64) is None
+
+
+def test_evicted_blobs_are_served_from_disk(tmp_path):
+    store = BlobStore(max_memory_bytes=10, directory=tmp_path)
+    a = store.put(b"aaaaaaaa")
+    b = store.put(b"bbbbbbbb")  # Evicts a from memory
+
+    assert store.get_stats()["memory_blobs"] == 1
+    assert store.read(a["id"], 2, 5) == b"aaa"
+    assert store.stats["disk_hits"] == 1
+    assert store.size(b["id"]) == 8
+    assert "../secret" not in store
+
+
+def test_externalize_keeps_routing_fields():
+    store = BlobStore()
+    message = make_envelope("agent.event", {"run_id": "r1", "event": "finish", "data": {"text": "x" * 5000}}, "t")
+
+    small = externalize(message, threshold=100_000, store=store)
+    assert small is message
+
+    ref = externalize(message, threshold=1000, store=store)
+    payload = ref["payload"]
+    assert payload["run_id"] == "r1" and payload["event"] == "finish"
+    assert "data" not in payload
+    assert json.loads(store.read(payload["$blob"]["id"])) == message["payload"]
+    assert message["payload"]["data"]["text"]  # Original untouched
+
+
+@pytest.mark.asyncio
+async def test_manager_queues_references_for_replay():
+    store = BlobStore()
+    manager = ConnectionManager(blob_threshold=1000, blob_store=store)
+    ws = MockWebSocket()
+    manager.active_connections.append(ws)
+    session = "blob-session"
+    http_polling.message_queues.pop(session, None)
+
+    page = {"type": "ui.render", "header": {"session_id": session}, "payload": {"root": {"text": "y" * 4000}}}
+    await manager.broadcast(page)
+
+    queued = http_polling.dequeue_messages(session)
+    assert "$blob" in queued[0]["payload"]
+    assert ws.sent[0]["payload"] == queued[0]["payload"]
+    assert len(json.dumps(queued[0])) < 1000
+    http_polling.message_queues.pop(session, None)
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_externalizes_large_events():
+    store = BlobStore()
+    runner = AgentRunner(blob_threshold=2000, blob_store=store)
+    ws = MockWebSocket()
+
+    async def gen():
+        yield "token", "hi"
+        yield "finish", {"final_state": {"report": "z" * 10_000}}
+
+    await runner.run_stream("run-blob", "t", ws, gen())
+    assert ws.sent[0]["payload"]["data"] == "hi"
+    final = ws.sent[-1]["payload"]
+    assert final["event"] == "finish" and "$blob" in final
+    assert json.loads(store.read(final["$blob"]["id"]))["data"]["final_state"]["report"] == "z" * 10_000
+
+
+def test_blob_endpoint_supports_ranges():
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    ref = blob_store.put(b"0123456789", content_type="text/plain")
+    url = ref["url"]
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.content == b"0123456789"
+    assert full.headers["accept-ranges"] == "bytes"
+
+    part = client.get(url, headers={"Range": "bytes=2-5"})
+    assert part.status_code == 206
+    assert part.content == b"2345"
+    assert part.headers["content-range"] == "bytes 2-5/10"
+
+    assert client.get(url, headers={"Range": "bytes=-3"}).content == b"789"
+    assert client.get(url, headers={"Range": "bytes=7-"}).content == b"789"
+    assert client.get(url, headers={"Range": "bytes=20-30"}).status_code == 416
+    assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+    assert client.get("/blobs/" + "f" * 64).status_code == 404
+    assert full.headers["cache-control"].startswith("private")
+
+
+def test_blob_endpoint_applies_auth_hook():
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    ref = blob_store.put(b"secret report", content_type="text/plain")
+    seen = []
+
+    def auth(scope):
+        seen.append(scope["path"])
+        return dict(scope["headers"]).get("authorization") == "Bearer ok"
+
+    set_auth_hook(auth)
+    try:
+        assert client.get(ref["url"]).status_code == 401
+        assert client.get(ref["url"], headers={"Authorization": "Bearer ok"}).content == b"secret report"
+    finally:
+        set_auth_hook(None)
+    assert seen == ["/blobs/" + ref["id"]] * 2
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    store = BlobStore(max_memory_bytes=0, directory=tmp_path, max_disk_bytes=20)
+    refs = [store.put(bytes([65 + i]) * 8, content_type=f"type/{i}") for i in range(4)]
+
+    # The oldest files go once the tier holds more than 20 bytes
+    assert [ref["id"] in store for ref in refs] == [False, False, True, True]
+    assert store.get_stats()["disk_bytes"] == 16
+    assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 2
+    assert set(store._content_types) == {refs[2]["id"], refs[3]["id"]}
+
+    store.ttl = 0
+    assert store.prune() == 2
+    assert refs[3]["id"] not in store and store._content_types == {}
+
+
+@pytest.mark.asyncio
+async def test_large_payloads_are_stored_off_the_event_loop(monkeypatch):
+    store = BlobStore()
+    threads = []
+    put = store.put
+
+    def recording_put(data, content_type="application/json", owner=None):
+        threads.append(threading.get_ident())
+        return put(data, content_type, owner)
+
+    monkeypatch.setattr(store, "put", recording_put)
+    small = make_envelope("agent.event", {"run_id": "r", "data": "x"}, "t")
+    assert await externalize_async(small, 1000, store) is small
+
+    big = await externalize_async(make_envelope("agent.event", {"run_id": "r", "data": "x" * 5000}, "t"), 1000, store)
+    assert json.loads(store.read(big["payload"]["$blob"]["id"]))["data"] == "x" * 5000
+    assert threads and threading.get_ident() not in threads
+
+    ref = await store.put_async(b"abc")
+    assert store.read(ref["id"]) == b"abc" and threading.get_ident() not in threads[1:]
+
+
+def test_blob_urls_are_signed_and_owned_blobs_checked():
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    public = blob_store.put(b"shared page")
+    private = blob_store.put(b"alice's report", owner="alice")
+
+    # Knowing the content hash isn't enough
+    assert client.get("/blobs/" + public["id"]).status_code == 404
+    assert client.get(f"/blobs/{public['id']}?sig={'0' * 64}").status_code == 404
+    assert client.get(public["url"]).content == b"shared page"
+    # Without an identity, an owned blob can't be read even with its URL
+    assert client.get(private["url"]).status_code == 404
+
+    set_auth_hook(lambda scope: dict(scope["headers"]).get("authorization", "").removeprefix("Bearer ") or False)
+    try:
+        assert client.get(private["url"], headers={"Authorization": "Bearer alice"}).content == b"alice's report"
+        assert client.get(private["url"], headers={"Authorization": "Bearer mallory"}).status_code == 404
+        assert client.get(public["url"], headers={"Authorization": "Bearer mallory"}).status_code == 200
+    finally:
+        set_auth_hook(None)
+
+
+@pytest.mark.asyncio
+async def test_owner_defaults_to_bound_identity_and_reads_run_off_the_loop(tmp_path, monkeypatch):
+    from agentprinter_fastapi.runs import bind_client
+
+    store = BlobStore(max_memory_bytes=0, directory=tmp_path)
+    bind_client("conn", identity="alice")
+    ref = await externalize_async(make_envelope("agent.event", {"data": "x" * 5000}, "t"), 1000, store)
+    bind_client(None)
+    blob_id = ref["payload"]["$blob"]["id"]
+    assert store.may_read(blob_id, store.signature(blob_id), "alice")
+    assert not store.may_read(blob_id, store.signature(blob_id), "bob")
+
+    threads = []
+    read = store.read
+
+    def recording_read(blob_id, start=0, end=None):
+        threads.append(threading.get_ident())
+        return read(blob_id, start, end)
+
+    monkeypatch.setattr(store, "read", recording_read)
+    assert json.loads(await store.read_async(blob_id))["data"] == "x" * 5000
+    assert await store.size_async(blob_id) == ref["payload"]["$blob"]["size"]
+    assert threads and threading.get_ident() not in threads
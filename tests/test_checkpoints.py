@@ -0,0 +1,272 @@
+"""Tests for resumable LangGraph runs backed by node checkpoints."""
+import asyncio
+import pytest
+from agentprinter_fastapi.agent_adapters import LangGraphAgentAdapter
+from agentprinter_fastapi.checkpoints import CheckpointStore, FileCheckpointStore
+
+
+class TwoStepGraph:
+    """Graph with nodes "plan" and "write"; "write" waits for the test's gate."""
+    
+    def __init__(self, gate=None, checkpointer=None):
+        self.gate = gate
+        self.checkpointer = checkpointer
+        self.calls = []
+    
+    async def astream_events(self, input_state, version=None, config=None):
+        self.calls.append({"input": input_state, "config": config})
+        yield {"event": "on_chain_start", "name": "plan", "data": {}}
+        yield {"event": "on_chain_end", "name": "plan", "data": {"output": {"plan": "outline"}}}
+        if self.gate is not None:
+            await self.gate.wait()
+        yield {"event": "on_chain_start", "name": "write", "data": {}}
+        yield {"event": "on_chain_end", "name": "write", "data": {"output": {"text": "essay"}}}
+
+
+def recorder():
+    events = []
+    
+    async def on_event(event):
+        events.append(event)
+    return events, on_event
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_after_restart(tmp_path):
+    """Test that a rerun of an interrupted run doesn't re-emit completed nodes."""
+    first_events, on_event = recorder()
+    adapter = LangGraphAgentAdapter(on_event, checkpoints=FileCheckpointStore(tmp_path))
+    task = asyncio.create_task(adapter.run_graph(TwoStepGraph(gate=asyncio.Event()), {"topic": "x"}, run_id="run-ckpt"))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    
+    # Simulate a worker restart: fresh store over the same directory
+    store = FileCheckpointStore(tmp_path)
+    assert store.interrupted() == ["run-ckpt"]
+    assert store.load("run-ckpt")["completed_nodes"] == ["plan"]
+    
+    events, on_event = recorder()
+    resumed = LangGraphAgentAdapter(on_event, checkpoints=store)
+    token = first_events[0]["data"]["resume_token"]
+    result = await resumed.run_graph(TwoStepGraph(), {"ignored": True}, run_id="run-ckpt", resume_token=token)
+    
+    assert result == {"text": "essay"}
+    assert [(e["event"], e["data"].get("node")) for e in events] == [
+        ("start", None),
+        ("tool_result", "plan"),  # replayed from the checkpoint
+        ("tool_call", "write"),
+        ("tool_result", "write"),
+        ("finish", None),
+    ]
+    assert events[0]["data"] == {"initial_state": {"topic": "x"}, "resumed": True}
+    assert store.load("run-ckpt")["status"] == "completed"
+    assert store.interrupted() == []
+
+
+@pytest.mark.asyncio
+async def test_checkpointed_graph_resumes_its_thread():
+    """Test that graphs with a LangGraph checkpointer resume under thread_id=run_id."""
+    store = CheckpointStore()
+    _, on_event = recorder()
+    graph = TwoStepGraph(gate=asyncio.Event(), checkpointer=object())
+    task = asyncio.create_task(LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(graph, {"q": 1}, run_id="run-native", owner="alice"))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    
+    graph.gate.set()
+    await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(graph, {"q": 1}, run_id="run-native", owner="alice")
+    
+    assert graph.calls[0] == {"input": {"q": 1}, "config": {"configurable": {"thread_id": "run-native"}}}
+    assert graph.calls[1] == {"input": None, "config": {"configurable": {"thread_id": "run-native"}}}
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_client_reattaches_to_run_in_progress():
+    """Test that asking for a live run follows it instead of starting it again."""
+    store = CheckpointStore()
+    gate = asyncio.Event()
+    graph = TwoStepGraph(gate=gate)
+    first_events, on_first = recorder()
+    task = asyncio.create_task(LangGraphAgentAdapter(on_first, checkpoints=store).run_graph(graph, {"q": 2}, run_id="run-live", owner="alice"))
+    await asyncio.sleep(0.01)
+    
+    events, on_event = recorder()
+    reattach = asyncio.create_task(LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(graph, {"q": 2}, run_id="run-live", owner="alice"))
+    await asyncio.sleep(0.01)
+    gate.set()
+    
+    results = await asyncio.gather(task, reattach)
+    assert results == [{"text": "essay"}, {"text": "essay"}]
+    assert len(graph.calls) == 1
+    assert [e["event"] for e in events] == [e["event"] for e in first_events]
+    
+    # A completed run is replayed from its checkpoint
+    replayed, on_replay = recorder()
+    assert await LangGraphAgentAdapter(on_replay, checkpoints=store).run_graph(graph, {}, run_id="run-live", owner="alice") == {"text": "essay"}
+    assert [e["event"] for e in replayed] == ["start", "tool_result", "tool_result", "finish"]
+    assert len(graph.calls) == 1
+
+
+class LoopGraph:
+    """Cyclic graph: agent -> tools -> agent, pausing at the test's gate after the first tools run."""
+    
+    def __init__(self, gate=None):
+        self.gate = gate
+    
+    async def astream_events(self, input_state, version=None, config=None):
+        for step, node in enumerate(["agent", "tools", "agent"]):
+            if step == 2 and self.gate is not None:
+                await self.gate.wait()
+            yield {"event": "on_chain_start", "name": node, "data": {}}
+            yield {"event": "on_chain_end", "name": node, "data": {"output": {"step": step}}}
+
+
+@pytest.mark.asyncio
+async def test_cyclic_graph_resume_skips_by_occurrence():
+    """Test that resuming a cyclic graph only skips node runs that were checkpointed."""
+    store = CheckpointStore()
+    first_events, on_event = recorder()
+    task = asyncio.create_task(LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(LoopGraph(asyncio.Event()), {}, run_id="run-loop"))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert store.load("run-loop")["completed_nodes"] == ["agent", "tools"]
+    
+    events, on_event = recorder()
+    result = await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(
+        LoopGraph(), {}, run_id="run-loop", resume_token=first_events[0]["data"]["resume_token"]
+    )
+    
+    assert result == {"step": 2}
+    assert [(e["event"], e["data"].get("node")) for e in events] == [
+        ("start", None),
+        ("tool_result", "agent"),  # replayed
+        ("tool_result", "tools"),  # replayed
+        ("tool_call", "agent"),  # the second agent iteration still runs
+        ("tool_result", "agent"),
+        ("finish", None),
+    ]
+    assert store.load("run-loop")["completed_nodes"] == ["agent", "tools", "agent"]
+
+
+@pytest.mark.asyncio
+async def test_only_the_owner_can_resume_or_replay():
+    """Test that a client-supplied run_id can't reach another owner's checkpoint."""
+    store = CheckpointStore()
+    _, on_event = recorder()
+    await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-mine", owner="alice")
+    assert store.load("run-mine")["owner"] == "alice"
+    
+    with pytest.raises(PermissionError):
+        await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-mine", owner="mallory")
+    replayed, on_replay = recorder()
+    await LangGraphAgentAdapter(on_replay, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-mine", owner="alice")
+    assert [e["event"] for e in replayed] == ["start", "tool_result", "tool_result", "finish"]
+
+
+@pytest.mark.asyncio
+async def test_resume_fails_closed_without_owner_or_token():
+    """Test that an anonymous run is only resumable with its resume token."""
+    from agentprinter_fastapi.channels import run_channels
+    
+    store = CheckpointStore()
+    events, on_event = recorder()
+    viewer_events = []
+    
+    async def viewer(message):
+        viewer_events.append(message)
+    
+    graph = TwoStepGraph(gate=asyncio.Event())
+    task = asyncio.create_task(LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(graph, {}, run_id="run-anon"))
+    await asyncio.sleep(0.01)
+    run_channels.subscribe("run-anon", viewer, raw=True)
+    graph.gate.set()
+    await task
+    token = events[0]["data"]["resume_token"]
+    assert store.load("run-anon")["owner"] is None
+    assert token not in str(store.load("run-anon"))
+    assert all("resume_token" not in str(message) for message in viewer_events)
+    
+    for kwargs in ({}, {"owner": "mallory"}, {"resume_token": "guess"}):
+        with pytest.raises(PermissionError):
+            await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-anon", **kwargs)
+    replayed, on_replay = recorder()
+    await LangGraphAgentAdapter(on_replay, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-anon", resume_token=token)
+    assert [e["event"] for e in replayed] == ["start", "tool_result", "tool_result", "finish"]
+
+
+@pytest.mark.asyncio
+async def test_authenticated_identity_owns_the_run():
+    """Test that the bound identity, not the connection, is recorded as the owner."""
+    from agentprinter_fastapi.runs import bind_client
+    
+    store = CheckpointStore()
+    _, on_event = recorder()
+    bind_client("conn-1", identity="alice")
+    await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-alice")
+    assert store.load("run-alice")["owner"] == "alice"
+    
+    # A new connection of the same user may replay it; another user may not
+    bind_client("conn-2", identity="alice")
+    await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-alice")
+    bind_client("conn-3", identity="mallory")
+    with pytest.raises(PermissionError):
+        await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-alice")
+    bind_client(None)
+
+
+@pytest.mark.asyncio
+async def test_file_store_writes_off_the_event_loop(tmp_path, monkeypatch):
+    """Test that FileCheckpointStore saves (and prunes) in a worker thread."""
+    import threading
+    
+    store = FileCheckpointStore(tmp_path, prune_every=1)
+    threads = set()
+    save = store.save
+    
+    def recording_save(run_id, checkpoint):
+        threads.add(threading.current_thread())
+        save(run_id, checkpoint)
+    monkeypatch.setattr(store, "save", recording_save)
+    
+    _, on_event = recorder()
+    await LangGraphAgentAdapter(on_event, checkpoints=store).run_graph(TwoStepGraph(), {}, run_id="run-thread")
+    assert threads and threading.current_thread() not in threads
+    assert store.load("run-thread")["status"] == "completed"
+
+
+def test_stores_are_bounded(tmp_path):
+    """Test run-count and TTL eviction in memory and on disk."""
+    import os
+    import time
+    
+    store = CheckpointStore(max_runs=2, ttl=60)
+    for i in range(3):
+        store.save(f"run-{i}", {"status": "completed"})
+    assert store.load("run-0") is None and store.load("run-2") is not None
+    store._checkpoints["run-2"]["updated_at"] -= 120
+    assert store.load("run-2") is None
+    
+    files = FileCheckpointStore(tmp_path, max_runs=3, max_cached=1, prune_every=1000)
+    for i in range(5):
+        files.save(f"run-{i}", {"status": "running"})
+        os.utime(files._path(f"run-{i}"), (time.time() - 100 + i, time.time() - 100 + i))
+    assert len(files._checkpoints) == 1
+    assert files.prune() == 2
+    assert files.load("run-1") is None and files.load("run-2")["status"] == "running"
+
+
+def test_file_names_do_not_collide(tmp_path):
+    """Test that run IDs differing only in unsafe characters get separate files."""
+    store = FileCheckpointStore(tmp_path)
+    store.save("a/b", {"status": "running", "n": 1})
+    store.save("a_b", {"status": "running", "n": 2})
+    
+    fresh = FileCheckpointStore(tmp_path)
+    assert fresh.load("a/b")["n"] == 1
+    assert fresh.load("a_b")["n"] == 2
+    assert sorted(fresh.interrupted()) == ["a/b", "a_b"]
+    assert all(path.parent == tmp_path for path in tmp_path.iterdir())
@@ -0,0 +1,191 @@
+"""Tests for action deadlines and deadline propagation."""
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi.actions import ActionRouter, action_router
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.agent_adapters import LangChainAgentAdapter
+from agentprinter_fastapi.deadlines import Deadline, DeadlineExceeded, current_deadline, enforce_deadline
+from agentprinter_fastapi.schemas.protocol import Message, MessageHeader
+
+
+def make_action(action_id: str, target: str = "", deadline_ms: int | None = None) -> Message:
+    return Message(
+        type="user.action",
+        header=MessageHeader(trace_id="deadline-trace", deadline_ms=deadline_ms),
+        payload={"action_id": action_id, "trigger": "click", "target": target or f"backend:{action_id}"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_action_timeout_cancels_handler():
+    """Test that a per-action timeout cancels a slow handler."""
+    router = ActionRouter()
+    cancelled = []
+
+    async def slow_handler(message, websocket):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    router.register_handler("slow", slow_handler, timeout=0.05)
+
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        await router.handle_message(make_action("slow"), object())
+
+    assert cancelled == [True]
+    assert exc_info.value.details["action_id"] == "slow"
+    assert exc_info.value.details["timeout_ms"] == 50
+
+
+@pytest.mark.asyncio
+async def test_target_timeout_and_client_deadline_use_earliest():
+    """Test that the client header deadline wins when it is tighter than the target timeout."""
+    router = ActionRouter()
+    seen = {}
+
+    async def agent_handler(message, websocket):
+        seen["remaining"] = current_deadline().remaining()
+        await asyncio.sleep(5)
+
+    router.register_target_handler("agent", agent_handler, timeout=10)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        await router.handle_message(make_action("run", target="agent:run", deadline_ms=50), object())
+
+    assert seen["remaining"] <= 0.05
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_handler_without_timeout_is_unbounded():
+    """Test that handlers run without a deadline unless one is configured."""
+    router = ActionRouter()
+    seen = {}
+
+    async def handler(message, websocket):
+        seen["deadline"] = current_deadline()
+
+    router.register_handler("free", handler)
+    await router.handle_message(make_action("free"), object())
+
+    assert seen["deadline"] is None
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_deadline_sends_protocol_error():
+    """Test that AgentRunner closes the generator and reports a timeout when its deadline passes."""
+    runner = AgentRunner()
+    sent_messages = []
+    closed = []
+
+    class MockWebSocket:
+        async def send_json(self, data):
+            sent_messages.append(data)
+
+    async def endless_agent():
+        try:
+            yield "start", "Starting"
+            while True:
+                await asyncio.sleep(0.01)
+                yield "token", "x"
+        finally:
+            closed.append(True)
+
+    await runner.run_stream("run-slow", "trace-slow", MockWebSocket(), endless_agent(), deadline=0.05)
+
+    assert closed == [True]
+    error = sent_messages[-1]
+    assert error["type"] == "protocol.error"
+    assert error["payload"]["code"] == "deadline_exceeded"
+    assert error["payload"]["details"]["run_id"] == "run-slow"
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_inherits_action_deadline():
+    """Test that an enclosing action deadline cancels the run without a runner-level error frame."""
+    runner = AgentRunner()
+    sent_messages = []
+
+    class MockWebSocket:
+        async def send_json(self, data):
+            sent_messages.append(data)
+
+    async def endless_agent():
+        while True:
+            await asyncio.sleep(0.01)
+            yield "token", "x"
+
+    with pytest.raises(DeadlineExceeded):
+        async with enforce_deadline(Deadline(0.05)):
+            await runner.run_stream("run-inherit", "trace", MockWebSocket(), endless_agent())
+
+    assert all(m["type"] == "agent.event" for m in sent_messages)
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_deadline_emits_error_event():
+    """Test that LangChainAgentAdapter stops waiting for a slow executor at the deadline."""
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    class SlowExecutor:
+        def invoke(self, input_data, config=None):
+            time.sleep(0.3)
+            return {"output": "too late"}
+
+    adapter = LangChainAgentAdapter(on_event)
+
+    with pytest.raises(DeadlineExceeded):
+        await adapter.run_agent(SlowExecutor(), {"input": "hi"}, deadline=0.05)
+
+    assert events[-1]["event"] == "error"
+    assert events[-1]["data"]["code"] == "deadline_exceeded"
+    assert adapter.get_history()[-1]["status"] == "error"
+
+
+def test_websocket_reports_deadline_exceeded():
+    """Test that the WebSocket endpoint turns a handler timeout into a structured protocol.error."""
+    from agentprinter_fastapi.router import router
+    from agentprinter_fastapi import set_initial_page, set_template_loader
+
+    set_template_loader(None)
+    set_initial_page(None)
+
+    async def slow_handler(message, websocket):
+        await asyncio.sleep(5)
+
+    action_router.register_handler("slow_ws_action", slow_handler, timeout=0.05)
+    app = FastAPI()
+    app.include_router(router)
+
+    try:
+        with TestClient(app).websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "protocol.hello"
+            websocket.send_json(make_action("slow_ws_action").model_dump(mode="json"))
+            error = websocket.receive_json()
+            assert error["type"] == "protocol.error"
+            assert error["payload"]["code"] == "deadline_exceeded"
+            assert error["payload"]["details"]["action_id"] == "slow_ws_action"
+    finally:
+        action_router._handlers.pop("slow_ws_action", None)
+        action_router._handler_timeouts.pop("slow_ws_action", None)
+
+
+@pytest.mark.asyncio
+async def test_nested_deadline_keeps_earlier_outer_deadline():
+    """Test that a looser inner deadline does not hide a tighter enclosing one."""
+    outer = Deadline(0.5)
+    async with enforce_deadline(outer):
+        async with enforce_deadline(Deadline(10)):
+            assert current_deadline() is outer
+        tighter = Deadline(0.1)
+        async with enforce_deadline(tighter):
+            assert current_deadline() is tighter
@@ -0,0 +1,78 @@
+"""Tests for the trusted-message envelope factory."""
+import pytest
+from agentprinter_fastapi.envelope import (
+    make_envelope,
+    next_message_id,
+    protocol_error_frame,
+    static_error_frame,
+    set_envelope_validation,
+    envelope_validation_enabled,
+)
+from agentprinter_fastapi.router import make_protocol_error
+from agentprinter_fastapi.schemas.agent import AgentEvent
+from agentprinter_fastapi.schemas.protocol import Message, MessageHeader
+
+
+@pytest.fixture
+def fast_envelopes():
+    """Run a test with validation off, restoring the configured mode afterwards."""
+    previous = envelope_validation_enabled()
+    set_envelope_validation(False)
+    yield
+    set_envelope_validation(previous)
+
+
+def test_fast_envelope_matches_validated_message(fast_envelopes):
+    """Test that fast frames have the same shape as pydantic-dumped messages."""
+    frame = make_envelope("agent.event", {"run_id": "r", "event": "token", "data": "x"}, "trace-1", session_id="s1")
+    expected = Message(
+        type="agent.event",
+        header=MessageHeader(trace_id="trace-1", session_id="s1"),
+        payload={"run_id": "r", "event": "token", "data": "x"}
+    ).model_dump(mode="json")
+
+    assert list(frame["header"]) == list(expected["header"])
+    assert frame["header"]["session_id"] == "s1"
+    assert frame["header"]["timestamp"].endswith("Z")
+    # Round-trips through full validation unchanged
+    assert Message.model_validate(frame).model_dump(mode="json") == frame
+
+
+def test_message_ids_are_unique_and_monotonic():
+    """Test that generated ids never repeat and sort in creation order."""
+    ids = [next_message_id() for _ in range(1000)]
+    assert len(set(ids)) == 1000
+    assert ids == sorted(ids)
+
+
+def test_validation_mode_rejects_bad_payloads(validated_envelopes):
+    """Test that the debug switch re-enables payload validation."""
+    with pytest.raises(Exception):
+        make_envelope("agent.event", {"run_id": "r", "event": "bogus", "data": None}, "t", payload_model=AgentEvent)
+
+
+def test_fast_mode_skips_payload_validation(fast_envelopes):
+    """Test that trusted frames are not validated when the switch is off."""
+    frame = make_envelope("agent.event", {"run_id": "r", "event": "bogus", "data": None}, "t", payload_model=AgentEvent)
+    assert frame["payload"]["event"] == "bogus"
+
+
+def test_error_frames(fast_envelopes):
+    """Test protocol.error builders, including precomputed static frames."""
+    dynamic = protocol_error_frame("t1", "handler_error", "boom", {"k": 1})
+    assert dynamic["payload"] == {"code": "handler_error", "message": "boom", "details": {"k": 1}}
+
+    first = static_error_frame("auth_failed", "t2")
+    second = static_error_frame("auth_failed", "t3")
+    assert first["payload"] == {"code": "auth_failed", "message": "Authentication failed", "details": {}}
+    assert first["header"]["id"] != second["header"]["id"]
+    assert first["payload"] is not second["payload"]
+
+
+def test_make_protocol_error_construct_path(fast_envelopes):
+    """Test that make_protocol_error still returns a dumpable Message without validation."""
+    message = make_protocol_error("t", "unknown_action", "nope")
+    dumped = message.model_dump(mode="json")
+    assert dumped["type"] == "protocol.error"
+    assert dumped["payload"]["code"] == "unknown_action"
+    assert dumped["header"]["trace_id"] == "t"
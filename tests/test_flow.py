@@ -0,0 +1,203 @@
+"""Tests for credit-based flow control."""
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi import set_initial_page, set_template_loader
+from agentprinter_fastapi.actions import action_router
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.backpressure import rate_limiter
+from agentprinter_fastapi.flow import FlowController, parse_credits
+from agentprinter_fastapi.manager import ConnectionManager
+from agentprinter_fastapi.router import router
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def _patch(op, session="s", seq=None):
+    return {"type": "ui.patch", "header": {"session_id": session, "seq": seq}, "payload": {"op": op}}
+
+
+@pytest.mark.asyncio
+async def test_buffers_and_coalesces_until_granted():
+    ws = MockWebSocket()
+    flow = FlowController(ws.send_json)
+    await flow.send_json({"type": "x"})  # Unlimited before the first grant
+    await flow.grant(messages=1, reset=True)
+
+    await flow.send_json(_patch("a"))
+    await flow.send_json(_patch("b"))
+    await flow.send_json(_patch("c"))
+    await flow.send_json(_patch("d", session="other"))
+    assert len(ws.sent) == 2 and flow.buffered == 2
+
+    await flow.grant(messages=5)
+    assert ws.sent[2]["payload"] == {"patches": [{"op": "b"}, {"op": "c"}]}
+    assert ws.sent[3]["payload"] == {"op": "d"}
+    assert flow.messages == 3
+    assert flow.stats["coalesced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_byte_credits_allow_one_overdraft():
+    ws = MockWebSocket()
+    flow = FlowController(ws.send_json)
+    await flow.grant(bytes=10, reset=True)
+
+    await flow.send_json({"type": "big", "payload": {"text": "x" * 100}})
+    await flow.send_json({"type": "next"})
+    assert len(ws.sent) == 1 and flow.bytes < 0
+
+    await flow.grant(bytes=10)  # Still in debt
+    assert len(ws.sent) == 1
+    await flow.grant(bytes=1000)
+    assert [m["type"] for m in ws.sent] == ["big", "next"]
+
+
+@pytest.mark.asyncio
+async def test_overflow_drops_oldest_and_reports_gap():
+    ws = MockWebSocket()
+    flow = FlowController(ws.send_json, max_buffered=2)
+    await flow.grant(messages=0, reset=True)
+    await flow.send_json({"type": "reply", "header": {}, "payload": {}}, wait=False)
+    for seq in range(1, 5):
+        await flow.send_json({"type": "agent.event", "header": {"seq": seq}, "payload": {}}, wait=False)
+
+    await flow.grant(messages=10)
+    notice = ws.sent[0]
+    assert notice["payload"]["code"] == "messages_dropped"
+    assert notice["payload"]["details"] == {"dropped": 3, "first_seq": 1, "last_seq": 3}
+    # Frames without a seq can't be replayed, so they're never dropped
+    assert [m["type"] for m in ws.sent[1:]] == ["reply", "agent.event"]
+    assert ws.sent[2]["header"]["seq"] == 4
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_blocks_senders_until_granted():
+    ws = MockWebSocket()
+    flow = FlowController(ws.send_json, max_buffered=2)
+    await flow.grant(messages=0, reset=True)
+
+    async def stream():
+        for i in range(5):
+            await flow.send_json({"type": "agent.event", "header": {}, "payload": {"i": i}})
+
+    task = asyncio.create_task(stream())
+    await asyncio.sleep(0.01)
+    assert not task.done() and flow.buffered == 2
+    for _ in range(5):
+        await flow.grant(messages=1)
+        await asyncio.sleep(0)
+    await asyncio.wait_for(task, 1)
+    await flow.grant(messages=10)
+    assert [m["payload"]["i"] for m in ws.sent] == [0, 1, 2, 3, 4]
+    assert flow.stats["dropped"] == 0 and flow.stats["waits"] > 0
+
+    # Closing releases blocked senders
+    await flow.grant(messages=0, reset=True)
+    task = asyncio.create_task(stream())
+    await asyncio.sleep(0.01)
+    flow.close()
+    await asyncio.wait_for(task, 1)
+    assert len(ws.sent) == 5 + 3  # The two buffered frames were discarded
+
+
+def test_parse_credits():
+    assert parse_credits({}) is None
+    assert parse_credits({"credits": {"messages": 4}}) == (4, None)
+    for bad in ({"credits": 3}, {"credits": {"bytes": -1}}, {"credits": {"messages": True}}):
+        with pytest.raises(ValueError):
+            parse_credits(bad)
+
+
+@pytest.mark.asyncio
+async def test_manager_broadcasts_through_flow_control():
+    manager = ConnectionManager()
+    ws = MockWebSocket()
+    manager.active_connections.append(ws)
+    flow = FlowController(ws.send_json)
+    manager.attach_flow(ws, flow)
+    await flow.grant(messages=0, reset=True)
+
+    await manager.broadcast({"type": "ui.render", "header": {"session_id": "flow-test"}, "payload": {}})
+    assert ws.sent == [] and flow.buffered == 1
+    await flow.grant(messages=1)
+    assert ws.sent[0]["type"] == "ui.render"
+
+    manager.disconnect(ws)
+    assert ws not in manager.flow_controls
+
+
+def test_websocket_credits_gate_replies():
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    client = TestClient(app)
+
+    def msg(type_, payload):
+        return {"type": type_, "header": {"trace_id": "t"}, "payload": payload}
+
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json(msg("protocol.hello", {"credits": {"messages": 0}}))
+        ws.send_json(msg("agent.subscribe", {"run_id": "missing-1"}))
+        ws.send_json(msg("agent.subscribe", {"run_id": "missing-2"}))
+        ws.send_json(msg("protocol.ack", {"credits": {"messages": 1}}))
+        assert ws.receive_json()["payload"]["details"]["run_id"] == "missing-1"
+
+        ws.send_json(msg("protocol.ack", {"credits": {"messages": "many"}}))  # Queued behind missing-2
+        ws.send_json(msg("protocol.ack", {"credits": {"messages": 5}}))
+        assert ws.receive_json()["payload"]["details"]["run_id"] == "missing-2"
+        assert ws.receive_json()["payload"]["code"] == "invalid_credits"
+
+
+def test_streaming_handler_loses_nothing_under_credits():
+    """Acks are read while a handler streams, and the handler waits rather than dropping tokens."""
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    runner = AgentRunner()
+    stats = {}
+
+    @action_router.action("flow_stream")
+    async def stream(message, websocket):
+        async def tokens():
+            for i in range(400):
+                yield "token", f"{i} "
+            yield "finish", "done"
+
+        await runner.run_stream("run-flow", message.header.trace_id, websocket, tokens())
+        stats.update(websocket.flow.stats)
+
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "protocol.hello", "header": {"trace_id": "t"}, "payload": {"credits": {"messages": 4}}})
+        ws.send_json({
+            "type": "user.action",
+            "header": {"trace_id": "t"},
+            "payload": {"action_id": "flow_stream", "trigger": "click", "target": "button"},
+        })
+        text = []
+        while True:
+            msg = ws.receive_json()
+            ws.send_json({"type": "protocol.ack", "header": {"trace_id": "t"}, "payload": {"credits": {"messages": 1}}})
+            assert msg["type"] == "agent.event", msg
+            if msg["payload"]["event"] == "finish":
+                break
+            if msg["payload"]["event"] == "token":
+                text.append(msg["payload"]["data"])
+
+    assert "".join(text) == "".join(f"{i} " for i in range(400))
+    assert stats["waits"] > 0 and stats["dropped"] == 0
@@ -0,0 +1,181 @@
+"""Tests for the exact-match LLM response cache."""
+import pytest
+from agentprinter_fastapi.adapters import OpenAIStreamAdapter
+from agentprinter_fastapi.llm_cache import ResponseCache, cache_key
+
+
+class StubStream:
+    def __init__(self, words):
+        self.words = list(words)
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if not self.words:
+            raise StopAsyncIteration
+        delta = type("Delta", (), {"content": self.words.pop(0)})()
+        return type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+    
+    async def close(self):
+        pass
+
+
+class StubPool:
+    """Client pool whose client streams fixed words and counts requests."""
+    
+    def __init__(self, words=("Hel", "lo", " there")):
+        self.words = words
+        self.requests = 0
+        self.chat = self
+        self.completions = self
+    
+    async def create(self, **kwargs):
+        self.requests += 1
+        return StubStream(self.words)
+    
+    def acquire(self, api_key, base_url=None):
+        pool = self
+        
+        class Slot:
+            async def __aenter__(self):
+                return pool
+            
+            async def __aexit__(self, *exc):
+                return False
+        return Slot()
+
+
+def test_cache_key_is_normalized():
+    """Test that key order, None params and transport options don't change the key."""
+    messages = [{"role": "user", "content": "hi"}]
+    base = cache_key("m", messages, {"temperature": 0, "max_tokens": 10})
+    
+    assert cache_key("m", [{"content": "hi", "role": "user"}], {"max_tokens": 10, "temperature": 0, "seed": None}) == base
+    assert cache_key("m", messages, {"temperature": 0, "max_tokens": 10, "timeout": 5}) == base
+    assert cache_key("m", messages, {"temperature": 1, "max_tokens": 10}) != base
+    assert cache_key("other", messages, {"temperature": 0, "max_tokens": 10}) != base
+    
+    # Different OpenAI-compatible endpoints serving the same model name never share entries
+    local = cache_key("m", messages, {"temperature": 0, "max_tokens": 10}, "http://localhost:8000/v1")
+    assert local != base
+    assert cache_key("m", messages, {"temperature": 0, "max_tokens": 10}, "http://localhost:8000/v1/") == local
+    assert cache_key("m", messages, {"temperature": 0, "max_tokens": 10}, "http://other:8000/v1") != local
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    cache.get("a")
+    cache.put("c", ["3"])
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"] and cache.get("c") == ["3"]
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_replays_chunk_boundaries(tmp_path):
+    """Test that a repeated request replays recorded chunks without calling the provider."""
+    pool = StubPool()
+    cache = ResponseCache(directory=tmp_path)
+    adapter = OpenAIStreamAdapter("sk-test", "stub", client_pool=pool, cache=cache)
+    messages = [{"role": "user", "content": "greet me"}]
+    
+    first, second = [], []
+    
+    async def record_first(text):
+        first.append(text)
+    
+    async def record_second(text):
+        second.append(text)
+    
+    assert await adapter.stream_completion(messages, record_first, temperature=0) == "Hello there"
+    assert await adapter.stream_completion(messages, record_second, temperature=0) == "Hello there"
+    
+    assert first == second == ["Hel", "lo", " there"]
+    assert pool.requests == 1
+    assert cache.stats["hits"] == 1
+    
+    # A fresh process (empty memory tier) still hits the on-disk tier
+    restarted = ResponseCache(directory=tmp_path)
+    adapter = OpenAIStreamAdapter("sk-test", "stub", client_pool=pool, cache=restarted)
+    replayed = []
+    
+    async def record_replay(text):
+        replayed.append(text)
+    
+    await adapter.stream_completion(messages, record_replay, temperature=0)
+    assert replayed == ["Hel", "lo", " there"]
+    assert pool.requests == 1
+    assert restarted.stats["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_streams_are_not_cached():
+    """Test that a stream that errors out leaves no cache entry."""
+    class FailingPool(StubPool):
+        async def create(self, **kwargs):
+            self.requests += 1
+            raise RuntimeError("provider down")
+    
+    cache = ResponseCache()
+    adapter = OpenAIStreamAdapter("sk-test", "stub", client_pool=FailingPool(), cache=cache)
+    
+    async def on_chunk(text):
+        pass
+    
+    with pytest.raises(RuntimeError):
+        await adapter.stream_completion([{"role": "user", "content": "hi"}], on_chunk)
+    assert len(cache) == 0
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    """Test that entry files are evicted by size and age, across restarts too."""
+    import os
+    import time
+    
+    cache = ResponseCache(directory=tmp_path, max_disk_bytes=100)
+    for i in range(5):
+        cache.put(f"{i:02d}" + "k" * 30, ["x" * 20])
+    files = list(tmp_path.glob("*/*.json"))
+    assert 1 <= len(files) < 5
+    assert sum(f.stat().st_size for f in files) <= 100
+    assert cache.stats["disk_evictions"] == 5 - len(files)
+    
+    old = ResponseCache(directory=tmp_path / "ttl", ttl=60)
+    old.put("aa-old", ["stale"])
+    stale = time.time() - 120
+    os.utime(old._path("aa-old"), (stale, stale))
+    assert ResponseCache(directory=tmp_path / "ttl", ttl=60).get("aa-old") is None
+    assert not old._path("aa-old").exists()
+
+
+@pytest.mark.asyncio
+async def test_entries_are_per_api_key_and_read_off_the_loop(tmp_path, monkeypatch):
+    """Test that another API key misses the cache and disk I/O runs in a worker thread."""
+    import threading
+    
+    cache = ResponseCache(directory=tmp_path)
+    threads = set()
+    read = cache._read
+    
+    def recording_read(key):
+        threads.add(threading.current_thread())
+        return read(key)
+    monkeypatch.setattr(cache, "_read", recording_read)
+    
+    async def on_chunk(text):
+        pass
+    
+    pool = StubPool()
+    messages = [{"role": "user", "content": "greet me"}]
+    await OpenAIStreamAdapter("sk-alice", "stub", client_pool=pool, cache=cache).stream_completion(messages, on_chunk)
+    cache.clear()  # Force the disk tier
+    await OpenAIStreamAdapter("sk-alice", "stub", client_pool=pool, cache=cache).stream_completion(messages, on_chunk)
+    assert pool.requests == 1 and cache.stats["disk_hits"] == 1
+    
+    await OpenAIStreamAdapter("sk-mallory", "stub", client_pool=pool, cache=cache).stream_completion(messages, on_chunk)
+    assert pool.requests == 2
+    assert threads and threading.current_thread() not in threads
+    assert not any("sk-alice" in path.read_text() or "sk-alice" in path.name for path in tmp_path.glob("*/*.json"))
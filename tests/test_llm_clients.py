@@ -0,0 +1,117 @@
+"""Tests for pooled OpenAI clients, against a local stub server."""
+import asyncio
+import json
+import pytest
+from agentprinter_fastapi.adapters import OpenAIStreamAdapter
+from agentprinter_fastapi.llm_clients import OpenAIClientPool
+
+
+class StubOpenAIServer:
+    """Minimal keep-alive HTTP server that streams a chat completion."""
+    
+    def __init__(self, words=("Hello", " pool"), delay=0.0):
+        self.words = words
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.server = None
+    
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+    
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+    
+    @property
+    def base_url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def _body(self):
+        events = [
+            {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            for word in self.words
+        ]
+        lines = [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"]
+        return "".join(lines).encode()
+    
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                await reader.readexactly(length)
+                
+                self.requests += 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                await asyncio.sleep(self.delay)
+                body = self._body()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+                    + f"content-length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+                self.active -= 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _collect(adapter, chunks=None):
+    async def on_chunk(text):
+        if chunks is not None:
+            chunks.append(text)
+    return await adapter.stream_completion([{"role": "user", "content": "hi"}], on_chunk)
+
+
+@pytest.mark.asyncio
+async def test_completions_reuse_pooled_connection():
+    """Test that sequential completions share one client and one TCP connection."""
+    pool = OpenAIClientPool()
+    async with StubOpenAIServer() as server:
+        adapter = OpenAIStreamAdapter("sk-test", "stub", base_url=server.base_url, client_pool=pool)
+        chunks = []
+        try:
+            results = [await _collect(adapter, chunks) for _ in range(3)]
+            assert pool.get("sk-test", server.base_url) is pool.get("sk-test", server.base_url)
+        finally:
+            await pool.aclose()
+    
+    assert results == ["Hello pool"] * 3
+    assert chunks == ["Hello", " pool"] * 3
+    assert server.requests == 3
+    assert server.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_limits_concurrent_requests():
+    """Test that the per-client semaphore caps in-flight completions."""
+    pool = OpenAIClientPool(max_concurrency=2)
+    async with StubOpenAIServer(delay=0.02) as server:
+        adapter = OpenAIStreamAdapter("sk-test", "stub", base_url=server.base_url, client_pool=pool)
+        try:
+            results = await asyncio.gather(*(_collect(adapter) for _ in range(6)))
+            assert pool.get_stats()["in_flight"] == 0
+        finally:
+            await pool.aclose()
+    
+    assert results == ["Hello pool"] * 6
+    assert server.peak_active == 2
+    assert server.connections <= 2
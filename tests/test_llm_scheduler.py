@@ -0,0 +1,185 @@
+"""Tests for the RPM/TPM-aware LLM scheduler, using a fake clock."""
+import asyncio
+import pytest
+from agentprinter_fastapi.adapters import OpenAIStreamAdapter
+from agentprinter_fastapi.llm_scheduler import (
+    LLMScheduler,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def __call__(self):
+        return self.now
+    
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def make_scheduler(clock, **kwargs):
+    return LLMScheduler(clock=clock, sleep=clock.sleep, rng=lambda: 0.5, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_enforces_rpm_window():
+    """Test that calls beyond the RPM budget wait for the window to slide."""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rpm=2)
+    started = []
+    
+    async def call(i):
+        started.append((i, clock.now))
+        return i
+    
+    results = await asyncio.gather(*(scheduler.submit(lambda i=i: call(i)) for i in range(4)))
+    
+    assert results == [0, 1, 2, 3]
+    assert started == [(0, 0.0), (1, 0.0), (2, 60.0), (3, 60.0)]
+    stats = scheduler.get_stats()
+    assert stats["completed"] == 4
+    assert stats["max_queue_time"] == 60.0
+    assert stats["requests_in_window"] == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_enforces_tpm_budget():
+    """Test that estimated tokens count against the TPM budget."""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, tpm=1000)
+    started = []
+    
+    async def call(i):
+        started.append((i, clock.now))
+    
+    await scheduler.submit(lambda: call(0), estimated_tokens=600)
+    await scheduler.submit(lambda: call(1), estimated_tokens=300)
+    await scheduler.submit(lambda: call(2), estimated_tokens=300)
+    
+    assert started == [(0, 0.0), (1, 0.0), (2, 60.0)]
+    assert scheduler.get_stats()["tokens_in_window"] == 300
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_background_queue():
+    """Test that queued interactive calls are admitted before background ones."""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rpm=1)
+    order = []
+    
+    async def call(name):
+        order.append(name)
+    
+    await scheduler.submit(lambda: call("first"))
+    background = [
+        asyncio.create_task(scheduler.submit(lambda i=i: call(f"bg{i}"), priority=PRIORITY_BACKGROUND))
+        for i in range(2)
+    ]
+    interactive = asyncio.create_task(scheduler.submit(lambda: call("ui"), priority=PRIORITY_INTERACTIVE))
+    await asyncio.gather(*background, interactive)
+    
+    assert order == ["first", "ui", "bg0", "bg1"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_calls_back_off_with_jitter():
+    """Test that a 429 pauses admissions and the call is retried."""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, base_backoff=2.0, max_retries=2)
+    attempts = []
+    
+    async def flaky():
+        attempts.append(clock.now)
+        if len(attempts) < 3:
+            raise RateLimited("slow down")
+        return "ok"
+    
+    assert await scheduler.submit(flaky) == "ok"
+    # Backoffs of 2s and 4s, scaled by jitter factor 0.75
+    assert attempts == [0.0, 1.5, 4.5]
+    stats = scheduler.get_stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 2
+    
+    async def always_limited():
+        raise RateLimited("still slow")
+    
+    with pytest.raises(RateLimited):
+        await scheduler.submit(always_limited)
+    assert scheduler.get_stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_openai_adapter_submits_through_scheduler():
+    """Test that the adapter queues requests through its scheduler."""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, rpm=1)
+    
+    class Delta:
+        def __init__(self, content):
+            self.content = content
+    
+    class Chunk:
+        def __init__(self, content):
+            self.choices = [type("Choice", (), {"delta": Delta(content)})()]
+    
+    class Stream:
+        def __init__(self, words):
+            self.words = list(words)
+        
+        def __aiter__(self):
+            return self
+        
+        async def __anext__(self):
+            if not self.words:
+                raise StopAsyncIteration
+            return Chunk(self.words.pop(0))
+        
+        async def close(self):
+            pass
+    
+    class StubClient:
+        def __init__(self):
+            self.chat = self
+            self.completions = self
+            self.calls = []
+        
+        async def create(self, **kwargs):
+            self.calls.append(clock.now)
+            return Stream(["a", "b"])
+    
+    class StubPool:
+        def __init__(self):
+            self.client = StubClient()
+        
+        def acquire(self, api_key, base_url=None):
+            pool = self
+            
+            class Slot:
+                async def __aenter__(self):
+                    return pool.client
+                
+                async def __aexit__(self, *exc):
+                    return False
+            return Slot()
+    
+    pool = StubPool()
+    adapter = OpenAIStreamAdapter("sk-test", "stub", client_pool=pool, scheduler=scheduler)
+    
+    async def on_chunk(text):
+        pass
+    
+    results = [await adapter.stream_completion([{"role": "user", "content": "hi"}], on_chunk) for _ in range(2)]
+    
+    assert results == ["ab", "ab"]
+    assert pool.client.calls == [0.0, 60.0]
+    assert scheduler.get_stats()["tokens_in_window"] > 0
@@ -0,0 +1,178 @@
+"""Tests for agent performance metrics."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.agent_adapters import LangGraphAgentAdapter
+from agentprinter_fastapi.devtools import DevtoolsPanel
+from agentprinter_fastapi.metrics import AgentMetrics, Histogram, LATENCY_BUCKETS, agent_metrics
+from agentprinter_fastapi.router import router
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_histogram_summary():
+    histogram = Histogram(LATENCY_BUCKETS)
+    for value in [0.02, 0.03, 0.04, 0.2, 3.0]:
+        histogram.observe(value)
+
+    summary = histogram.snapshot()
+    assert summary["count"] == 5
+    assert summary["min"] == 0.02 and summary["max"] == 3.0
+    assert 0.025 <= summary["p50"] <= 0.05
+    assert summary["p99"] <= 3.0
+    assert Histogram(LATENCY_BUCKETS).snapshot() == {"count": 0}
+
+
+def test_span_records_ttft_tokens_per_second_and_tools():
+    clock = FakeClock()
+    devtools = DevtoolsPanel()
+    metrics = AgentMetrics(devtools=devtools, clock=clock)
+
+    span = metrics.start_run("math", "run-1")
+    clock.now = 0.5
+    span.on_event("tool_call", {"tool": "calculator"})
+    clock.now = 0.75
+    span.on_event("tool_result", {"output": "4"})
+    clock.now = 1.0
+    span.on_event("token", "The ")
+    clock.now = 2.0
+    for _ in range(9):
+        span.on_event("token", "x")
+    span.finish()
+
+    assert span.ttft == 1.0
+    assert span.tokens_per_second == 10.0
+    assert span.tools == [("calculator", 0.25)]
+    assert metrics.get("ttft_seconds", "math").count == 1
+    assert metrics.get("run_seconds", "math").sum == 2.0
+    assert metrics.get("tool_seconds", "math").sum == 0.25
+    assert metrics.runs["success"] == 1
+
+    perf = devtools.get_messages(category="performance")
+    assert perf[-1]["data"]["run_id"] == "run-1"
+    assert perf[-1]["data"]["ttft_seconds"] == 1.0
+
+
+def test_prometheus_format():
+    metrics = AgentMetrics(devtools=None)
+    metrics.observe("run_seconds", 'a"b', 0.3)
+    text = metrics.prometheus()
+
+    assert "# TYPE agentprinter_agent_run_seconds histogram" in text
+    assert 'agentprinter_agent_run_seconds_bucket{agent="a\\"b",le="0.25"} 0' in text
+    assert 'agentprinter_agent_run_seconds_bucket{agent="a\\"b",le="0.5"} 1' in text
+    assert 'agentprinter_agent_run_seconds_count{agent="a\\"b"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_records_run():
+    metrics = AgentMetrics(devtools=None)
+    runner = AgentRunner(metrics=metrics)
+
+    async def gen():
+        yield "start", "go"
+        yield "tool_call", {"tool": "search"}
+        yield "tool_result", {"output": "found"}
+        yield "token", "a"
+        yield "token", "b"
+        yield "finish", "done"
+
+    await runner.run_stream("run-m", "trace", MockWebSocket(), gen(), agent="researcher")
+
+    run = metrics.recent[-1]
+    assert run["agent"] == "researcher"
+    assert run["status"] == "success"
+    assert run["tokens"] == 2
+    assert run["tools"][0]["name"] == "search"
+    assert metrics.get("ttft_seconds", "researcher").count == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_records_error_status():
+    metrics = AgentMetrics(devtools=None)
+    runner = AgentRunner(metrics=metrics)
+
+    async def gen():
+        yield "start", "go"
+        raise RuntimeError("boom")
+
+    await runner.run_stream("run-e", "trace", MockWebSocket(), gen())
+    assert metrics.recent[-1]["status"] == "error"
+    assert metrics.runs["error"] == 1
+
+
+@pytest.mark.asyncio
+async def test_graph_adapter_times_nodes():
+    class Graph:
+        async def astream_events(self, state, version="v1"):
+            yield {"event": "on_chain_start", "name": "plan", "data": {}}
+            yield {"event": "on_chain_stream", "name": "plan", "data": {"chunk": "hi"}}
+            yield {"event": "on_chain_end", "name": "plan", "data": {"output": {"x": 1}}}
+
+    async def on_event(event):
+        pass
+
+    metrics = AgentMetrics(devtools=None)
+    adapter = LangGraphAgentAdapter(on_event=on_event, metrics=metrics)
+    await adapter.run_graph(Graph(), {}, share_key="planner")
+
+    run = metrics.recent[-1]
+    assert run["agent"] == "planner"
+    assert run["tools"][0]["name"] == "plan"
+    assert run["tokens"] == 1
+
+
+def test_metrics_endpoint():
+    agent_metrics.reset()
+    agent_metrics.observe("ttft_seconds", "endpoint-agent", 0.1)
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'agentprinter_agent_ttft_seconds_count{agent="endpoint-agent"} 1' in response.text
+
+    data = client.get("/metrics?format=json").json()
+    assert data["metrics"]["ttft_seconds"]["endpoint-agent"]["count"] == 1
+    agent_metrics.reset()
+
+
+def test_metrics_endpoint_requires_auth():
+    from agentprinter_fastapi import set_auth_hook
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    set_auth_hook(lambda scope: dict(scope["headers"]).get("authorization") == "Bearer ok")
+    try:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics?format=json").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer ok"}).status_code == 200
+    finally:
+        set_auth_hook(None)
+
+
+def test_agent_labels_are_capped():
+    metrics = AgentMetrics(devtools=None, max_agents=2)
+    for agent in ["a", "b", "c", "d", "a"]:
+        metrics.start_run(agent).finish()
+
+    assert sorted(metrics.snapshot()["metrics"]["run_seconds"]) == ["a", "b", "other"]
+    assert metrics.get("run_seconds", "other").count == 2
+    assert metrics.get("run_seconds", "a").count == 2
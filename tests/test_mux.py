@@ -0,0 +1,146 @@
+"""Tests for multiplexing logical sessions over one WebSocket."""
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi import set_initial_page, set_max_sessions, set_template_loader
+from agentprinter_fastapi.actions import action_router
+from agentprinter_fastapi.backpressure import rate_limiter
+from agentprinter_fastapi.mux import SessionMux, TooManySessions
+from agentprinter_fastapi.router import router
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    yield TestClient(app)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    set_max_sessions(16)
+
+
+_ECHO = {"action_id": "mux_echo", "trigger": "click", "target": "button"}
+
+
+def _msg(type_, session_id=None, payload=None):
+    header = {"trace_id": "t"}
+    if session_id is not None:
+        header["session_id"] = session_id
+    return {"type": type_, "header": header, "payload": payload or {}}
+
+
+@pytest.mark.asyncio
+async def test_channels_stamp_session_and_route():
+    ws = MockWebSocket()
+    mux = SessionMux(ws, "c1", max_sessions=1)
+    a = mux.open("a")
+
+    assert mux.open("a") is a
+    assert a.client_id == "c1:a" and mux.primary.client_id == "c1"
+    assert mux.route("a") is a and mux.route("b") is mux.primary
+    with pytest.raises(TooManySessions):
+        mux.open("b")
+
+    frame = {"type": "x", "header": {"session_id": None}, "payload": {}}
+    await a.send_json(frame)
+    await mux.primary.send_json(frame)
+    assert ws.sent[0]["header"]["session_id"] == "a"
+    assert ws.sent[1] is frame and frame["header"]["session_id"] is None
+
+    assert mux.close("a") is a
+    assert mux.channels() == [mux.primary]
+
+
+def test_replies_are_routed_by_session(client):
+    @action_router.action("mux_echo")
+    async def echo(message, websocket):
+        await websocket.send_json({"type": "ui.patch", "header": {"trace_id": "t"}, "payload": {"echo": True}})
+
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["type"] == "protocol.hello"
+        for session in ("s1", "s2"):
+            ws.send_json(_msg("protocol.open", session))
+            hello = ws.receive_json()
+            assert hello["type"] == "protocol.hello" and hello["header"]["session_id"] == session
+
+        ws.send_json(_msg("user.action", "s2", _ECHO))
+        reply = ws.receive_json()
+        assert reply["payload"] == {"echo": True}
+        assert reply["header"]["session_id"] == "s2"
+
+        ws.send_json(_msg("protocol.close", "s2"))
+        ws.send_json(_msg("user.action", "s2", _ECHO))
+        assert "session_id" not in ws.receive_json()["header"]  # Back on the primary channel
+
+
+def test_session_limit_and_shared_rate_limit(client):
+    set_max_sessions(1)
+    rate_limiter.rate = 3
+
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json(_msg("protocol.open", "s1"))
+        assert ws.receive_json()["type"] == "protocol.hello"
+
+        ws.send_json(_msg("protocol.open", "s2"))
+        error = ws.receive_json()
+        assert error["payload"]["code"] == "too_many_sessions"
+
+        # Sessions share the connection's budget rather than each getting one
+        ws.send_json(_msg("agent.subscribe", "s1", {"run_id": "missing"}))
+        assert ws.receive_json()["payload"]["code"] == "unknown_run"
+        ws.send_json(_msg("agent.subscribe", "s1", {"run_id": "missing"}))
+        limited = ws.receive_json()
+        assert limited["payload"]["code"] == "rate_limit_exceeded"
+        assert limited["header"]["session_id"] == "s1"
+        assert len(rate_limiter.buckets) == 1
+
+    assert rate_limiter.buckets == {}  # Forgotten when the connection closes
+
+
+def test_sessions_run_concurrently_in_order(client):
+    release = {}
+
+    @action_router.action("mux_block")
+    async def block(message, websocket):
+        event = release.setdefault("event", asyncio.Event())
+        await event.wait()
+        await websocket.send_json({"type": "ui.patch", "header": {"trace_id": "t"}, "payload": {"released": True}})
+
+    @action_router.action("mux_release")
+    async def unblock(message, websocket):
+        release.setdefault("event", asyncio.Event()).set()
+
+    @action_router.action("mux_echo")
+    async def echo(message, websocket):
+        await websocket.send_json({"type": "ui.patch", "header": {"trace_id": "t"}, "payload": {"echo": True}})
+
+    with client, client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        for session in ("s1", "s2"):
+            ws.send_json(_msg("protocol.open", session))
+            ws.receive_json()
+
+        ws.send_json(_msg("user.action", "s1", {**_ECHO, "action_id": "mux_block"}))
+        ws.send_json(_msg("user.action", "s1", _ECHO))  # Queued behind the blocked action
+        ws.send_json(_msg("user.action", "s2", _ECHO))
+        reply = ws.receive_json()
+        assert reply["header"]["session_id"] == "s2" and reply["payload"] == {"echo": True}
+
+        ws.send_json(_msg("user.action", "s2", {**_ECHO, "action_id": "mux_release"}))
+        replies = [ws.receive_json() for _ in range(2)]
+        assert [r["header"]["session_id"] for r in replies] == ["s1", "s1"]
+        assert [r["payload"] for r in replies] == [{"released": True}, {"echo": True}]
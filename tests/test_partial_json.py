@@ -0,0 +1,115 @@
+"""Tests for incremental JSON parsing into StatePatch operations."""
+import json
+import random
+import pytest
+from agentprinter_fastapi.adapters import LangChainAdapter
+from agentprinter_fastapi.partial_json import PartialJSONParser, json_patch_stream, state_patch_frame
+
+
+def apply(doc, patch):
+    """Minimal JSON-pointer patch application for the tests."""
+    if patch.path == "":
+        return patch.value
+    parts = [p.replace("~1", "/").replace("~0", "~") for p in patch.path.split("/")[1:]]
+    target = doc
+    for part in parts[:-1]:
+        target = target[int(part)] if isinstance(target, list) else target[part]
+    last = parts[-1]
+    if isinstance(target, list):
+        index = int(last)
+        if patch.op == "add" and index == len(target):
+            target.append(patch.value)
+        else:
+            target[index] = patch.value
+    else:
+        target[last] = patch.value
+    return doc
+
+
+DOC = {
+    "name": "Ada \"the\" Countess",
+    "tags": ["math", "engines", ""],
+    "rows": [{"id": 1, "ok": True}, {"id": -2.5e3, "ok": False, "note": None}],
+    "a/b~c": {"nested": [[1, 2], []]},
+    "unicode": "café ☃ \\ /",
+}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_patches_rebuild_document_for_any_chunking(seed):
+    """Test that patches applied in order rebuild the document, however it is split."""
+    text = "```json\n" + json.dumps(DOC, indent=1) + "\n```"
+    rng = random.Random(seed)
+    parser = PartialJSONParser()
+    patches, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, 7)
+        patches += parser.feed(text[i:i + step])
+        i += step
+    patches += parser.close()
+    
+    doc = None
+    for patch in patches:
+        doc = apply(doc, patch)
+    assert doc == DOC
+    assert [p.version for p in patches] == list(range(1, len(patches) + 1))
+    assert "/a~1b~0c/nested/0/1" in {p.path for p in patches}
+
+
+def test_fields_are_emitted_as_they_complete():
+    """Test that containers open immediately and leaves appear once complete."""
+    parser = PartialJSONParser(base_path="/form")
+    
+    first = parser.feed('Sure! {"title": "Quar')
+    assert [(p.op, p.path, p.value) for p in first] == [("replace", "/form", {})]
+    
+    second = parser.feed('terly", "rows": [{"q": 1')
+    assert [(p.op, p.path, p.value) for p in second] == [
+        ("add", "/form/title", "Quarterly"),
+        ("add", "/form/rows", []),
+        ("add", "/form/rows/0", {}),
+    ]
+    
+    third = parser.feed('}]}')
+    assert [(p.path, p.value) for p in third] == [("/form/rows/0/q", 1)]
+    assert parser.done
+
+
+def test_partial_strings_stream_long_text():
+    parser = PartialJSONParser(partial_strings=True)
+    parser.feed('{"body": "Hello')
+    grown = parser.feed(' wor')
+    assert [(p.op, p.path, p.value) for p in grown] == [("replace", "/body", "Hello wor")]
+    done = parser.feed('ld"}')
+    assert [(p.op, p.value) for p in done] == [("replace", "Hello world")]
+
+
+def test_invalid_json_raises():
+    with pytest.raises(ValueError):
+        PartialJSONParser().feed('{"a" 1}')
+    with pytest.raises(ValueError):
+        parser = PartialJSONParser()
+        parser.feed('{"a": 1')
+        parser.close()
+
+
+@pytest.mark.asyncio
+async def test_chain_stream_fills_state_progressively():
+    """Test wiring the parser into an adapter's chunk stream."""
+    batches = []
+    
+    async def on_patches(patches):
+        batches.append(state_patch_frame(patches, "trace-json"))
+    
+    class JsonChain:
+        async def astream(self, input_data):
+            for chunk in ['{"rows": [', '{"a": 1}, ', '{"a": 2}', ']}']:
+                yield chunk
+    
+    on_chunk = json_patch_stream(on_patches)
+    await LangChainAdapter(on_chunk).stream_chain(JsonChain(), {})
+    
+    assert all(b["type"] == "state.patch" for b in batches)
+    assert batches[0]["payload"]["patches"][1]["path"] == "/rows"
+    assert [p["path"] for p in batches[-1]["payload"]["patches"]] == ["/rows/1", "/rows/1/a"]
+    assert on_chunk.parser.done
@@ -0,0 +1,260 @@
+"""Tests for watching agent runs from other sessions."""
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from agentprinter_fastapi.router import router
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.channels import RunChannel, RunChannelRegistry
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+    
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def events(ws):
+    return [(m["payload"]["event"], m["payload"]["data"]) for m in ws.sent]
+
+
+@pytest.mark.asyncio
+async def test_viewer_joining_mid_run_gets_compacted_catch_up():
+    """Test that a late viewer sees accumulated text, then the live tail."""
+    channels = RunChannelRegistry()
+    runner = AgentRunner(channels=channels)
+    gate = asyncio.Event()
+    
+    async def agent():
+        yield "start", "go"
+        for token in ["Hel", "lo", " "]:
+            yield "token", token
+        await gate.wait()
+        yield "token", "world"
+        yield "finish", "done"
+    
+    owner = MockWebSocket()
+    task = asyncio.create_task(runner.run_stream("run-view", "trace", owner, agent()))
+    await asyncio.sleep(0.01)
+    
+    viewer = MockWebSocket()
+    subscription = channels.subscribe("run-view", viewer.send_json, "viewer-trace")
+    gate.set()
+    await task
+    await subscription.wait_closed()
+    
+    assert len(owner.sent) == 6
+    assert events(viewer) == [("start", "go"), ("token", "Hello "), ("token", "world"), ("finish", "done")]
+    assert {m["header"]["trace_id"] for m in viewer.sent} == {"viewer-trace"}
+    assert channels.get("run-view") is None
+
+
+@pytest.mark.asyncio
+async def test_channel_log_is_bounded_and_slow_viewers_are_dropped():
+    """Test the log bound and that a stalled viewer doesn't block publishing."""
+    channel = RunChannel("run-bound", max_events=3, max_queue=2)
+    for i in range(5):
+        channel.publish("tool_result", i)
+    assert [e["data"] for e in channel.log] == [2, 3, 4]
+    assert channel.dropped == 2
+    
+    stalled = asyncio.Event()
+    
+    async def stuck_send(frame):
+        await stalled.wait()
+    
+    subscription = channel.subscribe(stuck_send)
+    for i in range(10):
+        channel.publish("tool_result", i)
+    await subscription.wait_closed()
+    assert channel.subscribers == {}
+
+
+def test_subscribe_over_websocket():
+    """Test agent.subscribe over the socket, including unknown runs."""
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    
+    with client.websocket_connect("/ws") as websocket:
+        websocket.receive_json()  # hello
+        websocket.send_json({
+            "type": "agent.subscribe",
+            "header": {"trace_id": "t-sub"},
+            "payload": {"run_id": "no-such-run"}
+        })
+        error = websocket.receive_json()
+        assert error["type"] == "protocol.error"
+        assert error["payload"]["code"] == "unknown_run"
+
+
+@pytest.mark.asyncio
+async def test_token_log_stays_linear_and_catch_up_joins_parts():
+    """Test that long token runs are merged without quadratic copying."""
+    import time
+    channel = RunChannel("run-long")
+    started = time.perf_counter()
+    for _ in range(200_000):
+        channel.publish("token", "xy")
+    assert time.perf_counter() - started < 2
+    assert len(channel.log) == 1
+    
+    first = MockWebSocket()
+    channel.subscribe(first.send_json, raw=True)
+    channel.publish("token", "z")
+    second = MockWebSocket()
+    channel.subscribe(second.send_json, raw=True)
+    channel.publish("finish", "done")
+    channel.close()
+    await asyncio.sleep(0.01)
+    
+    assert len(first.sent[0]["data"]) == 400_000
+    assert [m["data"] for m in first.sent[1:]] == ["z", "done"]
+    assert second.sent[0]["data"] == "xy" * 200_000 + "z"
+    assert list(channel.log)[0]["data"] == "xy" * 200_000 + "z"
+
+
+def test_subscribe_requires_ownership_or_share_token():
+    """Test that other clients can only watch a run with its share token."""
+    import threading
+    from agentprinter_fastapi.actions import action_router
+    from agentprinter_fastapi.channels import run_channels
+    
+    stop = threading.Event()
+    
+    @action_router.action("channel_long_run")
+    async def long_run(message, websocket):
+        async def agent():
+            yield "start", "go"
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+            yield "finish", "done"
+        await AgentRunner().run_stream("run-private", message.header.trace_id, websocket, agent())
+    
+    app = FastAPI()
+    app.include_router(router)
+    
+    def subscribe(ws, token=None):
+        payload = {"run_id": "run-private"}
+        if token is not None:
+            payload["token"] = token
+        ws.send_json({"type": "agent.subscribe", "header": {"trace_id": "t"}, "payload": payload})
+        return ws.receive_json()
+    
+    try:
+        # Entering the client shares one event loop between both sockets
+        with TestClient(app) as client, client.websocket_connect("/ws") as owner, client.websocket_connect("/ws") as other:
+            owner.receive_json()
+            other.receive_json()
+            owner.send_json({
+                "type": "user.action",
+                "header": {"trace_id": "t"},
+                "payload": {"action_id": "channel_long_run", "trigger": "click", "target": "button"},
+            })
+            assert owner.receive_json()["payload"]["event"] == "start"
+            
+            assert subscribe(other)["payload"]["code"] == "unknown_run"
+            assert subscribe(other, token="guess")["payload"]["code"] == "unknown_run"
+            
+            token = run_channels.get("run-private").share_token
+            caught_up = subscribe(other, token)
+            assert caught_up["payload"]["event"] == "start"
+            stop.set()
+            assert other.receive_json()["payload"]["event"] == "finish"
+            assert owner.receive_json()["payload"]["event"] == "finish"
+    finally:
+        stop.set()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_run_id_is_rejected_while_live():
+    """Test that a second run under a live run's ID can't take over its channel."""
+    from agentprinter_fastapi.runs import RunIdInUse, run_registry
+    
+    channels = RunChannelRegistry()
+    runner = AgentRunner(channels=channels)
+    gate = asyncio.Event()
+    
+    async def agent(text):
+        yield "start", text
+        await gate.wait()
+        yield "finish", text
+    
+    first = MockWebSocket()
+    task = asyncio.create_task(runner.run_stream("run-dup", "trace", first, agent("first")))
+    await asyncio.sleep(0.01)
+    viewer = MockWebSocket()
+    subscription = channels.subscribe("run-dup", viewer.send_json, "viewer-trace")
+    
+    second = MockWebSocket()
+    with pytest.raises(RunIdInUse):
+        await runner.run_stream("run-dup", "trace", second, agent("second"))
+    assert second.sent == []
+    # The failed run didn't close or replace the first run's channel
+    assert channels.get("run-dup") is subscription.channel and not subscription.channel.closed
+    assert "run-dup" in run_registry.runs
+    
+    gate.set()
+    await task
+    await subscription.wait_closed()
+    assert events(viewer) == [("start", "first"), ("finish", "first")]
+    
+    # Once finished, the ID can be used again
+    await runner.run_stream("run-dup", "trace", second, agent("again"))
+    assert events(second) == [("start", "again"), ("finish", "again")]
+
+
+def test_channel_close_only_closes_its_own_channel():
+    """Test that closing with a stale channel leaves the registered one open."""
+    channels = RunChannelRegistry()
+    stale = channels.open("run-x")
+    channels.close("run-x", stale)
+    current = channels.open("run-x")
+    channels.close("run-x", stale)
+    assert channels.get("run-x") is current and not current.closed
+    channels.close("run-x", current)
+    assert channels.get("run-x") is None
+
+
+def test_duplicate_run_id_over_websocket():
+    """Test that a client reusing a live run's ID gets a run_id_in_use protocol.error."""
+    from agentprinter_fastapi import set_initial_page, set_template_loader
+    from agentprinter_fastapi.actions import action_router
+    from agentprinter_fastapi.backpressure import rate_limiter
+    
+    runner = AgentRunner(channels=RunChannelRegistry())
+    
+    @action_router.action("dup_run_id")
+    async def dup_run(message, websocket):
+        async def gen():
+            yield "start", "go"
+            await asyncio.sleep(5)
+            yield "finish", "done"
+        
+        await runner.run_stream(message.payload["run_id"], message.header.trace_id, websocket, gen())
+    
+    def msg(type_, **payload):
+        return {"type": type_, "header": {"trace_id": "t", "session_id": "s"}, "payload": payload}
+    
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws, client.websocket_connect("/ws") as other:
+        ws.receive_json()
+        other.receive_json()
+        ws.send_json(msg("user.action", action_id="dup_run_id", trigger="click", target="button", run_id="run-ws-dup"))
+        assert ws.receive_json()["type"] == "agent.event"
+        
+        other.send_json(msg("user.action", action_id="dup_run_id", trigger="click", target="button", run_id="run-ws-dup"))
+        error = other.receive_json()
+        assert error["type"] == "protocol.error"
+        assert error["payload"]["code"] == "run_id_in_use"
+        assert runner.channels.get("run-ws-dup") is not None
+        
+        ws.send_json(msg("user.action", action_id="cancel", trigger="click", target="agent:cancel", run_id="run-ws-dup"))
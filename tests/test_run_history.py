@@ -0,0 +1,103 @@
+"""Tests for the bounded run-history store."""
+import pytest
+from agentprinter_fastapi.history import RunHistoryStore
+from agentprinter_fastapi.agent_adapters import LangChainAgentAdapter
+
+
+def test_history_ring_evicts_oldest_records():
+    """Test that only the most recent records stay in memory."""
+    store = RunHistoryStore(max_records=3)
+    for i in range(5):
+        store.append({"run_id": f"run-{i}", "status": "success", "started_at": float(i)})
+
+    assert len(store) == 3
+    assert [r["run_id"] for r in store] == ["run-2", "run-3", "run-4"]
+    assert store.get("run-0") is None
+    assert store.get("run-4")["started_at"] == 4.0
+
+
+def test_history_spills_to_sqlite_and_queries(tmp_path):
+    """Test that evicted records remain queryable from the spill file."""
+    store = RunHistoryStore(max_records=2, spill_path=tmp_path / "runs.db")
+    for i in range(6):
+        status = "error" if i % 2 else "success"
+        store.append({"run_id": f"run-{i}", "status": status, "started_at": float(i), "input": {"n": i}})
+
+    assert len(store) == 2
+    assert store.get("run-0")["input"] == {"n": 0}
+
+    errors = store.query(status="error")
+    assert [r["run_id"] for r in errors] == ["run-1", "run-3", "run-5"]
+
+    window = store.query(since=1.0, until=4.0)
+    assert [r["run_id"] for r in window] == ["run-1", "run-2", "run-3"]
+
+    assert [r["run_id"] for r in store.query(limit=2)] == ["run-4", "run-5"]
+    store.close()
+
+    # Spilled records survive a restart
+    reopened = RunHistoryStore(max_records=2, spill_path=tmp_path / "runs.db")
+    assert reopened.get("run-2")["status"] == "success"
+    reopened.close()
+
+
+def test_history_spills_in_batches(tmp_path):
+    """Test that evicted records are committed in batches and stay queryable meanwhile."""
+    import sqlite3
+    path = tmp_path / "runs.db"
+    store = RunHistoryStore(max_records=1, spill_path=path, spill_batch=3)
+
+    def spilled():
+        with sqlite3.connect(path) as db:
+            return db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    for i in range(3):
+        store.append({"run_id": f"run-{i}", "started_at": float(i)})
+    assert spilled() == 0
+    assert store.get("run-1")["started_at"] == 1.0
+    assert [r["run_id"] for r in store.query()] == ["run-0", "run-1", "run-2"]
+
+    store.append({"run_id": "run-3", "started_at": 3.0})
+    assert spilled() == 3
+
+    store.append({"run_id": "run-4", "started_at": 4.0})
+    store.close()
+    assert spilled() == 4
+
+
+def test_clear_leaves_no_pending_records(tmp_path):
+    """Test that records evicted before a clear aren't written back in a later batch."""
+    import sqlite3
+    path = tmp_path / "runs.db"
+    store = RunHistoryStore(max_records=1, spill_path=path, spill_batch=10)
+    for i in range(3):
+        store.append({"run_id": f"run-{i}", "started_at": float(i)})
+    store.clear()
+    assert len(store) == 0 and store._pending == []
+
+    store.append({"run_id": "run-new", "started_at": 9.0})
+    store.flush()
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+    assert [r["run_id"] for r in store.query()] == ["run-0", "run-1", "run-new"]
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_adapter_history_is_bounded():
+    """Test that adapters record runs in a bounded store with run ids."""
+    async def on_event(event):
+        pass
+
+    class Executor:
+        def invoke(self, input_data, config=None):
+            return {"output": input_data["input"]}
+
+    adapter = LangChainAgentAdapter(on_event, history=RunHistoryStore(max_records=2))
+    for i in range(4):
+        await adapter.run_agent(Executor(), {"input": i})
+
+    history = adapter.get_history()
+    assert [h["output"] for h in history] == [2, 3]
+    assert adapter.history.get(adapter._run_id)["output"] == 3
+    assert all(h["status"] == "success" and h["started_at"] <= h["finished_at"] for h in history)
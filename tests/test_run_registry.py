@@ -0,0 +1,214 @@
+"""Tests for cancelling in-flight runs when a client disconnects."""
+import asyncio
+import pytest
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.agent_adapters import LangGraphAgentAdapter
+from agentprinter_fastapi.runs import RunRegistry, run_registry, bind_client, current_run
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+async def endless_agent(closed: list):
+    try:
+        while True:
+            await asyncio.sleep(0.01)
+            yield "token", "x"
+    finally:
+        closed.append(True)
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_runs_after_grace_period():
+    """Test that a dropped connection's runs are cancelled and upstream closers run."""
+    registry = RunRegistry(grace_period=0.05)
+    closed_upstream = []
+
+    async def run():
+        async with registry.track("run-1", connection_id="conn-1", session_id="sess-1") as handle:
+            handle.add_closer(lambda: closed_upstream.append(True))
+            await asyncio.sleep(5)
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.01)
+    assert [h.run_id for h in registry.runs_for_connection("conn-1")] == ["run-1"]
+
+    registry.on_disconnect("conn-1")
+    await asyncio.sleep(0.01)
+    assert not task.done()  # still inside the grace period
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, timeout=1)
+    assert closed_upstream == [True]
+    assert registry.runs == {}
+
+
+@pytest.mark.asyncio
+async def test_resume_within_grace_period_keeps_runs_alive():
+    """Test that resuming the session on a new connection prevents cancellation."""
+    registry = RunRegistry(grace_period=0.05)
+
+    async def run():
+        async with registry.track("run-2", connection_id="conn-old", session_id="sess-2"):
+            await asyncio.sleep(0.15)
+            return "finished"
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.01)
+
+    registry.on_disconnect("conn-old")
+    assert registry.on_resume("sess-2", "conn-new", registry.resume_token("conn-old")) == 1
+
+    assert await task == "finished"
+
+
+@pytest.mark.asyncio
+async def test_resume_requires_proof_of_ownership():
+    """Test that a session's runs only move for its resume token or identity."""
+    registry = RunRegistry(grace_period=0.05)
+
+    async def run(run_id, connection_id):
+        async with registry.track(run_id, connection_id=connection_id, session_id="sess-3"):
+            await asyncio.sleep(5)
+
+    bind_client("conn-a", "sess-3", identity="alice")
+    alice = asyncio.create_task(run("run-alice", "conn-a"))
+    bind_client("conn-b", "sess-3")
+    anonymous = asyncio.create_task(run("run-anon", "conn-b:sess-3"))
+    bind_client(None)
+    await asyncio.sleep(0.01)
+
+    registry.on_disconnect("conn-a")
+    registry.on_disconnect("conn-b:sess-3")
+    assert registry.on_resume("sess-3", "conn-mallory") == 0
+    assert registry.on_resume("sess-3", "conn-mallory", "forged", identity="mallory") == 0
+    assert registry.on_resume("sess-3", "conn-mallory", registry.resume_token("conn-other")) == 0
+    # Same user on a new connection; the anonymous client with its connection's token
+    assert registry.on_resume("sess-3", "conn-a2", identity="alice") == 1
+    assert registry.on_resume("sess-3", "conn-b2", registry.resume_token("conn-b")) == 1
+    assert registry.runs["run-alice"].connection_id == "conn-a2"
+    assert registry.runs["run-anon"].connection_id == "conn-b2"
+
+    await asyncio.sleep(0.1)
+    assert not alice.done() and not anonymous.done()
+    alice.cancel()
+    anonymous.cancel()
+    await asyncio.gather(alice, anonymous, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_grace_period_cancellation_task_is_referenced():
+    """Test that the registry holds the cancellation task until it finishes."""
+    registry = RunRegistry(grace_period=0.01)
+    held = []
+
+    async def run():
+        async with registry.track("run-ref", connection_id="conn-ref") as handle:
+            handle.add_closer(lambda: held.append(asyncio.current_task() in registry._cancel_tasks))
+            await asyncio.sleep(5)
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.01)
+    registry.on_disconnect("conn-ref")
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, timeout=1)
+    await asyncio.sleep(0)
+    assert held == [True]
+    assert registry._cancel_tasks == set()
+
+
+@pytest.mark.asyncio
+async def test_runs_pick_up_bound_client():
+    """Test that runs spawned from a bound context are attributed to that client."""
+    runner = AgentRunner()
+    closed = []
+    seen = {}
+
+    async def handler():
+        bind_client("conn-bound", "sess-bound")
+        return asyncio.create_task(runner.run_stream("run-bound", "trace", MockWebSocket(), endless_agent(closed)))
+
+    task = await handler()
+    await asyncio.sleep(0.02)
+    handle = run_registry.runs["run-bound"]
+    seen["connection"] = handle.connection_id
+    seen["session"] = handle.session_id
+
+    assert await run_registry.cancel_run("run-bound")
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert seen == {"connection": "conn-bound", "session": "sess-bound"}
+    assert closed == [True]
+    assert "run-bound" not in run_registry.runs
+
+
+@pytest.mark.asyncio
+async def test_langgraph_run_is_tracked_and_closes_stream_on_cancel():
+    """Test that cancelling a LangGraph run closes its event stream."""
+    closed = []
+    seen_runs = []
+
+    class EndlessGraph:
+        async def astream_events(self, initial_state, version=None):
+            seen_runs.append(current_run())
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield {"event": "on_chain_stream", "name": "node", "data": {"chunk": "x"}}
+            finally:
+                closed.append(True)
+
+    async def on_event(event):
+        pass
+
+    adapter = LangGraphAgentAdapter(on_event)
+    task = asyncio.create_task(adapter.run_graph(EndlessGraph(), {}))
+    await asyncio.sleep(0.03)
+
+    assert seen_runs[0].run_id == adapter._run_id
+    await run_registry.cancel_run(adapter._run_id)
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert closed == [True]
+
+
+def test_each_connection_gets_a_unique_client_id():
+    """Test that runs are keyed by a per-connection UUID, never a reusable object id."""
+    import uuid
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from agentprinter_fastapi.actions import action_router
+    from agentprinter_fastapi.router import router
+    from agentprinter_fastapi.runs import current_client
+
+    seen = []
+
+    @action_router.action("record_client")
+    async def record_client(message, websocket):
+        seen.append(current_client()[0])
+        await websocket.send_json({"type": "ack", "header": {"trace_id": "t"}, "payload": {}})
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    action = {
+        "type": "user.action",
+        "header": {"trace_id": "t"},
+        "payload": {"action_id": "record_client", "trigger": "click", "target": "button"},
+    }
+    for _ in range(2):
+        with client.websocket_connect("/ws") as ws:
+            while ws.receive_json()["type"] != "protocol.hello":
+                pass
+            ws.send_json(action)
+            while ws.receive_json()["type"] != "ack":
+                pass
+
+    assert len(set(seen)) == 2
+    assert all(uuid.UUID(client_id) for client_id in seen)
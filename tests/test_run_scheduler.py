@@ -0,0 +1,301 @@
+"""Tests for the agent run scheduler and the agent:cancel action."""
+import asyncio
+import pytest
+from agentprinter_fastapi.actions import ActionRouter
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.run_scheduler import RunCancelled, RunScheduler, handle_cancel_action
+from agentprinter_fastapi.runs import bind_client
+from agentprinter_fastapi.schemas import Message, MessageHeader
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+async def hold(scheduler, run_id, tenant, release, started, positions=None):
+    async def on_queued(position):
+        if positions is not None:
+            positions.append(position)
+
+    async with scheduler.slot(run_id, tenant, on_queued):
+        started.append(run_id)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_global_and_per_tenant_caps():
+    scheduler = RunScheduler(max_concurrent=3, max_per_tenant=2)
+    release = asyncio.Event()
+    started = []
+    tasks = [asyncio.create_task(hold(scheduler, f"a{i}", "alice", release, started)) for i in range(3)]
+    tasks.append(asyncio.create_task(hold(scheduler, "b0", "bob", release, started)))
+    await asyncio.sleep(0.01)
+
+    assert started == ["a0", "a1", "b0"]  # alice capped at 2
+    assert scheduler.is_queued("a2")
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started[-1] == "a2"
+    assert scheduler.get_stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_round_robin_across_tenants():
+    scheduler = RunScheduler(max_concurrent=1, max_per_tenant=10)
+    gate = asyncio.Event()
+    started = []
+    first = asyncio.create_task(hold(scheduler, "x", "alice", gate, started))
+    await asyncio.sleep(0)
+
+    # Alice floods the queue before Bob and Carol each queue one run
+    runs = [("a1", "alice"), ("a2", "alice"), ("a3", "alice"), ("b1", "bob"), ("c1", "carol")]
+    events = {run_id: asyncio.Event() for run_id, _ in runs}
+    tasks = [asyncio.create_task(hold(scheduler, run_id, tenant, events[run_id], started)) for run_id, tenant in runs]
+    await asyncio.sleep(0.01)
+    assert [scheduler.position(r) for r, _ in runs] == [1, 4, 5, 2, 3]
+
+    gate.set()
+    for run_id in ["a1", "b1", "c1", "a2", "a3"]:
+        await asyncio.sleep(0.01)
+        assert started[-1] == run_id
+        events[run_id].set()
+    await asyncio.gather(first, *tasks)
+
+
+@pytest.mark.asyncio
+async def test_queue_positions_reported_and_cancel():
+    scheduler = RunScheduler(max_concurrent=1)
+    release = asyncio.Event()
+    started, positions = [], []
+    first = asyncio.create_task(hold(scheduler, "r0", "t", release, started))
+    second = asyncio.create_task(hold(scheduler, "r1", "t", release, started))
+    third = asyncio.create_task(hold(scheduler, "r2", "t", release, started, positions))
+    await asyncio.sleep(0.01)
+    assert positions == [2]
+
+    assert scheduler.cancel("r1")
+    with pytest.raises(RunCancelled):
+        await second
+    await asyncio.sleep(0.01)
+    assert positions == [2, 1]
+
+    release.set()
+    await asyncio.gather(first, third)
+    assert positions == [2, 1, 0]
+    assert started == ["r0", "r2"]
+
+
+@pytest.mark.asyncio
+async def test_task_cancellation_leaves_queue():
+    scheduler = RunScheduler(max_concurrent=1)
+    release = asyncio.Event()
+    started = []
+    first = asyncio.create_task(hold(scheduler, "r0", "t", release, started))
+    waiting = asyncio.create_task(hold(scheduler, "r1", "t", release, started))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert not scheduler.is_queued("r1")
+
+    release.set()
+    await first
+    assert scheduler.get_stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_runner_sends_queue_messages():
+    scheduler = RunScheduler(max_concurrent=1)
+    runner = AgentRunner(scheduler=scheduler)
+    release = asyncio.Event()
+    ws = MockWebSocket()
+
+    async def slow():
+        yield "start", "go"
+        await release.wait()
+        yield "finish", "done"
+
+    async def quick():
+        yield "finish", "done"
+
+    first = asyncio.create_task(runner.run_stream("run-1", "t", ws, slow(), tenant="a"))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(runner.run_stream("run-2", "t", ws, quick(), tenant="a"))
+    await asyncio.sleep(0.01)
+
+    queue_msgs = [m["payload"] for m in ws.sent if m["type"] == "agent.queue"]
+    assert queue_msgs == [{"run_id": "run-2", "position": 1}]
+
+    release.set()
+    await asyncio.gather(first, second)
+    queue_msgs = [m["payload"] for m in ws.sent if m["type"] == "agent.queue"]
+    assert queue_msgs[-1] == {"run_id": "run-2", "position": 0}
+    assert ws.sent[-1]["payload"]["run_id"] == "run-2"
+
+
+@pytest.mark.asyncio
+async def test_agent_cancel_action_routes_exactly():
+    router = ActionRouter()
+    prefix_calls = []
+
+    async def agent_handler(message, websocket):
+        prefix_calls.append(message.payload["target"])
+
+    router.register_target_handler("agent", agent_handler)
+    router.register_target_handler("agent:cancel", handle_cancel_action)
+    ws = MockWebSocket()
+    runner = AgentRunner()
+    release = asyncio.Event()
+
+    async def gen():
+        yield "start", "go"
+        await release.wait()
+        yield "finish", "done"
+
+    bind_client("conn-1", "session-1")
+    run = asyncio.create_task(runner.run_stream("run-c", "t", ws, gen()))
+    await asyncio.sleep(0.01)
+
+    def action(target, **extra):
+        return Message(
+            type="user.action",
+            header=MessageHeader(trace_id="t"),
+            payload={"action_id": "x", "trigger": "click", "target": target, **extra},
+        )
+
+    await router.handle_message(action("agent:run"), ws)
+    assert prefix_calls == ["agent:run"]
+
+    # Another client can't cancel it
+    bind_client("conn-2", "session-2")
+    await router.handle_message(action("agent:cancel", run_id="run-c"), ws)
+    assert ws.sent[-1]["payload"]["code"] == "unknown_run"
+    assert not run.done()
+
+    bind_client("conn-1", "session-1")
+    await router.handle_message(action("agent:cancel", run_id="run-c"), ws)
+    assert ws.sent[-1]["payload"]["data"]["code"] == "cancelled"
+    await asyncio.gather(run, return_exceptions=True)
+    assert run.cancelled()
+    assert prefix_calls == ["agent:run"]
+
+
+def test_websocket_cancel_is_scoped_to_the_connection():
+    """Test that actions run beside the receive loop, so cancels reach them, and only from their own connection."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from agentprinter_fastapi import set_initial_page, set_template_loader
+    from agentprinter_fastapi.actions import action_router
+    from agentprinter_fastapi.backpressure import rate_limiter
+    from agentprinter_fastapi.router import manager, router
+
+    runner = AgentRunner()
+
+    @action_router.action("sched_slow_run")
+    async def slow_run(message, websocket):
+        async def gen():
+            yield "start", "go"
+            await asyncio.sleep(5)
+            yield "finish", "done"
+
+        await runner.run_stream(message.payload["run_id"], message.header.trace_id, websocket, gen())
+
+    @action_router.action("sched_echo")
+    async def echo(message, websocket):
+        await websocket.send_json({"type": "echo", "header": {"trace_id": "t"}, "payload": {}})
+
+    def action(target, session_id=None, **extra):
+        header = {"trace_id": "t"} if session_id is None else {"trace_id": "t", "session_id": session_id}
+        return {"type": "user.action", "header": header, "payload": {"trigger": "click", "target": target, **extra}}
+
+    def receive_until(ws, match):
+        while True:
+            msg = ws.receive_json()
+            if match(msg):
+                return msg
+
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+    connections = len(manager.active_connections)
+
+    with TestClient(app) as client, client.websocket_connect("/ws") as a, client.websocket_connect("/ws") as b:
+        a.receive_json()
+        b.receive_json()
+        a.send_json(action("button", action_id="sched_slow_run", run_id="run-ws", session_id="shared"))
+        receive_until(a, lambda m: m["type"] == "agent.event")
+
+        # Another connection can't cancel it, even claiming the same session
+        b.send_json(action("agent:cancel", action_id="cancel", run_id="run-ws", session_id="shared"))
+        assert b.receive_json()["payload"]["code"] == "unknown_run"
+
+        # The owner's cancel is read while its run is still going
+        a.send_json(action("agent:cancel", action_id="cancel", run_id="run-ws"))
+        receive_until(a, lambda m: m["type"] == "agent.event" and m["payload"].get("data", {}).get("code") == "cancelled")
+        a.send_json(action("button", action_id="sched_echo"))
+        receive_until(a, lambda m: m["type"] == "echo")
+        b.send_json(action("button", action_id="sched_echo"))
+        receive_until(b, lambda m: m["type"] == "echo")
+
+    assert len(manager.active_connections) == connections
+
+
+def test_session_ids_do_not_multiply_a_connections_quota():
+    """Test that a connection spreading runs over several session IDs is still one tenant."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from agentprinter_fastapi import set_initial_page, set_template_loader
+    from agentprinter_fastapi.actions import action_router
+    from agentprinter_fastapi.backpressure import rate_limiter
+    from agentprinter_fastapi.router import router
+
+    runner = AgentRunner(scheduler=RunScheduler(max_concurrent=16, max_per_tenant=1))
+
+    @action_router.action("sched_tenant_run")
+    async def tenant_run(message, websocket):
+        async def gen():
+            yield "start", "go"
+            await asyncio.sleep(5)
+            yield "finish", "done"
+
+        await runner.run_stream(message.payload["run_id"], message.header.trace_id, websocket, gen())
+
+    def msg(type_, session_id, **payload):
+        return {"type": type_, "header": {"trace_id": "t", "session_id": session_id}, "payload": payload}
+
+    def run(session_id, run_id):
+        return msg("user.action", session_id, action_id="sched_tenant_run", trigger="click", target="button", run_id=run_id)
+
+    app = FastAPI()
+    app.include_router(router)
+    set_template_loader(None)
+    set_initial_page(None)
+    rate_limiter.rate = 1000
+    rate_limiter.buckets.clear()
+
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws, client.websocket_connect("/ws") as other:
+        ws.receive_json()
+        other.receive_json()
+        for session in ("s1", "s2", "s3"):
+            ws.send_json(msg("protocol.open", session))
+            ws.send_json(run(session, f"run-{session}"))
+        frames = []
+        while len(frames) < 3:
+            frame = ws.receive_json()
+            if frame["type"] != "protocol.hello":
+                frames.append((frame["type"], frame["payload"]["run_id"]))
+        assert sorted(frames) == [("agent.event", "run-s1"), ("agent.queue", "run-s2"), ("agent.queue", "run-s3")]
+
+        # Another connection is its own tenant
+        other.send_json(run("s1", "run-other"))
+        assert other.receive_json()["type"] == "agent.event"
+
+        for run_id, session, socket in (("run-s1", "s1", ws), ("run-s2", "s2", ws), ("run-s3", "s3", ws), ("run-other", None, other)):
+            socket.send_json(msg("user.action", session, action_id="cancel", trigger="click", target="agent:cancel", run_id=run_id))
@@ -0,0 +1,116 @@
+"""Tests for sharing identical concurrent agent runs."""
+import asyncio
+import pytest
+from agentprinter_fastapi.agent_adapters import LangChainAgentAdapter, LangGraphAgentAdapter
+from agentprinter_fastapi.singleflight import SingleFlight, flight_key
+
+
+class GatedGraph:
+    """Graph that emits one node, then waits for the test to release it."""
+    
+    def __init__(self):
+        self.runs = 0
+        self.release = asyncio.Event()
+        self.closed = 0
+    
+    async def astream_events(self, initial_state, version=None):
+        self.runs += 1
+        try:
+            yield {"event": "on_chain_start", "name": "search", "data": {}}
+            yield {"event": "on_chain_end", "name": "search", "data": {"output": {"hits": 3}}}
+            await self.release.wait()
+            yield {"event": "on_chain_end", "name": "answer", "data": {"output": {"answer": initial_state["q"]}}}
+        finally:
+            self.closed += 1
+
+
+def test_flight_key_normalizes_input():
+    assert flight_key("agent:x", {"a": 1, "b": 2}) == flight_key("agent:x", {"b": 2, "a": 1})
+    assert flight_key("agent:x", {"a": 1}) != flight_key("agent:y", {"a": 1})
+
+
+@pytest.mark.asyncio
+async def test_identical_graph_runs_share_one_execution():
+    """Test that concurrent identical runs attach to one execution, with replay for late joiners."""
+    singleflight = SingleFlight()
+    graph = GatedGraph()
+    streams = [[], [], []]
+    finals = []
+    
+    def make_adapter(i):
+        async def on_event(event):
+            streams[i].append(event)
+        
+        async def on_final(state):
+            finals.append(i)
+        return LangGraphAgentAdapter(on_event, on_final=on_final, singleflight=singleflight)
+    
+    first = asyncio.create_task(make_adapter(0).run_graph(graph, {"q": "why"}))
+    await asyncio.sleep(0.01)
+    assert len(streams[0]) == 3  # start, tool_call, tool_result so far
+    
+    late = [asyncio.create_task(make_adapter(i).run_graph(graph, {"q": "why"})) for i in (1, 2)]
+    await asyncio.sleep(0.01)
+    graph.release.set()
+    results = await asyncio.gather(first, *late)
+    
+    assert graph.runs == 1
+    assert results == [{"answer": "why"}] * 3
+    assert streams[0] == streams[1] == streams[2]
+    assert [e["event"] for e in streams[0]] == ["start", "tool_call", "tool_result", "tool_result", "finish"]
+    assert sorted(finals) == [0, 1, 2]
+    assert singleflight.stats == {"started": 1, "joined": 2}
+    assert singleflight.flights == {}
+
+
+@pytest.mark.asyncio
+async def test_shared_run_survives_until_last_subscriber_leaves():
+    """Test that one subscriber leaving detaches it, and the last one cancels the run."""
+    singleflight = SingleFlight()
+    graph = GatedGraph()
+    
+    async def on_event(event):
+        pass
+    
+    tasks = [
+        asyncio.create_task(LangGraphAgentAdapter(on_event, singleflight=singleflight).run_graph(graph, {"q": "x"}))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0.01)
+    
+    tasks[0].cancel()
+    await asyncio.sleep(0.01)
+    assert graph.closed == 0 and len(singleflight.flights) == 1
+    
+    tasks[1].cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0.01)
+    assert graph.closed == 1
+    assert singleflight.flights == {}
+
+
+@pytest.mark.asyncio
+async def test_different_inputs_run_separately():
+    """Test that runs with different input (or without singleflight) are not shared."""
+    singleflight = SingleFlight()
+    calls = []
+    
+    class Agent:
+        async def ainvoke(self, input_data, config=None):
+            calls.append(input_data["input"])
+            await asyncio.sleep(0.01)
+            return {"output": input_data["input"]}
+    
+    async def on_event(event):
+        pass
+    
+    agent = Agent()
+    results = await asyncio.gather(
+        LangChainAgentAdapter(on_event, singleflight=singleflight).run_agent(agent, {"input": "a"}, share_key="agent:q"),
+        LangChainAgentAdapter(on_event, singleflight=singleflight).run_agent(agent, {"input": "a"}, share_key="agent:q"),
+        LangChainAgentAdapter(on_event, singleflight=singleflight).run_agent(agent, {"input": "b"}, share_key="agent:q"),
+        LangChainAgentAdapter(on_event).run_agent(agent, {"input": "a"}),
+    )
+    
+    assert [r["output"] for r in results] == ["a", "a", "b", "a"]
+    assert sorted(calls) == ["a", "a", "b"]
@@ -0,0 +1,51 @@
+"""Tests for the streamed output buffer."""
+import pytest
+from agentprinter_fastapi.streaming import StreamBuffer
+from agentprinter_fastapi.adapters import LangChainAdapter
+
+
+def test_stream_buffer_joins_chunks_lazily():
+    """Test that appends are joined on read and the result is cached."""
+    buffer = StreamBuffer()
+    for chunk in ["Hel", "", "lo", " world"]:
+        buffer.append(chunk)
+    
+    snapshot = buffer.snapshot()
+    assert snapshot == "Hello world"
+    assert buffer.text is snapshot  # cached until the next append
+    
+    buffer.append("!")
+    assert snapshot == "Hello world"
+    assert buffer.text == "Hello world!"
+    assert len(buffer) == 12 and buffer.total_chars == 12
+    assert not buffer.truncated
+
+
+def test_stream_buffer_windowed_retention():
+    """Test that only the last max_chars characters are retained."""
+    buffer = StreamBuffer(max_chars=10)
+    for i in range(1000):
+        buffer.append(f"{i % 10}")
+    
+    assert buffer.text == "0123456789"
+    assert buffer.total_chars == 1000
+    assert buffer.truncated
+    assert sum(len(c) for c in buffer._chunks) <= 20  # memory stays bounded
+    
+    buffer.clear()
+    assert buffer.text == "" and buffer.total_chars == 0
+
+
+@pytest.mark.asyncio
+async def test_langchain_adapter_accumulates_long_streams():
+    """Test that the chain adapter returns the full (or windowed) output."""
+    class LongChain:
+        async def astream(self, input_data):
+            for _ in range(5000):
+                yield "ab"
+    
+    async def on_chunk(text):
+        pass
+    
+    assert await LangChainAdapter(on_chunk).stream_chain(LongChain(), {}) == "ab" * 5000
+    assert await LangChainAdapter(on_chunk, max_output_chars=5).stream_chain(LongChain(), {}) == "babab"
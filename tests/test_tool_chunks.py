@@ -0,0 +1,168 @@
+"""Tests for chunked streaming of large tool results."""
+import json
+import pytest
+from agentprinter_fastapi.agent import AgentRunner
+from agentprinter_fastapi.schemas import AgentEvent
+from agentprinter_fastapi.tool_chunks import chunk_tool_result
+from agentprinter_fastapi.tool_executor import ToolCall, ToolExecutor, ToolRegistry
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_small_results_pass_through():
+    data = {"tool": "t", "output": {"rows": [1, 2, 3]}}
+    assert list(chunk_tool_result(data, threshold=100)) == [("tool_result", data)]
+    assert list(chunk_tool_result({"error": "x"}, threshold=1)) == [("tool_result", {"error": "x"})]
+
+
+def test_large_text_is_chunked_with_summary():
+    text = "abcdefghij" * 10
+    parts = list(chunk_tool_result({"tool": "t", "call_id": "c1", "output": text}, threshold=50, chunk_size=30))
+
+    chunks = [data for event, data in parts if event == "tool_result_chunk"]
+    assert [c["seq"] for c in chunks] == [0, 1, 2, 3]
+    assert all(c["call_id"] == "c1" and c["tool"] == "t" for c in chunks)
+    assert "".join(c["text"] for c in chunks) == text
+
+    event, summary = parts[-1]
+    assert event == "tool_result"
+    assert "output" not in summary
+    assert summary["chunked"] == {"encoding": "text", "chars": 100, "chunks": 4, "sent": 4, "complete": True}
+
+
+def test_structured_output_is_json_encoded_and_limited():
+    output = {"items": [{"id": i, "name": "x" * 20} for i in range(50)]}
+    parts = list(chunk_tool_result({"output": output}, threshold=100, chunk_size=200, max_chunks=2))
+
+    chunks = [data for event, data in parts if event == "tool_result_chunk"]
+    summary = parts[-1][1]["chunked"]
+    assert len(chunks) == 2
+    assert summary["encoding"] == "json" and summary["sent"] == 2 and not summary["complete"]
+    assert summary["chunks"] > 2
+
+    full = list(chunk_tool_result({"output": output}, threshold=100, chunk_size=200))
+    text = "".join(d["text"] for e, d in full if e == "tool_result_chunk")
+    assert json.loads(text) == output
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_agent_runner_chunks_tool_results():
+    runner = AgentRunner(tool_result_threshold=1000, tool_chunk_size=400)
+    ws = MockWebSocket()
+
+    async def gen():
+        yield "tool_call", {"tool": "fetch"}
+        yield "tool_result", {"tool": "fetch", "output": "y" * 2000}
+        yield "finish", "done"
+
+    await runner.run_stream("run-big", "t", ws, gen(), max_tool_chunks=3)
+
+    events = [m["payload"] for m in ws.sent]
+    for event in events:
+        AgentEvent(**event)
+    kinds = [e["event"] for e in events]
+    assert kinds == ["tool_call"] + ["tool_result_chunk"] * 3 + ["tool_result", "finish"]
+    assert events[4]["data"]["chunked"]["chunks"] == 5
+    assert max(len(json.dumps(m)) for m in ws.sent) < 1000
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_tool_executor_chunks_large_outputs():
+    registry = ToolRegistry()
+
+    @registry.tool("dump", "Big output", {"type": "object"})
+    async def dump():
+        return "z" * 5000
+
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    executor = ToolExecutor(registry, result_threshold=1024, chunk_size=1024)
+    result = await executor.execute(ToolCall("dump"), on_event, run_id="r")
+
+    assert result.output == "z" * 5000  # The caller still gets the whole output
+    assert [e["event"] for e in events] == ["tool_call"] + ["tool_result_chunk"] * 5 + ["tool_result"]
+
+
+class ToolStreamExecutor:
+    """LangChain-style executor whose tool returns a large output."""
+
+    def __init__(self, output):
+        self.output = output
+
+    async def astream_events(self, input_data, version=None):
+        yield {"event": "on_tool_start", "name": "search", "data": {"input": "q"}}
+        yield {"event": "on_tool_end", "name": "search", "data": {"output": self.output}}
+        yield {"event": "on_chain_end", "data": {"output": {"output": "done"}}}
+
+
+class BigNodeGraph:
+    async def astream_events(self, input_state, version=None, config=None):
+        yield {"event": "on_chain_start", "name": "fetch", "data": {}}
+        yield {"event": "on_chain_end", "name": "fetch", "data": {"output": {"page": "x" * 100}}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_adapters_chunk_large_tool_results():
+    from agentprinter_fastapi.agent_adapters import LangChainAgentAdapter, LangGraphAgentAdapter
+
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    adapter = LangChainAgentAdapter(on_event, tool_result_threshold=50, tool_chunk_size=40)
+    await adapter.run_agent(ToolStreamExecutor("y" * 100), {"input": "q"})
+    chunks = [e["data"]["text"] for e in events if e["event"] == "tool_result_chunk"]
+    assert "".join(chunks) == "y" * 100 and len(chunks) == 3
+    assert [e for e in events if e["event"] == "tool_result"][0]["data"]["chunked"]["complete"] is True
+
+    events.clear()
+    graph_adapter = LangGraphAgentAdapter(on_event, tool_result_threshold=50, tool_chunk_size=40)
+    assert await graph_adapter.run_graph(BigNodeGraph(), {}) == {"page": "x" * 100}  # Full state is kept
+    chunks = [e["data"] for e in events if e["event"] == "tool_result_chunk"]
+    assert all(c["node"] == "fetch" for c in chunks)
+    assert json.loads("".join(c["text"] for c in chunks)) == {"page": "x" * 100}
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("validated_envelopes")
+async def test_action_payload_caps_tool_chunks():
+    from agentprinter_fastapi.actions import ActionRouter, InvalidActionPayloadError
+    from agentprinter_fastapi.agent_adapters import LangGraphAgentAdapter
+    from agentprinter_fastapi.schemas import Message, MessageHeader
+
+    router = ActionRouter()
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    async def run_graph(message, websocket):
+        await LangGraphAgentAdapter(on_event, tool_result_threshold=50, tool_chunk_size=40).run_graph(BigNodeGraph(), {})
+
+    router.register_handler("run_graph", run_graph)
+
+    def action(**extra):
+        payload = {"action_id": "run_graph", "trigger": "click", "target": "button", **extra}
+        return Message(type="user.action", header=MessageHeader(trace_id="t"), payload=payload)
+
+    await router.handle_message(action(max_tool_chunks=1), MockWebSocket())
+    assert len([e for e in events if e["event"] == "tool_result_chunk"]) == 1
+    summary = [e for e in events if e["event"] == "tool_result"][0]["data"]
+    assert summary["chunked"]["sent"] == 1 and summary["chunked"]["complete"] is False
+
+    for bad in (-1, "2", True):
+        with pytest.raises(InvalidActionPayloadError):
+            await router.handle_message(action(max_tool_chunks=bad), MockWebSocket())
@@ -0,0 +1,153 @@
+"""Tests for the tool registry and executor."""
+import asyncio
+import time
+import pytest
+from agentprinter_fastapi.schemas import AgentEvent
+from agentprinter_fastapi.schemas.tools import Tool
+from agentprinter_fastapi.tool_executor import (
+    ToolCall,
+    ToolExecutor,
+    ToolRegistry,
+    ToolResultCache,
+    compile_schema,
+)
+
+ADD_SCHEMA = {
+    "type": "object",
+    "properties": {"a": {"type": "integer"}, "b": {"type": "integer", "minimum": 0}},
+    "required": ["a", "b"],
+    "additionalProperties": False,
+}
+
+
+def test_compiled_schema_reports_issues():
+    validate = compile_schema(ADD_SCHEMA)
+    assert validate({"a": 1, "b": 2}, []) == []
+
+    issues = validate({"a": "x", "b": -1, "c": 0}, [])
+    assert {(tuple(i["loc"]), i["type"]) for i in issues} == {
+        (("a",), "type_error"),
+        (("b",), "minimum"),
+        (("c",), "extra_forbidden"),
+    }
+    assert validate({"a": True}, [])[0]["type"] in ("type_error", "missing")
+
+
+def test_compiled_schema_nested_and_refs():
+    validate = compile_schema({
+        "$defs": {"tag": {"type": "string", "pattern": "^[a-z]+$"}},
+        "type": "object",
+        "properties": {
+            "tags": {"type": "array", "items": {"$ref": "#/$defs/tag"}, "maxItems": 2},
+            "mode": {"enum": ["fast", "slow"]},
+            "limit": {"anyOf": [{"type": "integer"}, {"type": "null"}]},
+        },
+    })
+    assert validate({"tags": ["ok"], "mode": "fast", "limit": None}, []) == []
+    issues = validate({"tags": ["ok", "Bad", "x"], "mode": "other", "limit": "1"}, [])
+    assert {(tuple(i["loc"]), i["type"]) for i in issues} == {
+        (("tags",), "maxItems"),
+        (("tags", 1), "pattern"),
+        (("mode",), "enum"),
+        (("limit",), "anyOf"),
+    }
+
+
+def make_registry(log):
+    registry = ToolRegistry()
+
+    @registry.tool("add", "Add two numbers", ADD_SCHEMA, pure=True)
+    async def add(a, b):
+        log.append(("add", a, b))
+        return a + b
+
+    @registry.tool("sleep", "Sleep", {"type": "object", "properties": {"s": {"type": "number"}}}, max_concurrency=2, timeout=0.2)
+    async def sleep(s):
+        await asyncio.sleep(s)
+        return s
+
+    def blocking_upper(text):
+        time.sleep(0.01)
+        return text.upper()
+
+    registry.register(
+        Tool(name="upper", description="Upper-case text", input_schema={"type": "object"}, output_schema={"type": "string"}),
+        blocking_upper,
+    )
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_execute_many_runs_concurrently_and_streams_events():
+    log = []
+    executor = ToolExecutor(make_registry(log))
+    events = []
+
+    async def on_event(event):
+        AgentEvent(**event)  # Events follow the AgentEvent contract
+        events.append(event)
+
+    started = time.perf_counter()
+    results = await executor.execute_many(
+        [ToolCall("sleep", {"s": 0.05}), ToolCall("sleep", {"s": 0.05}), ToolCall("upper", {"text": "hi"})],
+        on_event,
+        run_id="run-1",
+    )
+    elapsed = time.perf_counter() - started
+
+    assert [r.output for r in results] == [0.05, 0.05, "HI"]
+    assert elapsed < 0.09  # Not serial
+    assert [e["event"] for e in events[:3]] == ["tool_call"] * 3
+    assert sorted(e["event"] for e in events[3:]) == ["tool_result"] * 3
+    call_ids = {e["data"]["call_id"] for e in events}
+    assert call_ids == {r.call_id for r in results}
+
+
+@pytest.mark.asyncio
+async def test_per_tool_concurrency_limit():
+    registry = ToolRegistry()
+    active = peak = 0
+
+    @registry.tool("work", "Work", {"type": "object"}, max_concurrency=2)
+    async def work():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    await ToolExecutor(registry).execute_many([ToolCall("work") for _ in range(6)])
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_become_results():
+    executor = ToolExecutor(make_registry([]))
+    invalid, unknown, slow = await executor.execute_many([
+        ToolCall("add", {"a": 1}),
+        ToolCall("missing", {}),
+        ToolCall("sleep", {"s": 1}),
+    ])
+
+    assert invalid.code == "invalid_tool_input"
+    assert invalid.issues[0]["loc"] == ["b"]
+    assert unknown.code == "unknown_tool"
+    assert slow.code == "deadline_exceeded"
+    assert slow.event_data()["error"]
+
+
+@pytest.mark.asyncio
+async def test_pure_tool_results_are_cached():
+    log = []
+    cache = ToolResultCache()
+    executor = ToolExecutor(make_registry(log), cache=cache)
+
+    first = await executor.execute(ToolCall("add", {"a": 1, "b": 2}))
+    second = await executor.execute(ToolCall("add", {"b": 2, "a": 1}))
+    await executor.execute(ToolCall("upper", {"text": "x"}))
+    await executor.execute(ToolCall("upper", {"text": "x"}))
+
+    assert first.output == second.output == 3
+    assert second.cached and second.event_data()["cached"]
+    assert log == [("add", 1, 2)]
+    assert len(cache) == 1  # Impure tools are never cached